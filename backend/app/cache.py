@@ -0,0 +1,179 @@
+"""
+Result cache for the read endpoints (/aggregations/h3, /clusters/dbscan).
+
+Entries are keyed on the normalized query (snapped bbox, resolution,
+sorted sources, time range, ...) plus a generation number. Writes through
+the API call invalidate(), which bumps the generation so every older entry
+stops matching; TTL bounds staleness for writes that bypass the API (the
+CLI loaders, psql).
+
+The default backend is an in-process LRU with TTL, so each uvicorn worker
+has its own copy. With REDIS_URL set (and the redis package installed) the
+cache and its generation are shared through Redis instead.
+
+Settings (env): CACHE_TTL_S (60, 0 disables caching), CACHE_MAX_ENTRIES
+(512, in-process only), REDIS_URL.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+
+try:
+    import redis
+except ImportError:  # optional
+    redis = None
+
+CACHE_TTL_S = float(os.getenv("CACHE_TTL_S", "60"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "512"))
+REDIS_URL = os.getenv("REDIS_URL")
+
+_MISSING = object()
+# what backend get() returns on a miss
+MISSING = _MISSING
+
+
+class LRUCache:
+    """Thread-safe in-process LRU with a per-entry TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, ttl_s: float = CACHE_TTL_S):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self.evictions = 0
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl_s, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class RedisCache:
+    """Shared cache in Redis; entries expire via SETEX, the generation is a counter key."""
+
+    name = "redis"
+    evictions = 0  # Redis does its own eviction
+
+    def __init__(self, url: str, ttl_s: float = CACHE_TTL_S, prefix: str = "ngr001:cache:"):
+        self._r = redis.Redis.from_url(url)
+        self.ttl_s = ttl_s
+        self._prefix = prefix
+
+    def generation(self) -> int:
+        return int(self._r.get(self._prefix + "generation") or 0)
+
+    def get(self, key: str) -> Any:
+        raw = self._r.get(self._prefix + key)
+        return _MISSING if raw is None else pickle.loads(raw)
+
+    def set(self, key: str, value: Any) -> None:
+        self._r.setex(self._prefix + key, max(1, int(self.ttl_s)), pickle.dumps(value))
+
+    def invalidate(self) -> None:
+        # old generations simply stop being read and expire on their own
+        self._r.incr(self._prefix + "generation")
+
+    def size(self) -> int:
+        return sum(1 for k in self._r.scan_iter(self._prefix + "*") if not k.endswith(b"generation"))
+
+
+def _make_backend():
+    if REDIS_URL and redis is not None:
+        return RedisCache(REDIS_URL)
+    return LRUCache()
+
+
+backend = _make_backend()
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def make_key(namespace: str, params: dict) -> str:
+    """Stable key for a normalized query; params must be JSON-serializable."""
+    raw = json.dumps(params, sort_keys=True, default=str, separators=(",", ":"))
+    return f"{namespace}:{backend.generation()}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+def cached(namespace: str, params: dict, compute: Callable[[], Any]) -> Any:
+    """Return the cached value for (namespace, params), computing and storing it on a miss."""
+    if CACHE_TTL_S <= 0:
+        return compute()
+    key = make_key(namespace, params)
+    value = _lookup(key)
+    if value is _MISSING:
+        value = compute()
+        backend.set(key, value)
+    return value
+
+
+async def cached_async(namespace: str, params: dict, compute: Callable[[], Awaitable[Any]]) -> Any:
+    """cached() for coroutine computations (async routes)."""
+    if CACHE_TTL_S <= 0:
+        return await compute()
+    key = make_key(namespace, params)
+    value = _lookup(key)
+    if value is _MISSING:
+        value = await compute()
+        backend.set(key, value)
+    return value
+
+
+def _lookup(key: str) -> Any:
+    value = backend.get(key)
+    _stats["misses" if value is _MISSING else "hits"] += 1
+    return value
+
+
+def invalidate() -> None:
+    """Drop every cached result (called after writes to events)."""
+    _stats["invalidations"] += 1
+    backend.invalidate()
+
+
+def stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        "backend": backend.name,
+        **_stats,
+        "hit_ratio": round(_stats["hits"] / lookups, 4) if lookups else None,
+        "evictions": backend.evictions,
+        "entries": backend.size(),
+        "generation": backend.generation(),
+        "ttl_s": CACHE_TTL_S,
+    }
@@ -1,9 +1,24 @@
+import os
+from itertools import repeat
+
 import numpy as np
 from sklearn.cluster import DBSCAN
 import h3
+from h3.api import basic_int as _h3_int
 
 EARTH_M = 6371000.0
 
+# worker threads for the DBSCAN neighbour queries (-1 = all cores)
+DBSCAN_N_JOBS = int(os.getenv("DBSCAN_N_JOBS", "1"))
+
+# events.h3_cell stores the finest (res 15) cell as a BIGINT; coarser cells are
+# derived from it by bit manipulation (see h3_parent_masks).
+H3_MAX_RES = 15
+_H3_RES_OFFSET = 52
+_H3_RES_MASK = 15 << _H3_RES_OFFSET
+_U64 = (1 << 64) - 1
+_geo_to_h3_int = _h3_int.geo_to_h3
+
 def _to_radians(points):
     arr = np.radians(np.array([[p[0], p[1]] for p in points]))
     return arr
@@ -15,9 +30,163 @@ def dbscan_haversine(points, eps_m=500, min_samples=5):
     labels = db.fit_predict(X)
     return labels
 
+def unit_xyz(points):
+    """(lat, lon) degrees -> points on the unit sphere, shape (n, 3)."""
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    lat = np.radians(pts[:, 0])
+    lon = np.radians(pts[:, 1])
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+def chord_eps(eps_m):
+    """Straight-line (chord) distance on the unit sphere for a great-circle distance in meters."""
+    return 2.0 * np.sin(min(eps_m / EARTH_M, np.pi) / 2.0)
+
+def dbscan_chord(points, eps_m=500, min_samples=5, n_jobs=None):
+    """
+    Same clustering as dbscan_haversine, but on 3D unit vectors with the
+    euclidean metric. Chord length grows monotonically with great-circle
+    distance, so the eps neighbourhoods (and therefore the labels) are the
+    same, while sklearn can use a KD-tree and parallel queries instead of a
+    haversine ball tree.
+    """
+    X = unit_xyz(points)
+    if len(X) == 0:
+        return np.empty(0, dtype=int)
+    db = DBSCAN(
+        eps=chord_eps(eps_m), min_samples=min_samples, algorithm="kd_tree",
+        n_jobs=DBSCAN_N_JOBS if n_jobs is None else n_jobs,
+    )
+    return db.fit_predict(X)
+
+def _lat_lon(points):
+    pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return pts[:, 0], pts[:, 1]
+
+def h3_cells(lat, lon, res=7):
+    """
+    H3 cells at `res` for lat/lon arrays, as a uint64 array. h3 v3 has no
+    array API, so each distinct coordinate is indexed once (event data
+    repeats stations and intersections a lot) and the result is scattered
+    back with the inverse index.
+    """
+    lat = np.asarray(lat, dtype=np.float64).ravel()
+    lon = np.asarray(lon, dtype=np.float64).ravel()
+    if len(lat) == 0:
+        return np.empty(0, dtype=np.uint64)
+    uniq, inverse = np.unique(lat + 1j * lon, return_inverse=True)
+    cells = np.fromiter(
+        map(_geo_to_h3_int, uniq.real.tolist(), uniq.imag.tolist(), repeat(res, len(uniq))),
+        dtype=np.uint64, count=len(uniq),
+    )
+    return cells[inverse.ravel()]
+
+def h3_parents(cells, res):
+    """Parents at `res` of a uint64 array of finer cells (see h3_parent_masks)."""
+    keep, setbits = h3_parent_masks(res)
+    return (np.asarray(cells, dtype=np.uint64) & np.uint64(keep & _U64)) | np.uint64(setbits)
+
+def h3_count_cells(cells):
+    """uint64 cells -> {hex cell: count}."""
+    uniq, counts = np.unique(cells, return_counts=True)
+    return {format(c, "x"): n for c, n in zip(uniq.tolist(), counts.tolist())}
+
 def h3_bin(points, res=7):
-    bins = {}
-    for lat, lon in points:
-        idx = h3.geo_to_h3(lat, lon, res)
-        bins[idx] = bins.get(idx, 0) + 1
-    return bins
+    """Count (lat, lon) points (pairs or an (n, 2) array) per H3 cell at `res`."""
+    lat, lon = _lat_lon(points)
+    return h3_count_cells(h3_cells(lat, lon, res))
+
+def h3_stored_cells(lat, lon, res=7):
+    """
+    Cells at `res` the way the SQL path bins events: parents of the res-15
+    cell stored in events.h3_cell. For points near cell edges these differ
+    from h3_cells at `res` directly, so rows still waiting for the backfill
+    are binned with this.
+    """
+    return h3_parents(h3_cells(lat, lon, H3_MAX_RES), res)
+
+def h3_bin_multi(lat, lon, resolutions):
+    """
+    Counts at several resolutions in one indexing pass: points are indexed
+    at the finest resolution and coarser cells are its parents (bit
+    truncation, like the SQL path over events.h3_cell). Parents can differ
+    from a direct h3_bin at the coarse resolution for points near cell
+    edges. Returns {res: {hex cell: count}}.
+    """
+    resolutions = sorted(set(resolutions))
+    if not resolutions:
+        return {}
+    fine = h3_cells(lat, lon, resolutions[-1])
+    return {r: h3_count_cells(h3_parents(fine, r)) for r in resolutions}
+
+def h3_cell_int(lat, lon):
+    """Res-15 H3 cell containing (lat, lon) as an int (fits a signed BIGINT)."""
+    return h3.string_to_h3(h3.geo_to_h3(lat, lon, H3_MAX_RES))
+
+def h3_parent_masks(res):
+    """
+    Masks (keep, set) such that ``(cell & keep) | set`` is the parent at `res`
+    of a res-15 cell: the resolution field is overwritten and every digit
+    below `res` is set to 7 (unused), exactly like h3_to_parent.
+    """
+    if not 0 <= res <= H3_MAX_RES:
+        raise ValueError(f"H3 resolution out of range: {res}")
+    keep = ~_H3_RES_MASK
+    setbits = (res << _H3_RES_OFFSET) | ((1 << (3 * (H3_MAX_RES - res))) - 1)
+    return keep, setbits
+
+def h3_centers(cells):
+    """(lat, lon) arrays of the centers of hex `cells`, as h3_cells stores them."""
+    pts = np.array([h3.h3_to_geo(c) for c in cells], dtype=np.float64).reshape(-1, 2)
+    return pts[:, 0], pts[:, 1]
+
+def h3_descendant_range(cell):
+    """
+    (lo, hi) such that a res-15 cell has `cell` (hex or int) as its parent
+    exactly when lo <= cell <= hi: the lower digits of an H3 index are the
+    path below its parent.
+    """
+    if not h3.h3_is_valid(cell if isinstance(cell, str) else h3.h3_to_string(int(cell))):
+        raise ValueError(f"not an H3 cell: {cell}")
+    c = h3.string_to_h3(cell) if isinstance(cell, str) else int(cell)
+    below = (1 << (3 * (H3_MAX_RES - ((c & _H3_RES_MASK) >> _H3_RES_OFFSET)))) - 1
+    lo = (c & ~_H3_RES_MASK & ~below) | (H3_MAX_RES << _H3_RES_OFFSET)
+    return lo, lo | below
+
+def h3_cell_box(cell, margin=0.1):
+    """
+    Lon/lat box around `cell` widened by `margin` of its size per side. The
+    res-15 descendants of a cell stick out of its outline (by about 2% of
+    its width), so the default margin holds all of them.
+    """
+    lat, lon = zip(*h3.h3_to_geo_boundary(cell))
+    dx, dy = (max(lon) - min(lon)) * margin, (max(lat) - min(lat)) * margin
+    return min(lon) - dx, min(lat) - dy, max(lon) + dx, max(lat) + dy
+
+def bbox_area_km2(minx, miny, maxx, maxy):
+    """Area of a lon/lat box on the sphere."""
+    r_km = EARTH_M / 1000.0
+    dlon = np.radians(max(maxx - minx, 0.0))
+    return r_km * r_km * dlon * abs(np.sin(np.radians(maxy)) - np.sin(np.radians(miny)))
+
+def sample_res(area_km2, cells):
+    """Finest H3 resolution at which `area_km2` spans at most about `cells` cells."""
+    res = 0
+    for r in range(H3_MAX_RES + 1):
+        if area_km2 / h3.hex_area(r, unit="km^2") > cells:
+            break
+        res = r
+    return res
+
+def h3_bin_stored(points, res=7):
+    """h3_bin over h3_stored_cells: counts matching the SQL path over events.h3_cell."""
+    lat, lon = _lat_lon(points)
+    return h3_count_cells(h3_stored_cells(lat, lon, res))
+
+def h3_bin_keyed(points_by_key, res=7):
+    """h3_bin_stored per key: {key: [(lat, lon), ...]} -> {(key, cell): count}."""
+    return {
+        (key, cell): n
+        for key, points in points_by_key.items()
+        for cell, n in h3_bin_stored(points, res=res).items()
+    }
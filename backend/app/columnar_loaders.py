@@ -0,0 +1,364 @@
+"""
+Columnar (NumPy) variants of the data_loaders parsers.
+
+Each loader reads the CSV in chunks of raw csv.reader rows, pulls out only
+the columns it needs as NumPy arrays and parses timestamps, coordinates
+and severity mappings with array operations. Invalid rows are dropped by
+mask. Batches are dicts of columns keyed like data_loaders.ROW_FIELDS:
+
+    occurred_at  datetime64[s]
+    lat, lon     float64
+    type         str array
+    severity     int64
+    properties   list[dict] (per-row JSON payload, same keys as data_loaders)
+
+copy_ingest.copy_ingest_columns consumes these batches directly;
+columns_to_rows adapts them for row-based consumers.
+"""
+
+from __future__ import annotations
+
+import re
+from datetime import datetime, timezone
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .data_loaders import (
+    EventRow,
+    _close_reader,
+    _first_key,
+    _open_reader,
+    _parse_us_accidents_dt,
+    _parse_us_weather_dt,
+)
+
+ColumnBatch = Dict[str, object]
+
+DEFAULT_CHUNK_ROWS = 200_000
+
+
+# =========================
+# Vectorized helpers
+# =========================
+
+def _read_chunks(
+    csv_path: str,
+    aliases: Dict[str, List[str]],
+    optional: Dict[str, List[str]],
+    chunk_rows: int,
+    label: str,
+) -> Iterator[Dict[str, np.ndarray]]:
+    """
+    Yield {name: str array} chunks. `aliases` are required columns resolved
+    like data_loaders._first_key; `optional` columns take the first exact
+    header match and are all '' when absent.
+    """
+    path = Path(csv_path)
+    if not path.exists():
+        print(f"[ERROR] File not found: {csv_path}")
+        return
+
+    dict_reader = _open_reader(csv_path)
+    try:
+        headers = dict_reader.fieldnames or []
+        keys = {name: _first_key(headers, cands) for name, cands in aliases.items()}
+        if not all(keys.values()):
+            print(f"[ERROR] {label}: missing essential columns from headers: {headers[:10]}…")
+            return
+        for name, cands in optional.items():
+            found = next((h for h in cands if h in headers), None)
+            if found:
+                keys[name] = found
+        idx = {name: headers.index(key) for name, key in keys.items()}
+        width = max(idx.values()) + 1
+
+        raw = dict_reader.reader
+        while True:
+            rows = list(islice(raw, chunk_rows))
+            if not rows:
+                break
+            if min(map(len, rows)) < width:
+                rows = [r + [""] * (width - len(r)) for r in rows]
+            cols = {name: np.array([r[i] for r in rows], dtype=str) for name, i in idx.items()}
+            n = len(rows)
+            for name in optional:
+                if name not in cols:
+                    cols[name] = np.full(n, "", dtype=str)
+            yield cols
+    finally:
+        _close_reader(dict_reader)
+
+
+def _to_float(col: np.ndarray, default: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Parse a str array to float64. Empty cells become `default` (NaN and
+    invalid when default is None); unparsable cells are NaN and invalid.
+    Returns (values, ok_mask).
+    """
+    # float parsing already tolerates surrounding whitespace
+    empty = col == ""
+    try:
+        vals = np.where(empty, "nan", col).astype(np.float64)
+        ok = ~empty
+    except ValueError:
+        # rare: garbage somewhere in the chunk; fall back element-wise
+        s = np.char.strip(col)
+        empty = s == ""
+        vals = np.full(len(s), np.nan)
+        ok = np.zeros(len(s), dtype=bool)
+        for i, v in enumerate(s):
+            if v:
+                try:
+                    vals[i] = float(v)
+                    ok[i] = True
+                except ValueError:
+                    pass
+    ok &= np.isfinite(vals)
+    if default is not None:
+        vals = np.where(empty, default, vals)
+        ok = ok | empty
+    return vals, ok
+
+
+def _to_datetime(col: np.ndarray, parse: Callable[[str], Optional[datetime]]) -> np.ndarray:
+    """
+    Timestamps -> datetime64[s] (UTC); NaT where `parse` rejects the cell.
+
+    Plain 'YYYY-MM-DD[ T]HH:MM:SS[.fff…]' cells are converted in bulk; every
+    other non-empty cell (unpadded hours, tz offsets, 'Z', whitespace…) goes
+    through `parse`, the row loader's own parser, so both loaders keep the
+    same rows. Offsets are applied, and fractional seconds are truncated
+    (they are all zero in the datasets).
+    """
+    out = np.full(len(col), np.datetime64("NaT"), dtype="datetime64[s]")
+    parts = np.char.partition(col, ".")
+    head, dot, frac = parts[:, 0], parts[:, 1], parts[:, 2]
+    fast = (np.char.str_len(head) == 19) & ((dot == "") | np.char.isdigit(frac))
+    try:
+        out[fast] = head[fast].astype("datetime64[s]")
+    except ValueError:
+        # rare: a malformed plain-looking cell; parse the whole chunk per cell
+        fast[:] = False
+    for i in np.flatnonzero(~fast & (col != "")):
+        dt = parse(col[i])
+        if dt is not None:
+            if dt.tzinfo is not None:
+                dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+            out[i] = np.datetime64(dt, "s")
+    return out
+
+
+def _noaa_ztime(col: np.ndarray) -> np.ndarray:
+    """NOAA ZTIME (YYYYMMDDHHMM[SS], non-digits ignored) -> datetime64[s]; NaT when invalid."""
+    s = np.char.strip(col)
+    if not np.char.isdigit(s).all():
+        s = np.array([re.sub(r"\D", "", v) for v in s], dtype=str)
+    lens = np.char.str_len(s)
+    s = np.where(lens == 12, np.char.add(s, "00"), s)
+    ok = (lens == 12) | (lens == 14)
+
+    v = np.where(ok, s, "19700101000000").astype(np.int64)
+    y, mo, d = v // 10**10, v // 10**8 % 100, v // 10**6 % 100
+    h, mi, sec = v // 10**4 % 100, v // 100 % 100, v % 100
+    ok &= (mo >= 1) & (mo <= 12) & (d >= 1) & (h < 24) & (mi < 60) & (sec < 60)
+
+    month = (y - 1970).astype("datetime64[Y]").astype("datetime64[M]") + np.clip(mo - 1, 0, 11).astype("timedelta64[M]")
+    days_in_month = ((month + 1).astype("datetime64[D]") - month.astype("datetime64[D]")).astype(np.int64)
+    ok &= d <= days_in_month
+
+    out = (
+        month.astype("datetime64[s]")
+        + ((d - 1) * 86400 + h * 3600 + mi * 60 + sec).astype("timedelta64[s]")
+    )
+    out[~ok] = np.datetime64("NaT")
+    return out
+
+
+def _map_words(words: np.ndarray, mapping: Dict[str, int], default: int) -> np.ndarray:
+    """Dictionary lookup over the distinct values only."""
+    uniq, inv = np.unique(words, return_inverse=True)
+    mapped = np.array([mapping.get(w, default) for w in uniq], dtype=np.int64)
+    return mapped[inv]
+
+
+def _to_int(col: np.ndarray, default: int, lo: int, hi: int) -> np.ndarray:
+    """
+    int() over the distinct values only, clipped to lo..hi; empty cells are 0
+    and unparsable ones ("3.0") `default`, as in the row loaders.
+    """
+    def parse(v: str) -> int:
+        try:
+            n = int(v or 0)
+        except ValueError:
+            n = default
+        return max(lo, min(n, hi))
+    uniq, inv = np.unique(col, return_inverse=True)
+    return np.array([parse(v) for v in uniq], dtype=np.int64)[inv]
+
+
+def _finish(
+    keep: np.ndarray,
+    occurred_at: np.ndarray, lat: np.ndarray, lon: np.ndarray,
+    type_: np.ndarray, severity: np.ndarray,
+    props: Dict[str, np.ndarray], constants: Dict[str, object],
+) -> Optional[ColumnBatch]:
+    if not keep.any():
+        return None
+    names = list(props)
+    prop_cols = [props[k][keep].tolist() for k in names]
+    properties = [{**constants, **dict(zip(names, vals))} for vals in zip(*prop_cols)]
+    return {
+        "occurred_at": occurred_at[keep],
+        "lat": lat[keep],
+        "lon": lon[keep],
+        "type": type_[keep],
+        "severity": severity[keep],
+        "properties": properties,
+    }
+
+
+def columns_to_rows(batch: ColumnBatch) -> Iterator[EventRow]:
+    """Adapt a column batch to data_loaders row tuples (for the ORM path)."""
+    yield from zip(
+        batch["occurred_at"].astype("datetime64[us]").tolist(),
+        batch["lat"].tolist(),
+        batch["lon"].tolist(),
+        batch["type"].tolist(),
+        batch["severity"].tolist(),
+        batch["properties"],
+    )
+
+
+# =========================
+# Datasets
+# =========================
+
+def load_noaa_severe_weather_columns(csv_path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[ColumnBatch]:
+    """NOAA hail (SWDI) as column batches; severity from SEVPROB/MAXSIZE thresholds."""
+    aliases = {
+        "time": ["X.ZTIME", "X_ZTIME", "ZTIME", "X ZTIME", "Time", "X:ZTIME", "XZTIME"],
+        "lat": ["LAT", "Latitude", "Y"],
+        "lon": ["LON", "Longitude", "X"],
+    }
+    optional = {h: [h] for h in ("SEVPROB", "MAXSIZE", "RANGE", "AZIMUTH", "WSR_ID", "CELL_ID")}
+    for c in _read_chunks(csv_path, aliases, optional, chunk_rows, "NOAA"):
+        occurred_at = _noaa_ztime(c["time"])
+        lat, ok_lat = _to_float(c["lat"])
+        lon, ok_lon = _to_float(c["lon"])
+        sevprob, ok_sp = _to_float(c["SEVPROB"], default=0.0)
+        maxsize, ok_ms = _to_float(c["MAXSIZE"], default=0.0)
+        rng, ok_rng = _to_float(c["RANGE"], default=0.0)
+        azimuth, ok_az = _to_float(c["AZIMUTH"], default=0.0)
+        # SEVPROB/AZIMUTH are integer columns
+        ok_int = (sevprob == np.trunc(sevprob)) & (azimuth == np.trunc(azimuth))
+
+        keep = (~np.isnat(occurred_at) & ok_lat & ok_lon & ok_sp & ok_ms
+                & ok_rng & ok_az & ok_int)
+        severity = np.select(
+            [
+                (sevprob >= 80) | (maxsize >= 2.0),
+                (sevprob >= 60) | (maxsize >= 1.5),
+                (sevprob >= 40) | (maxsize >= 1.0),
+                (sevprob >= 20) | (maxsize >= 0.75),
+            ],
+            [5, 4, 3, 2],
+            default=1,
+        )
+        batch = _finish(
+            keep, occurred_at, lat, lon, np.full(len(lat), "hail"), severity,
+            {
+                "wsr_id": c["WSR_ID"],
+                "cell_id": c["CELL_ID"],
+                "severity_prob": np.nan_to_num(sevprob).astype(np.int64),
+                "max_size_inches": maxsize,
+                "range": rng,
+                "azimuth": np.nan_to_num(azimuth).astype(np.int64),
+            },
+            {"source": "noaa_severe_weather"},
+        )
+        if batch:
+            yield batch
+
+
+_US_WEATHER_SEVERITY = {
+    "light": 1,
+    "moderate": 3,
+    "heavy": 4,
+    "severe": 5,
+    "unk": 2,
+    "": 2,
+}
+
+
+def load_us_weather_events_columns(csv_path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[ColumnBatch]:
+    """US Weather Events as column batches; severity words mapped per distinct value."""
+    aliases = {
+        "start": ["StartTime(UTC)", "Start_Time(UTC)", "StartTimeUTC", "Start Time (UTC)", "Start_Time", "StartTime"],
+        "lat": ["LocationLat", "Lat", "Latitude"],
+        "lon": ["LocationLng", "Lng", "Long", "Longitude"],
+        "type": ["Type", "EventType"],
+        "severity": ["Severity"],
+    }
+    optional = {
+        "end": ["EndTime(UTC)", "End_Time(UTC)", "EndTimeUTC", "End Time (UTC)", "End_Time", "EndTime"],
+        "precip": ["Precipitation(in)", "Precipitation", "PrecipIn"],
+        **{h: [h] for h in ("EventId", "AirportCode", "City", "County", "State", "ZipCode")},
+    }
+    for c in _read_chunks(csv_path, aliases, optional, chunk_rows, "US Weather"):
+        occurred_at = _to_datetime(c["start"], _parse_us_weather_dt)
+        lat, ok_lat = _to_float(c["lat"])
+        lon, ok_lon = _to_float(c["lon"])
+        precip, _ = _to_float(c["precip"], default=0.0)
+        precip = np.nan_to_num(precip)
+
+        end = _to_datetime(c["end"], _parse_us_weather_dt)
+        end_iso = np.where(np.isnat(end), None, np.datetime_as_string(end, unit="s"))
+
+        words = np.char.lower(np.char.strip(c["severity"]))
+        severity = _map_words(words, _US_WEATHER_SEVERITY, 2)
+
+        keep = ~np.isnat(occurred_at) & ok_lat & ok_lon
+        batch = _finish(
+            keep, occurred_at, lat, lon, np.char.lower(np.char.strip(c["type"])), severity,
+            {
+                "event_id": c["EventId"],
+                "end_time": end_iso,
+                "precipitation_inches": precip,
+                "airport_code": c["AirportCode"],
+                "city": c["City"],
+                "county": c["County"],
+                "state": c["State"],
+                "zipcode": c["ZipCode"],
+            },
+            {"source": "us_weather_events"},
+        )
+        if batch:
+            yield batch
+
+
+def load_us_accidents_columns(csv_path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[ColumnBatch]:
+    """US Accidents as column batches; severity clipped to 1..5."""
+    aliases = {
+        "start": ["Start_Time", "StartTime", "Start Time"],
+        "lat": ["Start_Lat", "Lat", "Latitude"],
+        "lon": ["Start_Lng", "Lng", "Long", "Longitude"],
+        "severity": ["Severity"],
+    }
+    optional = {h: [h] for h in ("City", "State", "ID")}
+    for c in _read_chunks(csv_path, aliases, optional, chunk_rows, "US Accidents"):
+        occurred_at = _to_datetime(c["start"], _parse_us_accidents_dt)
+        lat, ok_lat = _to_float(c["lat"])
+        lon, ok_lon = _to_float(c["lon"])
+        severity = _to_int(c["severity"], default=0, lo=1, hi=5)
+
+        keep = ~np.isnat(occurred_at) & ok_lat & ok_lon
+        batch = _finish(
+            keep, occurred_at, lat, lon, np.full(len(lat), "accident"), severity,
+            {"city": c["City"], "state": c["State"], "id": c["ID"]},
+            {"source": "us_accidents"},
+        )
+        if batch:
+            yield batch
@@ -0,0 +1,325 @@
+"""
+High-throughput ingest path for the external datasets.
+
+Rows from the data_loaders parsers are rendered to CSV on the fly and
+streamed into a temp staging table with COPY ... FROM STDIN, then merged
+into events with a single INSERT ... SELECT (and one rollup update). No
+pydantic or ORM objects are built per row. Column batches from
+columnar_loaders are rendered straight from their arrays. Records already
+in events (same source, source_id, occurred_at) are skipped, so re-running
+a load appends only new records; rows whose source_id is NULL have no key
+and are appended again.
+
+upsert_ingest is the re-runnable variant: rows are merged with
+INSERT ... ON CONFLICT on the (source, source_id, occurred_at) key, one
+transaction per group of byte-range chunks, and the file offset reached is
+committed with each group in ingest_checkpoints, so an interrupted load
+resumes after the last committed chunk.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import os
+import time
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import partitions, rollups
+from .clustering import H3_MAX_RES, h3_cell_int, h3_cells
+from .columnar_loaders import ColumnBatch
+from .data_loaders import EventRow, source_id_sql
+
+STAGE_TABLE = "events_stage"
+STAGE_COLUMNS = ("occurred_at", "lat", "lon", "type", "severity", "properties", "h3_cell")
+# COPY's NULL marker. csv.writer leaves empty strings unquoted, which the
+# default CSV NULL ('') would load as NULL; with \N they stay '' like in the
+# ORM path. (A literal text value \N would load as NULL.)
+COPY_NULL = "\\N"
+
+
+class _CsvStream:
+    """
+    Minimal file-like object for cursor.copy_expert: each read() renders the
+    next `chunk_rows` rows as CSV, so the whole file is never held in memory.
+    """
+
+    def __init__(self, rows: Iterable[EventRow], chunk_rows: int = 10_000):
+        self._rows: Iterator[EventRow] = iter(rows)
+        self._chunk_rows = chunk_rows
+        self.count = 0
+
+    def read(self, size: int = -1) -> str:
+        buf = io.StringIO()
+        w = csv.writer(buf, lineterminator="\n")
+        n = 0
+        for occurred_at, lat, lon, type_, severity, properties in islice(self._rows, self._chunk_rows):
+            w.writerow((
+                occurred_at.isoformat(), lat, lon,
+                COPY_NULL if type_ is None else type_,
+                COPY_NULL if severity is None else severity,
+                json.dumps(properties), h3_cell_int(lat, lon),
+            ))
+            n += 1
+        self.count += n
+        return buf.getvalue()
+
+
+class _CsvColumnStream:
+    """Like _CsvStream, but renders one columnar_loaders batch per read()."""
+
+    def __init__(self, batches: Iterable[ColumnBatch]):
+        self._batches: Iterator[ColumnBatch] = iter(batches)
+        self.count = 0
+
+    def read(self, size: int = -1) -> str:
+        for batch in self._batches:
+            lat = batch["lat"].tolist()
+            if not lat:
+                continue  # an empty read would end the COPY
+            lon = batch["lon"].tolist()
+            buf = io.StringIO()
+            csv.writer(buf, lineterminator="\n").writerows(zip(
+                np.datetime_as_string(batch["occurred_at"], unit="s").tolist(),
+                lat, lon,
+                batch["type"].tolist(),
+                batch["severity"].tolist(),
+                map(json.dumps, batch["properties"]),
+                h3_cells(batch["lat"], batch["lon"], H3_MAX_RES).astype(np.int64).tolist(),
+            ))
+            self.count += len(lat)
+            return buf.getvalue()
+        return ""
+
+
+def copy_ingest(db: Session, rows: Iterable[EventRow], limit: Optional[int] = None) -> int:
+    """
+    Stream `rows` into events via COPY + one merge statement; returns rows
+    inserted. Prints COPY/merge throughput.
+    """
+    if limit is not None:
+        rows = islice(rows, limit)
+    return _copy_and_merge(db, _CsvStream(rows))
+
+
+def copy_ingest_columns(db: Session, batches: Iterable[ColumnBatch], limit: Optional[int] = None) -> int:
+    """Same as copy_ingest for columnar_loaders batches (no per-row tuples)."""
+    return _copy_and_merge(db, _CsvColumnStream(_limit_batches(batches, limit)))
+
+
+def _limit_batches(batches: Iterable[ColumnBatch], limit: Optional[int]) -> Iterator[ColumnBatch]:
+    remaining = limit
+    for batch in batches:
+        if remaining is not None:
+            if remaining <= 0:
+                return
+            if len(batch["lat"]) > remaining:
+                batch = {k: v[:remaining] for k, v in batch.items()}
+            remaining -= len(batch["lat"])
+        yield batch
+
+
+def _copy_stage(db: Session, stream) -> float:
+    """COPY `stream` into a fresh temp stage table; returns seconds taken."""
+    cols = ", ".join(STAGE_COLUMNS)
+    db.execute(text(
+        f"CREATE TEMP TABLE {STAGE_TABLE} ("
+        "occurred_at TIMESTAMPTZ NOT NULL, lat DOUBLE PRECISION NOT NULL, "
+        "lon DOUBLE PRECISION NOT NULL, type TEXT, severity INTEGER, "
+        "properties JSONB, h3_cell BIGINT"
+        ") ON COMMIT DROP"
+    ))
+
+    t0 = time.perf_counter()
+    raw = db.connection().connection
+    with raw.cursor() as cur:
+        cur.copy_expert(
+            f"COPY {STAGE_TABLE} ({cols}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')", stream, size=1 << 20,
+        )
+    return time.perf_counter() - t0
+
+
+def _ensure_stage_partitions(db: Session) -> None:
+    lo, hi = db.execute(text(f"SELECT min(occurred_at), max(occurred_at) FROM {STAGE_TABLE}")).one()
+    partitions.ensure_partitions(db, (lo, hi))
+
+
+def _copy_and_merge(db: Session, stream) -> int:
+    cols = ", ".join(STAGE_COLUMNS)
+    t0 = time.perf_counter()
+    t_copy = _copy_stage(db, stream)
+    print(f" COPY: {stream.count} rows in {t_copy:.1f}s ({_rate(stream.count, t_copy)} rows/s)")
+
+    t1 = time.perf_counter()
+    _ensure_stage_partitions(db)
+    # records already loaded (same source, source_id, occurred_at) are skipped
+    db.execute(text("CREATE TEMP TABLE events_inserted (id BIGINT) ON COMMIT DROP"))
+    inserted = db.execute(text(
+        f"WITH ins AS (INSERT INTO events ({cols}) SELECT {cols} FROM {STAGE_TABLE}"
+        " ON CONFLICT DO NOTHING RETURNING id"
+        ") INSERT INTO events_inserted SELECT id FROM ins"
+    )).rowcount
+    if inserted == stream.count:
+        rollups.apply_table(db, STAGE_TABLE)
+    else:
+        rollups.apply_query(db, "SELECT id FROM events_inserted", +1)
+    db.commit()
+    t_merge = time.perf_counter() - t1
+
+    total = time.perf_counter() - t0
+    skipped = stream.count - inserted
+    print(
+        f" merge: {inserted} rows{f' ({skipped} already loaded)' if skipped else ''} in {t_merge:.1f}s; "
+        f"total {total:.1f}s ({_rate(inserted, total)} rows/s)"
+    )
+    return inserted
+
+
+# ---------------- upsert ingest ----------------
+
+# rows per merge transaction (whole chunks are grouped up to this size)
+UPSERT_COMMIT_ROWS = 250_000
+_VALUE_COLUMNS = ("lat", "lon", "type", "severity", "properties")
+
+
+def _upsert_stage(db: Session) -> Tuple[int, int]:
+    """
+    Merge the stage table into events on the unique record key; returns
+    (inserted, updated). The last row wins when the stage holds a key
+    twice, and unchanged rows are left alone. Rollups get -1 for the old
+    values of changed rows and +1 for every row written.
+    """
+    cols = ", ".join(STAGE_COLUMNS)
+    sid = source_id_sql("s.properties")
+    _ensure_stage_partitions(db)
+
+    key = f"s.occurred_at, s.properties->>'source', {sid}, CASE WHEN {sid} IS NULL THEN s.ctid END"
+    db.execute(text(
+        f"CREATE TEMP TABLE events_stage_uniq ON COMMIT DROP AS "
+        f"SELECT DISTINCT ON ({key}) s.*, {sid} AS source_id "
+        f"FROM {STAGE_TABLE} s ORDER BY {key}, s.ctid DESC"
+    ))
+
+    old = ", ".join(f"e.{c}" for c in _VALUE_COLUMNS)
+    new = ", ".join(f"u.{c}" for c in _VALUE_COLUMNS)
+    db.execute(text(
+        "CREATE TEMP TABLE events_changed ON COMMIT DROP AS "
+        "SELECT e.id FROM events_stage_uniq u JOIN events e "
+        "ON e.source = u.properties->>'source' AND e.source_id = u.source_id AND e.occurred_at = u.occurred_at "
+        f"WHERE ({old}) IS DISTINCT FROM ({new})"
+    ))
+    rollups.apply_query(db, "SELECT id FROM events_changed", -1)
+
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in (*_VALUE_COLUMNS, "h3_cell"))
+    current = ", ".join(f"events.{c}" for c in _VALUE_COLUMNS)
+    excluded = ", ".join(f"EXCLUDED.{c}" for c in _VALUE_COLUMNS)
+    db.execute(text("CREATE TEMP TABLE events_upserted (id BIGINT) ON COMMIT DROP"))
+    db.execute(text(
+        "WITH up AS ("
+        f" INSERT INTO events ({cols}) SELECT {cols} FROM events_stage_uniq"
+        " ON CONFLICT (source, source_id, occurred_at) DO UPDATE SET " + updates +
+        f" WHERE ({current}) IS DISTINCT FROM ({excluded})"
+        " RETURNING id"
+        ") INSERT INTO events_upserted SELECT id FROM up"
+    ))
+    rollups.apply_query(db, "SELECT id FROM events_upserted", +1)
+
+    written, updated = db.execute(text(
+        "SELECT (SELECT count(*) FROM events_upserted), (SELECT count(*) FROM events_changed)"
+    )).one()
+    return written - updated, updated
+
+
+def _fingerprint(path: str) -> Tuple[int, float]:
+    st = os.stat(path)
+    return st.st_size, st.st_mtime
+
+
+def read_checkpoint(db: Session, dataset: str, path: str) -> Tuple[Optional[int], int]:
+    """(byte offset to resume from, rows merged so far); (None, 0) to start over."""
+    row = db.execute(text(
+        "SELECT path, file_size, file_mtime, byte_offset, rows FROM ingest_checkpoints WHERE dataset = :d"
+    ), {"d": dataset}).first()
+    if row is None:
+        return None, 0
+    if (row.path, row.file_size, row.file_mtime) != (path, *_fingerprint(path)):
+        print(f" checkpoint for {dataset} is for another file version; starting over")
+        return None, 0
+    return row.byte_offset, row.rows
+
+
+def _save_checkpoint(db: Session, dataset: str, path: str, offset: int, rows: int) -> None:
+    size, mtime = _fingerprint(path)
+    db.execute(text(
+        "INSERT INTO ingest_checkpoints (dataset, path, file_size, file_mtime, byte_offset, rows) "
+        "VALUES (:d, :p, :s, :m, :o, :r) "
+        "ON CONFLICT (dataset) DO UPDATE SET path = EXCLUDED.path, file_size = EXCLUDED.file_size, "
+        "file_mtime = EXCLUDED.file_mtime, byte_offset = EXCLUDED.byte_offset, rows = EXCLUDED.rows, "
+        "updated_at = now()"
+    ), {"d": dataset, "p": path, "s": size, "m": mtime, "o": offset, "r": rows})
+
+
+def upsert_ingest(
+    db: Session,
+    dataset: str,
+    path: str,
+    chunks: Iterable[Tuple[int, List[EventRow]]],
+    start_rows: int = 0,
+    limit: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    Upsert (end offset, rows) chunks from parallel_loaders.iter_chunks;
+    returns (inserted, updated). After each transaction the checkpoint
+    points at the end of the last chunk merged, so a re-run passes it back
+    as iter_chunks(start=...). `start_rows` is the row count already
+    merged (for `limit` and the checkpoint).
+    """
+    done = start_rows
+    inserted = updated = 0
+    group: List[EventRow] = []
+    offset = saved = None
+
+    def flush(complete: bool) -> None:
+        nonlocal inserted, updated, group, saved
+        t0 = time.perf_counter()
+        stream = _CsvStream(group)
+        _copy_stage(db, stream)
+        ins, upd = _upsert_stage(db)
+        # a chunk cut short by `limit` is not checkpointed as done
+        if complete and offset is not None:
+            _save_checkpoint(db, dataset, path, offset, done)
+            saved = offset
+        db.commit()
+        inserted += ins
+        updated += upd
+        dt = time.perf_counter() - t0
+        print(f" upsert: {stream.count} rows ({ins} new, {upd} changed) in {dt:.1f}s; "
+              f"checkpoint at byte {saved or 0:,}, {done:,} rows so far")
+        group = []
+
+    for end, rows in chunks:
+        if limit is not None and done + len(rows) > limit:
+            group.extend(rows[: max(limit - done, 0)])
+            done = max(limit, done)
+            flush(False)
+            return inserted, updated
+        group.extend(rows)
+        done += len(rows)
+        offset = end
+        if len(group) >= UPSERT_COMMIT_ROWS or (limit is not None and done >= limit):
+            flush(True)
+            if limit is not None and done >= limit:
+                return inserted, updated
+    if group or offset != saved:
+        flush(True)
+    return inserted, updated
+
+
+def _rate(n: int, seconds: float) -> str:
+    return f"{n / seconds:,.0f}" if seconds > 0 else "n/a"
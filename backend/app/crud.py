@@ -1,91 +1,938 @@
 from __future__ import annotations
-from typing import Iterable, Optional, Tuple, List
-from datetime import datetime
+from typing import Iterable, Iterator, Optional, Sequence, Tuple, List, Union
+from datetime import datetime, timedelta, timezone
 import logging
+import math
+import os
 
+import h3
+import numpy as np
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import Row, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import SQLAlchemyError
 
-from . import models, schemas
+from . import models, schemas, clustering, partitions, rollups, tiles, workers
 
 BBox = Tuple[float, float, float, float]
+# one bbox, or several OR-ed together (e.g. both halves of an antimeridian split)
+Region = Union[BBox, Sequence[BBox]]
 logger = logging.getLogger("uvicorn.error")
 
+# Records already stored (same source, source_id, occurred_at: the unique
+# idx_events_source_record) are skipped, so re-posting or re-loading a batch
+# appends only new records. Rows without a source_id have no key and are
+# always inserted.
+_INSERT_EVENTS = pg_insert(models.Event).on_conflict_do_nothing().returning(models.Event.id)
+
+
+def _insert_rows(items: List[schemas.EventIn]) -> List[dict]:
+    return [{**i.model_dump(), "h3_cell": clustering.h3_cell_int(i.lat, i.lon)} for i in items]
+
+
 def bulk_insert_events(db: Session, items: List[schemas.EventIn]) -> int:
-    objs = [models.Event(**i.model_dump()) for i in items]
-    db.add_all(objs)
+    """Insert new records; returns how many were inserted (duplicates are skipped)."""
+    if not items:
+        return 0
+    partitions.ensure_partitions(db, (i.occurred_at for i in items))
+    ids = db.execute(_INSERT_EVENTS, _insert_rows(items)).scalars().all()
+    rollups.apply_events(db, ids, +1)
     db.commit()
-    return len(objs)
-
-def bulk_update_events(db:Session, items):
-    count = 0
-    for event in items:
-        try:
-            db.execute(text("""
-                        UPDATE events
-                        SET type = COALESCE(:type, type),
-                            occurred_at = COALESCE(:date, occurred_at)
-                            severity = COALESCE(:severity, severity)
-                        WHERE id = :id
-                        """), {"id":event.id, "type":event.type, "severity":event.severity, "date":event.occurred_at})
-            count += 1
-        except SQLAlchemyError as e:
-            logger.error("SQL UPDATE ERROR for id %s: %s", event.id, str(e))
-            logger.exception(e)
-            db.rollback()
-            raise
-    
+    return len(ids)
+
+# One statement per chunk: the changes travel as parallel arrays and are
+# joined to events by id. NULL fields keep the current value.
+_BULK_UPDATE = text("""
+    UPDATE events e
+    SET type = COALESCE(v.type, e.type),
+        occurred_at = COALESCE(v.occurred_at, e.occurred_at),
+        severity = COALESCE(v.severity, e.severity)
+    FROM unnest(CAST(:ids AS bigint[]), CAST(:types AS text[]),
+                CAST(:dates AS timestamptz[]), CAST(:severities AS integer[]))
+         AS v(id, type, occurred_at, severity)
+    WHERE e.id = v.id
+    RETURNING e.id
+""")
+BULK_UPDATE_CHUNK = 20_000
+
+
+def _update_chunks(items: List[schemas.EventUpdate]) -> Iterator[dict]:
+    """Array parameters for _BULK_UPDATE; a repeated id keeps its last change."""
+    latest = {event.id: event for event in items}
+    rows = list(latest.values())
+    for k in range(0, len(rows), BULK_UPDATE_CHUNK):
+        chunk = rows[k:k + BULK_UPDATE_CHUNK]
+        yield {
+            "ids": [e.id for e in chunk],
+            "types": [e.type for e in chunk],
+            "dates": [None if e.occurred_at is None else _as_utc(e.occurred_at) for e in chunk],
+            # the table editor sends severity as a string
+            "severities": [None if e.severity in (None, "") else int(e.severity) for e in chunk],
+        }
+
+
+def bulk_update_events(db: Session, items: List[schemas.EventUpdate]) -> Tuple[int, List[int]]:
+    """Apply the changes set-based; returns (rows updated, ids that do not exist)."""
+    chunks = list(_update_chunks(items))
+    ids = [i for c in chunks for i in c["ids"]]
+    partitions.ensure_partitions(db, (event.occurred_at for event in items))
+    rollups.apply_events(db, ids, -1)
+    updated: set[int] = set()
+    try:
+        for params in chunks:
+            updated.update(db.execute(_BULK_UPDATE, params).scalars())
+    except SQLAlchemyError as e:
+        logger.error("bulk UPDATE failed for %d ids: %s", len(ids), str(e))
+        db.rollback()
+        raise
+
+    rollups.apply_events(db, list(updated), +1)
     db.commit()
-    return count
+    return len(updated), [i for i in ids if i not in updated]
 
 def _as_array_param(values: Iterable[str]) -> list[str]:
     return list(dict.fromkeys(v for v in values if v))
 
 
+def _event_filters(
+    *,
+    bbox: Optional[Region] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    sources: Optional[Iterable[str]] = None,
+) -> Tuple[str, dict]:
+    """WHERE clause + bind params shared by every events query."""
+    src_list = _as_array_param(sources or [])
+
+    sql = "WHERE TRUE "
+    params: dict = {}
+    sql += _time_clause("occurred_at", start, end, params)
+
+    sql += _region_clause(
+        bbox, params,
+        "(ST_Intersects(geom::geometry, ST_MakeEnvelope(:minx{i},:miny{i},:maxx{i},:maxy{i},4326))"
+        " AND lon {ltx} :maxx{i} AND lat {lty} :maxy{i})",
+    )
+
+    if src_list:
+        sql += _source_clause(src_list, params, "source", "type")
+
+    return sql, params
+
+
+def _as_utc(t: datetime) -> datetime:
+    return t.replace(tzinfo=timezone.utc) if t.tzinfo is None else t
+
+
+def _time_clause(col: str, start: Optional[datetime], end: Optional[datetime], params: dict) -> str:
+    """
+    Range predicates for the given bounds only. Open bounds are left out
+    rather than bound as datetime.min/max, and naive times are taken as UTC,
+    so the comparison is a plain timestamptz one the planner can prune
+    events partitions with.
+    """
+    sql = ""
+    if start is not None:
+        params["start"] = _as_utc(start)
+        sql += f"AND {col} >= :start "
+    if end is not None:
+        params["end"] = _as_utc(end)
+        sql += f"AND {col} < :end "
+    return sql
+
+
+def _regions(bbox: Optional[Region]) -> List[BBox]:
+    if not bbox:
+        return []
+    if isinstance(bbox[0], (int, float)):
+        return [tuple(bbox)]
+    return [tuple(b) for b in bbox]
+
+
+def _max_edge_op(edge: float, world_edge: float) -> str:
+    return "<=" if edge >= world_edge else "<"
+
+
+def _region_clause(bbox: Optional[Region], params: dict, template: str) -> str:
+    """
+    One predicate per box, OR-ed, so a split viewport is still a single
+    statement (one index scan per box, one global LIMIT / ORDER BY).
+
+    Boxes are half-open (min <= x < max), so a point or cell center on the
+    edge shared by two tiles is counted by one of them only. The template's
+    {ltx}/{lty} comparisons stay inclusive on the 180° / 90° world edges,
+    where there is no neighbour to pick the point up.
+    """
+    preds = []
+    for i, (minx, miny, maxx, maxy) in enumerate(_regions(bbox)):
+        params.update({f"minx{i}": minx, f"miny{i}": miny, f"maxx{i}": maxx, f"maxy{i}": maxy})
+        preds.append(template.format(i=i, ltx=_max_edge_op(maxx, 180.0), lty=_max_edge_op(maxy, 90.0)))
+    return "AND (" + " OR ".join(preds) + ") " if preds else ""
+
+
+def _source_clause(src_list: list[str], params: dict, source_col: str, type_col: str) -> str:
+    # source filter: 'source' OR 'type = demo' for simulated points. One
+    # equality per source rather than = ANY(array), so the planner can prove
+    # the per-source partial indexes (see migrations.py) apply.
+    preds = []
+    for i, src in enumerate(src_list):
+        params[f"source{i}"] = src
+        preds.append(f"{source_col} = :source{i}")
+    if "demo" in {s.lower() for s in src_list}:
+        preds.append(f"{type_col} = 'demo'")
+    return "AND (" + " OR ".join(preds) + ") "
+
+
 def query_events(
     db: Session,
     *,
-    bbox: Optional[BBox] = None,
+    bbox: Optional[Region] = None,
     start: Optional[datetime] = None,
     end: Optional[datetime] = None,
     limit: int = 20000,
     sources: Optional[Iterable[str]] = None,
+    after_id: Optional[int] = None,
 ):
-    start = start or datetime.min
-    end = end or datetime.max
+    """
+    Events matching the filters. With after_id, only ids > after_id are
+    returned, ordered by id (keyset pagination).
+    """
+    sql, params = _events_sql("*", bbox=bbox, start=start, end=end, limit=limit,
+                              sources=sources, after_id=after_id)
+    q = db.query(models.Event).from_statement(text(sql).bindparams(**params))
+    return q.all()
+
+
+def _events_sql(columns: str, *, bbox, start, end, limit, sources, after_id) -> Tuple[str, dict]:
+    where, params = _event_filters(bbox=bbox, start=start, end=end, sources=sources)
+    sql = f"SELECT {columns} FROM events " + where + _keyset(after_id, params) + "LIMIT :limit"
+    params["limit"] = limit
+    return sql, params
+
+
+EVENT_COLUMNS = ("id", "occurred_at", "lat", "lon", "type", "severity", "properties")
+# map-layer columns (packed responses): the source instead of the whole JSON
+EVENT_POINT_COLUMNS = ("id", "occurred_at", "lat", "lon", "type", "severity", "source")
+
+
+# /events?sample=true: at most this many rows per H3 cell, the cell size
+# picked so that the viewport spans about limit / SAMPLE_PER_CELL cells
+SAMPLE_PER_CELL = 4
+WORLD: BBox = (-180.0, -90.0, 180.0, 90.0)
+
+
+def _sample_sql(columns: str, *, res, per_cell, bbox, start, end, limit, sources) -> Tuple[str, dict]:
+    """
+    Spatially stratified sample: rows are ranked inside their res-`res`
+    cell in a stable pseudo-random order (hashint8(id), so panning keeps
+    the same points) and taken rank by rank, so when `limit` cuts the
+    result every cell still has its first points. Rows without an h3_cell
+    yet fall back to a lat/lon grid. Every matching row is counted
+    (`total`) in the same scan.
+    """
+    where, params = _event_filters(bbox=bbox, start=start, end=end, sources=sources)
+    keep, setbits = clustering.h3_parent_masks(res)
+    params.update({"keep": keep, "setbits": setbits, "per_cell": per_cell, "limit": limit,
+                   "grid": 2.0 ** res})
+    sql = (
+        f"SELECT {columns}, total FROM ("
+        f" SELECT {columns}, hashint8(id) AS hash, count(*) OVER () AS total,"
+        " row_number() OVER (PARTITION BY (h3_cell & :keep) | :setbits,"
+        "  CASE WHEN h3_cell IS NULL THEN floor(lat * :grid) END,"
+        "  CASE WHEN h3_cell IS NULL THEN floor(lon * :grid) END"
+        "  ORDER BY hashint8(id)) AS rank"
+        " FROM events " + where +
+        ") s WHERE rank <= :per_cell ORDER BY rank, hash LIMIT :limit"
+    )
+    return sql, params
+
+
+def iter_events(
+    db: Session,
+    *,
+    bbox: Optional[Region] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 20000,
+    sources: Optional[Iterable[str]] = None,
+    after_id: Optional[int] = None,
+    batch_size: int = 2000,
+    columns: Iterable[str] = EVENT_COLUMNS,
+) -> Iterator[Row]:
+    """
+    Same query as query_events, but streamed through a server-side cursor
+    (`batch_size` rows per fetch) as plain rows of `columns` instead of ORM
+    objects.
+    """
+    sql, params = _events_sql(", ".join(columns), bbox=bbox, start=start, end=end, limit=limit,
+                              sources=sources, after_id=after_id)
+    result = db.execute(
+        text(sql).execution_options(stream_results=True, yield_per=batch_size), params,
+    )
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def _keyset(after_id: Optional[int], params: dict) -> str:
+    if after_id is None:
+        return ""
+    params["after_id"] = after_id
+    return "AND id > :after_id ORDER BY id "
+
+
+def _h3_counts_sql(*, res, bbox, start, end, sources, use_rollup) -> Tuple[str, dict]:
+    if use_rollup and rollups.covers(res, start, end):
+        return _h3_rollup_sql(res=res, bbox=bbox, start=start, end=end, sources=sources)
+    where, params = _event_filters(bbox=bbox, start=start, end=end, sources=sources)
+    keep, setbits = clustering.h3_parent_masks(res)
+    params.update({"keep": keep, "setbits": setbits})
+    return (
+        "SELECT (h3_cell & :keep) | :setbits AS cell, count(*) AS n FROM events "
+        + where + "AND h3_cell IS NOT NULL GROUP BY 1"
+    ), params
+
+
+# Rows inserted outside the API (e.g. the psql seed in the README) have no
+# h3_cell until `python -m app.h3_backfill` runs; up to H3_PENDING_MAX of them
+# per query are binned in Python (clustering.h3_stored_cells, the same cells
+# the backfill will store). Beyond that the request is refused until the
+# backfill catches up.
+H3_PENDING_MAX = int(os.getenv("H3_PENDING_MAX", "200000"))
+
+
+class H3BackfillPending(RuntimeError):
+    """Too many matching events have no h3_cell yet to bin them per request."""
+
+
+def _pending_limit(sql: str, params: dict) -> Tuple[str, dict]:
+    return sql + " LIMIT :pending_limit", {**params, "pending_limit": H3_PENDING_MAX + 1}
+
+
+def _checked_pending(rows: List[Row]) -> List[Row]:
+    if len(rows) > H3_PENDING_MAX:
+        raise H3BackfillPending(
+            f"more than {H3_PENDING_MAX} matching events have no h3_cell yet; "
+            "run `python -m app.h3_backfill` (or narrow the query)"
+        )
+    return rows
+
+
+def _h3_pending_sql(*, bbox, start, end, sources) -> Tuple[str, dict]:
+    where, params = _event_filters(bbox=bbox, start=start, end=end, sources=sources)
+    return _pending_limit("SELECT lat, lon FROM events " + where + "AND h3_cell IS NULL", params)
+
+
+# When the counts come from the rollup, the viewport selects whole cells by
+# their center, and pending rows are counted the same way: they are read
+# from the viewport widened by a cell's radius (plus the few percent a
+# res-15 descendant sticks out of its parent), binned, and only the bins of
+# cells centered inside the viewport are kept.
+_CENTER_MARGIN = 1.25
+_KM_PER_DEG = 111.195
+
+
+def _pending_region(bbox: Optional[Region], res: int) -> Optional[List[BBox]]:
+    """The viewport widened so it holds every point of the cells centered in it."""
+    if not bbox:
+        return None
+    dy = _CENTER_MARGIN * h3.edge_length(res, unit="km") / _KM_PER_DEG
+    out = []
+    for minx, miny, maxx, maxy in _regions(bbox):
+        miny, maxy = max(miny - dy, -90.0), min(maxy + dy, 90.0)
+        dx = dy / max(math.cos(math.radians(max(abs(miny), abs(maxy)))), 1e-3)
+        out.append((max(minx - dx, -180.0), miny, min(maxx + dx, 180.0), maxy))
+    return out
+
+
+def _centered_in(bins: dict, bbox: Optional[Region], cell_of=lambda key: key) -> dict:
+    """The bins whose cell center is in the viewport (half-open, like _region_clause)."""
+    if not bbox or not bins:
+        return bins
+    keys = list(bins)
+    lat, lon = clustering.h3_centers([cell_of(k) for k in keys])
+    inside = np.zeros(len(keys), dtype=bool)
+    for minx, miny, maxx, maxy in _regions(bbox):
+        lt_x = np.less_equal if maxx >= 180.0 else np.less
+        lt_y = np.less_equal if maxy >= 90.0 else np.less
+        inside |= (lon >= minx) & lt_x(lon, maxx) & (lat >= miny) & lt_y(lat, maxy)
+    return {k: bins[k] for k, keep in zip(keys, inside.tolist()) if keep}
+
+
+def _add_bins(bins: dict[str, int], extra: dict[str, int]) -> None:
+    for h, c in extra.items():
+        bins[h] = bins.get(h, 0) + c
+
+
+# Per-cell metrics beyond the count (aggregate_h3_metrics_async):
+#   severity  severity_sum, severity_mean, severity_max (NULL severities skipped)
+#   sources   {source: count}; rows without a source count under their type
+#             (the demo points), like the `sources` filter
+#   types     {type: count}
+#   time      t_min, t_max (occurred_at)
+H3_METRICS = ("severity", "sources", "types", "time")
+
+
+def _h3_metrics_sql(*, res, metrics, bbox, start, end, sources) -> Tuple[str, dict]:
+    where, params = _event_filters(bbox=bbox, start=start, end=end, sources=sources)
+    keep, setbits = clustering.h3_parent_masks(res)
+    params.update({"keep": keep, "setbits": setbits})
+    cols, group = ["(h3_cell & :keep) | :setbits AS cell", "count(*) AS n"], ["1"]
+    if "severity" in metrics:
+        cols += ["sum(severity) AS sev_sum", "count(severity) AS sev_n", "max(severity) AS sev_max"]
+    if "time" in metrics:
+        cols += ["min(occurred_at) AS t_min", "max(occurred_at) AS t_max"]
+    # source/type become grouping keys: still one scan, a few rows per cell
+    if "sources" in metrics:
+        cols.append("coalesce(source, type) AS src")
+        group.append("src")
+    if "types" in metrics:
+        cols.append("type")
+        group.append("type")
+    return (
+        "SELECT " + ", ".join(cols) + " FROM events " + where
+        + "AND h3_cell IS NOT NULL GROUP BY " + ", ".join(group)
+    ), params
+
+
+def _h3_metrics_pending_sql(*, bbox, start, end, sources) -> Tuple[str, dict]:
+    # one row per un-backfilled event, shaped like a _h3_metrics_sql group
+    where, params = _event_filters(bbox=bbox, start=start, end=end, sources=sources)
+    return _pending_limit(
+        "SELECT lat, lon, 1 AS n, severity AS sev_sum, (severity IS NOT NULL)::int AS sev_n, "
+        "severity AS sev_max, occurred_at AS t_min, occurred_at AS t_max, "
+        "coalesce(source, type) AS src, type FROM events " + where + "AND h3_cell IS NULL",
+        params,
+    )
+
+
+def _fold_h3_metrics(out: dict, cells: Iterable[str], rows: Iterable[Row], metrics: Sequence[str]) -> None:
+    for cell, r in zip(cells, rows):
+        m = out.get(cell)
+        if m is None:
+            m = out[cell] = {"count": 0}
+            if "severity" in metrics:
+                m.update(severity_sum=0, severity_n=0, severity_max=None)
+            if "sources" in metrics:
+                m["sources"] = {}
+            if "types" in metrics:
+                m["types"] = {}
+            if "time" in metrics:
+                m.update(t_min=r.t_min, t_max=r.t_max)
+        m["count"] += int(r.n)
+        if "severity" in metrics and r.sev_n:
+            m["severity_sum"] += int(r.sev_sum)
+            m["severity_n"] += int(r.sev_n)
+            m["severity_max"] = r.sev_max if m["severity_max"] is None else max(m["severity_max"], r.sev_max)
+        if "sources" in metrics:
+            m["sources"][r.src] = m["sources"].get(r.src, 0) + int(r.n)
+        if "types" in metrics:
+            m["types"][r.type] = m["types"].get(r.type, 0) + int(r.n)
+        if "time" in metrics:
+            m["t_min"] = min(m["t_min"], r.t_min)
+            m["t_max"] = max(m["t_max"], r.t_max)
+
+
+async def aggregate_h3_metrics_async(
+    db: AsyncSession,
+    *,
+    res: int,
+    metrics: Sequence[str],
+    bbox: Optional[Region] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    sources: Optional[Iterable[str]] = None,
+) -> dict[str, dict]:
+    """
+    {cell: {"count": n, ...}} at `res` with the requested H3_METRICS, from
+    one grouped scan of events (points inside the bbox, like
+    aggregate_h3_async with use_rollup=False: the rollup only holds counts).
+    """
+    unknown = set(metrics) - set(H3_METRICS)
+    if unknown:
+        raise ValueError(f"unknown metrics: {', '.join(sorted(unknown))}")
+    out: dict[str, dict] = {}
+    sql, params = _h3_metrics_sql(res=res, metrics=metrics, bbox=bbox, start=start, end=end, sources=sources)
+    rows = (await db.execute(text(sql), params)).all()
+    _fold_h3_metrics(out, (format(r.cell, "x") for r in rows), rows, metrics)
+
+    sql, params = _h3_metrics_pending_sql(bbox=bbox, start=start, end=end, sources=sources)
+    pending = _checked_pending((await db.execute(text(sql), params)).all())
+    if pending:
+        cells = await workers.run_cpu(
+            clustering.h3_stored_cells,
+            np.array([r.lat for r in pending], dtype=np.float64),
+            np.array([r.lon for r in pending], dtype=np.float64), res,
+        )
+        _fold_h3_metrics(out, (format(c, "x") for c in cells.tolist()), pending, metrics)
+
+    for m in out.values():
+        if "severity" in metrics:
+            n = m.pop("severity_n")
+            m["severity_mean"] = m["severity_sum"] / n if n else None
+            if not n:
+                m["severity_sum"] = None
+    return out
+
+
+def _h3_rollup_sql(
+    *,
+    res: int,
+    bbox: Optional[Region],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    sources: Optional[Iterable[str]],
+) -> Tuple[str, dict]:
+    from_where, params = _rollup_filters(res=res, bbox=bbox, start=start, end=end, sources=sources)
+    sql = (
+        "SELECT r.h3_cell AS cell, sum(r.count) AS n " + from_where
+        + "GROUP BY r.h3_cell HAVING sum(r.count) > 0"
+    )
+    return sql, params
+
+
+def _rollup_filters(*, res, bbox, start, end, sources) -> Tuple[str, dict]:
+    """FROM/WHERE over event_h3_rollup at `res`; the viewport selects cells by center."""
+    sql = (
+        "FROM event_h3_rollup r JOIN h3_cells c ON c.h3_cell = r.h3_cell "
+        "WHERE r.res = :res "
+    )
+    params: dict = {"res": res}
+    sql += _time_clause("r.bucket", start, end, params)
+
+    sql += _region_clause(
+        bbox, params,
+        "(c.lon >= :minx{i} AND c.lon {ltx} :maxx{i} AND c.lat >= :miny{i} AND c.lat {lty} :maxy{i})",
+    )
+
     src_list = _as_array_param(sources or [])
+    if src_list:
+        sql += _source_clause(src_list, params, "r.source", "r.type")
+    return sql, params
+
+
+# Time series: counts per date_bin(step, occurred_at, origin) bucket, where
+# origin is `start` (or TS_EPOCH without one). Whole-day steps over
+# day-aligned ranges are summed from the daily rollup instead of events,
+# plus the rows the rollup does not hold yet (no h3_cell), so totals do not
+# depend on the step.
+TS_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+TS_MAX_BUCKETS = 10_000
+# cells x buckets in one H3 series response
+TS_MAX_VALUES = 2_000_000
+_DAY = timedelta(days=1)
+
+
+def _ts_origin(start: Optional[datetime]) -> datetime:
+    return _as_utc(start) if start is not None else TS_EPOCH
+
+
+def _timeseries_sql(
+    *,
+    step: timedelta,
+    res: Optional[int],
+    bbox: Optional[Region],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    sources: Optional[Iterable[str]],
+    use_rollup: bool,
+) -> Tuple[str, dict]:
+    """(t, n) rows per non-empty bucket, or (t, cell, n) with an H3 `res`."""
+    rollup_res = _ts_rollup_res(step=step, res=res, bbox=bbox, start=start, end=end, use_rollup=use_rollup)
+    if rollup_res is not None:
+        from_where, params = _rollup_filters(res=rollup_res, bbox=bbox, start=start, end=end, sources=sources)
+        cell = "r.h3_cell AS cell, " if res is not None else ""
+        sql = f"SELECT date_bin(:step, r.bucket, :origin) AS t, {cell}sum(r.count) AS n " + from_where
+    else:
+        where, params = _event_filters(bbox=bbox, start=start, end=end, sources=sources)
+        cell = ""
+        if res is not None:
+            keep, setbits = clustering.h3_parent_masks(res)
+            params.update({"keep": keep, "setbits": setbits})
+            cell = "(h3_cell & :keep) | :setbits AS cell, "
+            where += "AND h3_cell IS NOT NULL "
+        sql = f"SELECT date_bin(:step, occurred_at, :origin) AS t, {cell}count(*) AS n FROM events " + where
+    params.update({"step": step, "origin": _ts_origin(start)})
+    sql += "GROUP BY 1, 2" if res is not None else "GROUP BY 1"
+    return sql, params
+
+
+def _ts_rollup_res(*, step, res, bbox, start, end, use_rollup) -> Optional[int]:
+    """
+    Rollup resolution to sum the series from, or None to scan events.
+    Without `res` only series without a viewport use the rollup (at res 0):
+    it selects whole cells by their center, while a plain series counts the
+    points inside the viewport.
+    """
+    if not use_rollup or step % _DAY != timedelta(0) or (res is None and bbox):
+        return None
+    rollup_res = res if res is not None else 0
+    return rollup_res if rollups.covers(rollup_res, start, end) else None
+
+
+def _ts_pending_sql(*, step, bbox, start, end, sources, counted=False) -> Tuple[str, dict]:
+    # rows without an h3_cell yet: binned in Python (see H3_PENDING_MAX),
+    # or only counted per bucket for a series without cells
+    where, params = _event_filters(bbox=bbox, start=start, end=end, sources=sources)
+    params.update({"step": step, "origin": _ts_origin(start)})
+    if counted:
+        return (
+            "SELECT date_bin(:step, occurred_at, :origin) AS t, count(*) AS n FROM events "
+            + where + "AND h3_cell IS NULL GROUP BY 1"
+        ), params
+    return _pending_limit(
+        "SELECT lat, lon, date_bin(:step, occurred_at, :origin) AS t FROM events "
+        + where + "AND h3_cell IS NULL",
+        params,
+    )
+
+
+def _ts_range(
+    times: Iterable[datetime], step: timedelta, start: Optional[datetime], end: Optional[datetime],
+) -> Tuple[Optional[datetime], int]:
+    """(first bucket, bucket count) covering start..end, or the data when a bound is open."""
+    origin = _ts_origin(start)
+    times = list(times)
+    first = origin if start is not None else min(times, default=None)
+    if end is not None:
+        last = origin + ((_as_utc(end) - origin - timedelta(microseconds=1)) // step) * step
+    else:
+        last = max(times, default=None)
+    if first is None or last is None or last < first:
+        return first, 0
+    n = (last - first) // step + 1
+    if n > TS_MAX_BUCKETS:
+        raise ValueError(f"{n} buckets requested (max {TS_MAX_BUCKETS}); use a larger step")
+    return first, n
+
+
+def dense_series(rows: Sequence[Row], step: timedelta, start: Optional[datetime], end: Optional[datetime]) -> dict:
+    """{start, step_s, counts}: one count per bucket, zeros included."""
+    first, n = _ts_range((r.t for r in rows), step, start, end)
+    counts = [0] * n
+    for r in rows:
+        i = (r.t - first) // step
+        if 0 <= i < n:
+            counts[i] += int(r.n)
+    return {"start": first.isoformat() if first else None, "step_s": int(step.total_seconds()), "counts": counts}
+
+
+def dense_h3_series(
+    bins: dict[Tuple[datetime, str], int], step: timedelta, start: Optional[datetime], end: Optional[datetime],
+) -> dict:
+    """{start, step_s, cells, counts}: counts[i] is the dense series of cells[i]."""
+    first, n = _ts_range((t for t, _ in bins), step, start, end)
+    cells = sorted({c for _, c in bins})
+    if len(cells) * n > TS_MAX_VALUES:
+        raise ValueError(f"{len(cells)} cells x {n} buckets (max {TS_MAX_VALUES} values); "
+                         "use a coarser res, a larger step or a smaller viewport")
+    row_of = {c: i for i, c in enumerate(cells)}
+    counts = [[0] * n for _ in cells]
+    for (t, c), v in bins.items():
+        i = (t - first) // step
+        if 0 <= i < n:
+            counts[row_of[c]][i] += v
+    return {"start": first.isoformat() if first else None, "step_s": int(step.total_seconds()),
+            "cells": cells, "counts": counts}
+
+
+MVT_EXTENT = 4096
+# below this zoom, points are thinned to one per MVT_THIN_UNITS grid cell
+# (4 px of a 256 px tile) and each kept point carries the count `n` it stands for
+MVT_FULL_ZOOM = 13
+MVT_THIN_UNITS = 64
+MVT_MAX_FEATURES = 50_000
+
 
-    # base SQL + params
-    if bbox:
-        minx, miny, maxx, maxy = bbox
-        sql = (
-            "SELECT * FROM events "
-            "WHERE occurred_at >= :start AND occurred_at < :end "
-            "AND ST_Intersects(geom::geometry, ST_MakeEnvelope(:minx,:miny,:maxx,:maxy,4326)) "
+def events_mvt(
+    db: Session,
+    *,
+    z: int,
+    x: int,
+    y: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    sources: Optional[Iterable[str]] = None,
+) -> bytes:
+    """
+    Events of tile z/x/y as a Mapbox Vector Tile (layer "events"), built by
+    ST_AsMVT with the same filters as query_events. Feature attributes: id,
+    type, severity, source, occurred_at (epoch seconds) and n.
+    """
+    where, params = _event_filters(bbox=tiles.tile_bbox(z, x, y), start=start, end=end, sources=sources)
+    params.update({"z": z, "x": x, "y": y, "extent": MVT_EXTENT, "max_features": MVT_MAX_FEATURES})
+
+    pts = (
+        "SELECT id, type, severity, source, "
+        "extract(epoch FROM occurred_at)::bigint AS occurred_at, "
+        "ST_AsMVTGeom(ST_Transform(geom::geometry, 3857), ST_TileEnvelope(:z, :x, :y), :extent, 0, false) AS geom "
+        "FROM events " + where
+    )
+    if z >= MVT_FULL_ZOOM:
+        features = (
+            "SELECT id, type, severity, source, occurred_at, 1 AS n, geom "
+            f"FROM ({pts}) p WHERE geom IS NOT NULL ORDER BY id LIMIT :max_features"
         )
-        params = {
-            "start": start, "end": end,
-            "minx": minx, "miny": miny, "maxx": maxx, "maxy": maxy,
-            "limit": limit,
-        }
     else:
-        sql = (
-            "SELECT * FROM events "
-            "WHERE occurred_at >= :start AND occurred_at < :end "
+        params["cell"] = MVT_THIN_UNITS
+        features = (
+            "SELECT DISTINCT ON (cx, cy) id, type, severity, source, occurred_at, n, geom FROM ("
+            "SELECT p.*, floor(ST_X(geom) / :cell) AS cx, floor(ST_Y(geom) / :cell) AS cy, "
+            "count(*) OVER (PARTITION BY floor(ST_X(geom) / :cell), floor(ST_Y(geom) / :cell)) AS n "
+            f"FROM ({pts}) p WHERE geom IS NOT NULL"
+            ") g ORDER BY cx, cy, id LIMIT :max_features"
         )
-        params = {"start": start, "end": end, "limit": limit}
 
-    # source filter: JSON 'source' OR 'type = demo' for simulated points
-    if src_list:
-        want_demo = "demo" in {s.lower() for s in src_list}
-        if want_demo:
-            sql += "AND (properties->>'source' = ANY(:sources) OR type = 'demo') "
-        else:
-            sql += "AND properties->>'source' = ANY(:sources) "
-        params["sources"] = src_list
+    tile = db.execute(text(
+        f"SELECT ST_AsMVT(f, 'events', :extent, 'geom') FROM ({features}) f"
+    ), params).scalar_one()
+    return bytes(tile or b"")
 
-    sql += "LIMIT :limit"
 
-    q = db.query(models.Event).from_statement(text(sql).bindparams(**params))
-    return q.all()
+# ---------------- async variants (AsyncSession / asyncpg) ----------------
+# Same SQL as the sync functions above; rollup maintenance reuses the sync
+# helpers through run_sync, and Python-side CPU work goes to the process pool.
+
+async def bulk_insert_events_async(db: AsyncSession, items: List[schemas.EventIn]) -> int:
+    if not items:
+        return 0
+    await db.run_sync(lambda s: partitions.ensure_partitions(s, (i.occurred_at for i in items)))
+    ids = (await db.execute(_INSERT_EVENTS, _insert_rows(items))).scalars().all()
+    await db.run_sync(lambda s: rollups.apply_events(s, ids, +1))
+    await db.commit()
+    return len(ids)
+
+
+async def bulk_update_events_async(
+    db: AsyncSession, items: List[schemas.EventUpdate],
+) -> Tuple[int, List[int]]:
+    chunks = list(_update_chunks(items))
+    ids = [i for c in chunks for i in c["ids"]]
+    await db.run_sync(lambda s: partitions.ensure_partitions(s, (event.occurred_at for event in items)))
+    await db.run_sync(lambda s: rollups.apply_events(s, ids, -1))
+    updated: set[int] = set()
+    try:
+        for params in chunks:
+            updated.update((await db.execute(_BULK_UPDATE, params)).scalars())
+    except SQLAlchemyError as e:
+        logger.error("bulk UPDATE failed for %d ids: %s", len(ids), str(e))
+        await db.rollback()
+        raise
+
+    await db.run_sync(lambda s: rollups.apply_events(s, list(updated), +1))
+    await db.commit()
+    return len(updated), [i for i in ids if i not in updated]
+
+
+async def query_events_async(
+    db: AsyncSession,
+    *,
+    bbox: Optional[Region] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 20000,
+    sources: Optional[Iterable[str]] = None,
+    after_id: Optional[int] = None,
+):
+    sql, params = _events_sql("*", bbox=bbox, start=start, end=end, limit=limit,
+                              sources=sources, after_id=after_id)
+    result = await db.execute(select(models.Event).from_statement(text(sql).bindparams(**params)))
+    return result.scalars().all()
+
+
+async def fetch_events_async(
+    db: AsyncSession,
+    *,
+    bbox: Optional[Region] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 20000,
+    sources: Optional[Iterable[str]] = None,
+    after_id: Optional[int] = None,
+    columns: Iterable[str] = EVENT_COLUMNS,
+) -> List[Row]:
+    """query_events_async as plain rows of `columns` (like iter_events, not streamed)."""
+    sql, params = _events_sql(", ".join(columns), bbox=bbox, start=start, end=end, limit=limit,
+                              sources=sources, after_id=after_id)
+    return list((await db.execute(text(sql), params)).all())
+
+
+async def events_in_cell_async(
+    db: AsyncSession,
+    *,
+    cell: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 20000,
+    sources: Optional[Iterable[str]] = None,
+):
+    """
+    The events the H3 aggregations count in `cell`: those whose stored
+    res-15 h3_cell has it as parent (a range of cells), plus rows without an
+    h3_cell yet, binned the way the backfill will. This follows the H3
+    hierarchy, not the cell's outline, so it also finds points just outside
+    the hexagon; the widened cell box only lets the geom index narrow the
+    scan.
+    """
+    lo, hi = clustering.h3_descendant_range(cell)
+    where, params = _event_filters(bbox=clustering.h3_cell_box(cell), start=start, end=end, sources=sources)
+    sql = "SELECT * FROM events " + where + "AND h3_cell BETWEEN :lo AND :hi LIMIT :limit"
+    stored = await db.execute(
+        select(models.Event).from_statement(text(sql).bindparams(**params, lo=lo, hi=hi, limit=limit))
+    )
+    out = list(stored.scalars().all())
+    if len(out) >= limit:
+        return out
+
+    sql, params = _pending_limit("SELECT * FROM events " + where + "AND h3_cell IS NULL", params)
+    pending = _checked_pending(list((await db.execute(
+        select(models.Event).from_statement(text(sql).bindparams(**params))
+    )).scalars().all()))
+    if pending:
+        # the res-15 cells the backfill will store
+        cells = clustering.h3_cells(
+            np.array([e.lat for e in pending]), np.array([e.lon for e in pending]), clustering.H3_MAX_RES,
+        ).astype(np.int64)
+        inside = (cells >= lo) & (cells <= hi)
+        out += [e for e, keep in zip(pending, inside.tolist()) if keep][:limit - len(out)]
+    return out
+
+
+async def sample_events_async(
+    db: AsyncSession,
+    *,
+    bbox: Optional[Region] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = 20000,
+    sources: Optional[Iterable[str]] = None,
+    per_cell: int = SAMPLE_PER_CELL,
+    columns: Iterable[str] = EVENT_COLUMNS,
+) -> Tuple[List[Row], int, int]:
+    """(rows, total matching rows, H3 resolution used) for a stratified sample."""
+    area = sum(clustering.bbox_area_km2(*b) for b in (_regions(bbox) or [WORLD]))
+    res = clustering.sample_res(area, max(limit // per_cell, 1))
+    sql, params = _sample_sql(", ".join(columns), res=res, per_cell=per_cell, bbox=bbox,
+                              start=start, end=end, limit=limit, sources=sources)
+    rows = list((await db.execute(text(sql), params)).all())
+    return rows, (rows[0].total if rows else 0), res
+
+
+async def timeseries_async(
+    db: AsyncSession,
+    *,
+    step: timedelta,
+    bbox: Optional[Region] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    sources: Optional[Iterable[str]] = None,
+    use_rollup: bool = False,
+) -> dict:
+    """Event counts per time bucket as a dense series (see dense_series)."""
+    sql, params = _timeseries_sql(step=step, res=None, bbox=bbox, start=start, end=end,
+                                  sources=sources, use_rollup=use_rollup)
+    rows = (await db.execute(text(sql), params)).all()
+    if _ts_rollup_res(step=step, res=None, bbox=bbox, start=start, end=end, use_rollup=use_rollup) is not None:
+        # the rollup only holds rows that have an h3_cell
+        sql, params = _ts_pending_sql(step=step, bbox=bbox, start=start, end=end, sources=sources, counted=True)
+        rows += (await db.execute(text(sql), params)).all()
+    return dense_series(rows, step, start, end)
+
+
+async def h3_timeseries_async(
+    db: AsyncSession,
+    *,
+    step: timedelta,
+    res: int,
+    bbox: Optional[Region] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    sources: Optional[Iterable[str]] = None,
+    use_rollup: bool = False,
+) -> dict:
+    """Per-cell dense series at `res` (see dense_h3_series)."""
+    sql, params = _timeseries_sql(step=step, res=res, bbox=bbox, start=start, end=end,
+                                  sources=sources, use_rollup=use_rollup)
+    bins: dict[Tuple[datetime, str], int] = {}
+    for r in await db.execute(text(sql), params):
+        bins[(r.t, format(r.cell, "x"))] = int(r.n)
+
+    by_center = _ts_rollup_res(step=step, res=res, bbox=bbox, start=start, end=end,
+                               use_rollup=use_rollup) is not None
+    sql, params = _ts_pending_sql(step=step, bbox=_pending_region(bbox, res) if by_center else bbox,
+                                  start=start, end=end, sources=sources)
+    pending: dict[datetime, list] = {}
+    for r in _checked_pending((await db.execute(text(sql), params)).all()):
+        pending.setdefault(r.t, []).append((r.lat, r.lon))
+    if pending:
+        extra = await workers.run_cpu(clustering.h3_bin_keyed, pending, res=res)
+        if by_center:
+            extra = _centered_in(extra, bbox, cell_of=lambda key: key[1])
+        for key, c in extra.items():
+            bins[key] = bins.get(key, 0) + c
+    return dense_h3_series(bins, step, start, end)
+
+
+async def aggregate_h3_async(
+    db: AsyncSession,
+    *,
+    res: int,
+    bbox: Optional[Region] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    sources: Optional[Iterable[str]] = None,
+    use_rollup: bool = False,
+) -> dict[str, int]:
+    """
+    Per-cell counts at `res`, computed in PostgreSQL; no event rows are
+    materialized in Python.
+
+    Events are grouped on the stored res-15 h3_cell and only points inside
+    the bbox are counted. With use_rollup=True, requests that line up with
+    the rollup grain (res <= 9, day-aligned start/end) are read from
+    event_h3_rollup instead, and the viewport selects whole cells by their
+    center (pending rows included, see _centered_in).
+    """
+    sql, params = _h3_counts_sql(res=res, bbox=bbox, start=start, end=end, sources=sources, use_rollup=use_rollup)
+    bins = {format(r.cell, "x"): int(r.n) for r in await db.execute(text(sql), params)}
+
+    by_center = use_rollup and rollups.covers(res, start, end)
+    sql, params = _h3_pending_sql(bbox=_pending_region(bbox, res) if by_center else bbox,
+                                  start=start, end=end, sources=sources)
+    rows = _checked_pending((await db.execute(text(sql), params)).all())
+    pending = np.array([tuple(r) for r in rows], dtype=np.float64)
+    if len(pending):
+        extra = await workers.run_cpu(clustering.h3_bin_stored, pending, res=res)
+        _add_bins(bins, _centered_in(extra, bbox) if by_center else extra)
+    return bins
+
+
+def _density_sql(*, x0, dx, y0, dy, bbox, start, end, sources) -> Tuple[str, dict]:
+    # web mercator grid cells counted from the west/south edge (x0 degrees,
+    # y0 mercator radians); the modulo keeps antimeridian-crossing grids
+    # contiguous
+    where, params = _event_filters(bbox=bbox, start=start, end=end, sources=sources)
+    params.update({"x0": x0, "dx": dx, "y0": y0, "dy": dy})
+    return (
+        "SELECT floor(((lon - :x0) - 360 * floor((lon - :x0) / 360)) / :dx)::int AS ix, "
+        "floor((ln(tan(radians(45 + lat / 2))) - :y0) / :dy)::int AS iy, count(*) AS n "
+        "FROM events " + where + "AND lat BETWEEN -85.06 AND 85.06 GROUP BY 1, 2"
+    ), params
+
+
+async def density_bins_async(
+    db: AsyncSession,
+    *,
+    x0: float, dx: float, y0: float, dy: float,
+    bbox: Optional[Region] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    sources: Optional[Iterable[str]] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Event counts per density grid cell, binned in SQL: (ix, iy, n) arrays."""
+    sql, params = _density_sql(x0=x0, dx=dx, y0=y0, dy=dy, bbox=bbox, start=start, end=end, sources=sources)
+    rows = (await db.execute(text(sql), params)).all()
+    ix, iy, n = zip(*rows) if rows else ((), (), ())
+    return (np.array(ix, dtype=np.int64), np.array(iy, dtype=np.int64), np.array(n, dtype=np.float64))
@@ -2,10 +2,16 @@ import csv
 import io
 import re
 from datetime import datetime
-from typing import Iterator, List, Dict, Optional
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Tuple, Any
 from pathlib import Path
 from .schemas import EventIn
 
+# Every loader parses into plain row tuples in this field order; the
+# load_* functions wrap them into EventIn batches for the ORM path, while
+# the COPY ingest streams the tuples straight to PostgreSQL.
+ROW_FIELDS = ("occurred_at", "lat", "lon", "type", "severity", "properties")
+EventRow = Tuple[datetime, float, float, Optional[str], Optional[int], Dict[str, Any]]
+
 # =========================
 # Helpers: encoding + CSV
 # =========================
@@ -83,6 +89,28 @@ def _first_key(row_or_headers, candidates: list[str]) -> Optional[str]:
             return orig
     return None
 
+def _iter_file(csv_path: str, parse: Callable[[csv.DictReader], Iterator[EventRow]]) -> Iterator[EventRow]:
+    path = Path(csv_path)
+    if not path.exists():
+        print(f"[ERROR] File not found: {csv_path}")
+        return
+
+    reader = _open_reader(csv_path)
+    try:
+        yield from parse(reader)
+    finally:
+        _close_reader(reader)
+
+def _batched_events(rows: Iterable[EventRow], batch_size: int) -> Iterator[List[EventIn]]:
+    batch: List[EventIn] = []
+    for row in rows:
+        batch.append(EventIn(**dict(zip(ROW_FIELDS, row))))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 # =========================
 # NOAA Hail (SWDI)
 # =========================
@@ -101,93 +129,87 @@ def _parse_noaa_time_flexible(z: str) -> datetime:
         int(s[8:10]), int(s[10:12]), int(s[12:14])
     )
 
-def load_noaa_severe_weather(csv_path: str, batch_size: int = 1000) -> Iterator[List[EventIn]]:
+def _parse_noaa_severe_weather(reader: csv.DictReader) -> Iterator[EventRow]:
     """
-    Robust NOAA hail loader.
+    Robust NOAA hail parser.
     Tries flexible encodings, delimiter sniffing, and header aliases.
     """
-    path = Path(csv_path)
-    if not path.exists():
-        print(f"[ERROR] File not found: {csv_path}")
+    # Resolve header names once from fieldnames
+    headers = reader.fieldnames or []
+    time_key = _first_key(headers, ["X.ZTIME", "X_ZTIME", "ZTIME", "X ZTIME", "Time", "X:ZTIME", "XZTIME"])
+    lat_key  = _first_key(headers, ["LAT", "Latitude", "Y"])
+    lon_key  = _first_key(headers, ["LON", "Longitude", "X"])
+
+    if not (time_key and lat_key and lon_key):
+        print(f"[ERROR] NOAA: could not resolve essential columns from headers: {headers[:10]}…")
         return
 
-    batch: List[EventIn] = []
-    reader = _open_reader(csv_path)
-    try:
-        # Resolve header names once from fieldnames
-        headers = reader.fieldnames or []
-        time_key = _first_key(headers, ["X.ZTIME", "X_ZTIME", "ZTIME", "X ZTIME", "Time", "X:ZTIME", "XZTIME"])
-        lat_key  = _first_key(headers, ["LAT", "Latitude", "Y"])
-        lon_key  = _first_key(headers, ["LON", "Longitude", "X"])
+    for i, row in enumerate(reader, start=1):
+        try:
+            occurred_at = _parse_noaa_time_flexible(row.get(time_key, ""))
+            lat = float((row.get(lat_key) or "").strip())
+            lon = float((row.get(lon_key) or "").strip())
+
+            sevprob = int((row.get("SEVPROB") or 0) or 0)
+            maxsize = float((row.get("MAXSIZE") or 0) or 0)
+
+            severity = 1
+            if sevprob >= 80 or maxsize >= 2.0:   severity = 5
+            elif sevprob >= 60 or maxsize >= 1.5: severity = 4
+            elif sevprob >= 40 or maxsize >= 1.0: severity = 3
+            elif sevprob >= 20 or maxsize >= 0.75:severity = 2
+
+            out = (
+                occurred_at, lat, lon, "hail", severity,
+                {
+                    "source": "noaa_severe_weather",
+                    "wsr_id": row.get("WSR_ID", ""),
+                    "cell_id": row.get("CELL_ID", ""),
+                    "severity_prob": sevprob,
+                    "max_size_inches": maxsize,
+                    "range": float((row.get("RANGE") or 0) or 0),
+                    "azimuth": int((row.get("AZIMUTH") or 0) or 0),
+                },
+            )
 
-        if not (time_key and lat_key and lon_key):
-            print(f"[ERROR] NOAA: could not resolve essential columns from headers: {headers[:10]}…")
-            return
+        except Exception as e:
+            # keep going; noisy datasets are expected
+            if i <= 25:
+                print(f"[WARN] NOAA row {i} skipped: {e}")
+            elif i == 26:
+                print("[WARN] NOAA: suppressing further row errors…")
+            continue
 
-        for i, row in enumerate(reader, start=1):
-            try:
-                occurred_at = _parse_noaa_time_flexible(row.get(time_key, ""))
-                lat = float((row.get(lat_key) or "").strip())
-                lon = float((row.get(lon_key) or "").strip())
-
-                sevprob = int((row.get("SEVPROB") or 0) or 0)
-                maxsize = float((row.get("MAXSIZE") or 0) or 0)
-
-                severity = 1
-                if sevprob >= 80 or maxsize >= 2.0:   severity = 5
-                elif sevprob >= 60 or maxsize >= 1.5: severity = 4
-                elif sevprob >= 40 or maxsize >= 1.0: severity = 3
-                elif sevprob >= 20 or maxsize >= 0.75:severity = 2
-
-                evt = EventIn(
-                    occurred_at=occurred_at,
-                    lat=lat,
-                    lon=lon,
-                    type="hail",
-                    severity=severity,
-                    properties={
-                        "source": "noaa_severe_weather",
-                        "wsr_id": row.get("WSR_ID", ""),
-                        "cell_id": row.get("CELL_ID", ""),
-                        "severity_prob": sevprob,
-                        "max_size_inches": maxsize,
-                        "range": float((row.get("RANGE") or 0) or 0),
-                        "azimuth": int((row.get("AZIMUTH") or 0) or 0),
-                    },
-                )
-                batch.append(evt)
-                if len(batch) >= batch_size:
-                    yield batch
-                    batch = []
-
-            except Exception as e:
-                # keep going; noisy datasets are expected
-                if i <= 25:
-                    print(f"[WARN] NOAA row {i} skipped: {e}")
-                elif i == 26:
-                    print("[WARN] NOAA: suppressing further row errors…")
-                continue
+        yield out
 
-    finally:
-        _close_reader(reader)
+def iter_noaa_severe_weather_rows(csv_path: str) -> Iterator[EventRow]:
+    """NOAA hail rows (see ROW_FIELDS) streamed from a CSV file."""
+    return _iter_file(csv_path, _parse_noaa_severe_weather)
 
-    if batch:
-        yield batch
+def load_noaa_severe_weather(csv_path: str, batch_size: int = 1000) -> Iterator[List[EventIn]]:
+    """NOAA hail rows as EventIn batches."""
+    yield from _batched_events(iter_noaa_severe_weather_rows(csv_path), batch_size)
 
 # =========================
 # US Weather Events
 # =========================
 
-def load_us_weather_events(csv_path: str, batch_size: int = 1000) -> Iterator[List[EventIn]]:
+def _parse_us_weather_dt(s: Optional[str]) -> Optional[datetime]:
+    s = (s or "").strip()
+    try:
+        return datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
+    except Exception:
+        # try ISO-ish fallback
+        try:
+            return datetime.fromisoformat(s.replace("Z", "").replace("T", " "))
+        except Exception:
+            return None
+
+def _parse_us_weather_events(reader: csv.DictReader) -> Iterator[EventRow]:
     """
-    Robust US Weather Events loader (sobhanmoosavi/us-weather-events).
+    Robust US Weather Events parser (sobhanmoosavi/us-weather-events).
     Handles encoding quirks and minor header variations.
     """
-    path = Path(csv_path)
-    if not path.exists():
-        print(f"[ERROR] File not found: {csv_path}")
-        return
-
     severity_map = {
         "light": 1,
         "moderate": 3,
@@ -197,95 +219,73 @@ def load_us_weather_events(csv_path: str, batch_size: int = 1000) -> Iterator[Li
         "": 2,
     }
 
-    batch: List[EventIn] = []
-    reader = _open_reader(csv_path)
-    try:
-        headers = reader.fieldnames or []
-        start_key = _first_key(headers, ["StartTime(UTC)", "Start_Time(UTC)", "StartTimeUTC", "Start Time (UTC)", "Start_Time", "StartTime"])
-        end_key   = _first_key(headers, ["EndTime(UTC)", "End_Time(UTC)", "EndTimeUTC", "End Time (UTC)", "End_Time", "EndTime"])
-        lat_key   = _first_key(headers, ["LocationLat", "Lat", "Latitude"])
-        lng_key   = _first_key(headers, ["LocationLng", "Lng", "Long", "Longitude"])
-        type_key  = _first_key(headers, ["Type", "EventType"])
-        sev_key   = _first_key(headers, ["Severity"])
-
-        if not (start_key and lat_key and lng_key and type_key and sev_key):
-            print(f"[ERROR] US Weather: missing essential columns from headers: {headers[:10]}…")
-            return
-
-        for i, row in enumerate(reader, start=1):
-            try:
-                occurred_at = datetime.strptime(row[start_key].strip(), "%Y-%m-%d %H:%M:%S")
-            except Exception:
-                # try ISO-ish fallback
-                try:
-                    occurred_at = datetime.fromisoformat(row[start_key].strip().replace("Z", "").replace("T", " "))
-                except Exception as e:
-                    if i <= 25:
-                        print(f"[WARN] US Weather row {i} time parse: {e}")
-                    continue
+    headers = reader.fieldnames or []
+    start_key = _first_key(headers, ["StartTime(UTC)", "Start_Time(UTC)", "StartTimeUTC", "Start Time (UTC)", "Start_Time", "StartTime"])
+    end_key   = _first_key(headers, ["EndTime(UTC)", "End_Time(UTC)", "EndTimeUTC", "End Time (UTC)", "End_Time", "EndTime"])
+    lat_key   = _first_key(headers, ["LocationLat", "Lat", "Latitude"])
+    lng_key   = _first_key(headers, ["LocationLng", "Lng", "Long", "Longitude"])
+    type_key  = _first_key(headers, ["Type", "EventType"])
+    sev_key   = _first_key(headers, ["Severity"])
 
-            try:
-                lat = float((row.get(lat_key) or "").strip())
-                lon = float((row.get(lng_key) or "").strip())
-            except Exception:
-                if i <= 25:
-                    print(f"[WARN] US Weather row {i} missing/invalid coords")
-                continue
+    if not (start_key and lat_key and lng_key and type_key and sev_key):
+        print(f"[ERROR] US Weather: missing essential columns from headers: {headers[:10]}…")
+        return
 
-            event_type = (row.get(type_key) or "").strip().lower()
-            sev_word = (row.get(sev_key) or "unk").strip().lower()
-            severity = severity_map.get(sev_word, 2)
+    for i, row in enumerate(reader, start=1):
+        occurred_at = _parse_us_weather_dt(row[start_key])
+        if occurred_at is None:
+            if i <= 25:
+                print(f"[WARN] US Weather row {i} time parse: {row[start_key]!r}")
+            continue
 
-            end_iso = None
-            if end_key and row.get(end_key):
-                try:
-                    end_dt = datetime.strptime(row[end_key].strip(), "%Y-%m-%d %H:%M:%S")
-                    end_iso = end_dt.isoformat()
-                except Exception:
-                    try:
-                        end_dt = datetime.fromisoformat(row[end_key].strip().replace("Z", "").replace("T", " "))
-                        end_iso = end_dt.isoformat()
-                    except Exception:
-                        end_iso = None
-
-            precip = 0.0
-            for pkey in ("Precipitation(in)", "Precipitation", "PrecipIn"):
-                if pkey in (reader.fieldnames or []):
-                    try:
-                        precip = float((row.get(pkey) or 0) or 0)
-                    except Exception:
-                        precip = 0.0
-                    break
-
-            evt = EventIn(
-                occurred_at=occurred_at,
-                lat=lat,
-                lon=lon,
-                type=event_type,
-                severity=severity,
-                properties={
-                    "source": "us_weather_events",
-                    "event_id": row.get("EventId", ""),
-                    "end_time": end_iso,
-                    "precipitation_inches": precip,
-                    "airport_code": row.get("AirportCode", ""),
-                    "city": row.get("City", ""),
-                    "county": row.get("County", ""),
-                    "state": row.get("State", ""),
-                    "zipcode": row.get("ZipCode", ""),
-                },
-            )
-            batch.append(evt)
+        try:
+            lat = float((row.get(lat_key) or "").strip())
+            lon = float((row.get(lng_key) or "").strip())
+        except Exception:
+            if i <= 25:
+                print(f"[WARN] US Weather row {i} missing/invalid coords")
+            continue
 
-            if len(batch) >= batch_size:
-                yield batch
-                batch = []
+        event_type = (row.get(type_key) or "").strip().lower()
+        sev_word = (row.get(sev_key) or "unk").strip().lower()
+        severity = severity_map.get(sev_word, 2)
 
-    finally:
-        _close_reader(reader)
+        end_iso = None
+        if end_key and row.get(end_key):
+            end_dt = _parse_us_weather_dt(row[end_key])
+            end_iso = end_dt.isoformat() if end_dt else None
 
-    if batch:
-        yield batch
+        precip = 0.0
+        for pkey in ("Precipitation(in)", "Precipitation", "PrecipIn"):
+            if pkey in (reader.fieldnames or []):
+                try:
+                    precip = float((row.get(pkey) or 0) or 0)
+                except Exception:
+                    precip = 0.0
+                break
+
+        yield (
+            occurred_at, lat, lon, event_type, severity,
+            {
+                "source": "us_weather_events",
+                "event_id": row.get("EventId", ""),
+                "end_time": end_iso,
+                "precipitation_inches": precip,
+                "airport_code": row.get("AirportCode", ""),
+                "city": row.get("City", ""),
+                "county": row.get("County", ""),
+                "state": row.get("State", ""),
+                "zipcode": row.get("ZipCode", ""),
+            },
+        )
+
+def iter_us_weather_events_rows(csv_path: str) -> Iterator[EventRow]:
+    """US Weather Events rows (see ROW_FIELDS) streamed from a CSV file."""
+    return _iter_file(csv_path, _parse_us_weather_events)
+
+def load_us_weather_events(csv_path: str, batch_size: int = 1000) -> Iterator[List[EventIn]]:
+    """US Weather Events rows as EventIn batches."""
+    yield from _batched_events(iter_us_weather_events_rows(csv_path), batch_size)
 
 # =========================
 # US Accidents
@@ -305,71 +305,82 @@ def _parse_us_accidents_dt(s: str) -> Optional[datetime]:
     except Exception:
         return None
 
-def load_us_accidents(csv_path: str, batch_size: int = 1000) -> Iterator[List[EventIn]]:
+def _parse_us_accidents(reader: csv.DictReader) -> Iterator[EventRow]:
     """
     sobhanmoosavi/us-accidents (e.g., US_Accidents_March23.csv)
     """
-    path = Path(csv_path)
-    if not path.exists():
-        print(f"[ERROR] File not found: {csv_path}")
+    headers = reader.fieldnames or []
+    start_key = _first_key(headers, ["Start_Time", "StartTime", "Start Time"])
+    lat_key   = _first_key(headers, ["Start_Lat", "Lat", "Latitude"])
+    lng_key   = _first_key(headers, ["Start_Lng", "Lng", "Long", "Longitude"])
+    sev_key   = _first_key(headers, ["Severity"])
+
+    if not (start_key and lat_key and lng_key and sev_key):
+        print(f"[ERROR] US Accidents: missing essential columns from headers: {headers[:10]}…")
         return
 
-    batch: List[EventIn] = []
-    reader = _open_reader(csv_path)
-    try:
-        headers = reader.fieldnames or []
-        start_key = _first_key(headers, ["Start_Time", "StartTime", "Start Time"])
-        lat_key   = _first_key(headers, ["Start_Lat", "Lat", "Latitude"])
-        lng_key   = _first_key(headers, ["Start_Lng", "Lng", "Long", "Longitude"])
-        sev_key   = _first_key(headers, ["Severity"])
+    for i, row in enumerate(reader, start=1):
+        try:
+            when = _parse_us_accidents_dt(row.get(start_key, ""))
+            if when is None:
+                continue
 
-        if not (start_key and lat_key and lng_key and sev_key):
-            print(f"[ERROR] US Accidents: missing essential columns from headers: {headers[:10]}…")
-            return
+            lat = float((row.get(lat_key) or "").strip())
+            lon = float((row.get(lng_key) or "").strip())
 
-        for i, row in enumerate(reader, start=1):
             try:
-                when = _parse_us_accidents_dt(row.get(start_key, ""))
-                if when is None:
-                    continue
+                sev_raw = int((row.get(sev_key) or 0) or 0)
+            except Exception:
+                sev_raw = 0
+            severity = max(1, min(sev_raw, 5))
+
+            out = (
+                when, lat, lon, "accident", severity,
+                {
+                    "source": "us_accidents",
+                    "city": row.get("City"),
+                    "state": row.get("State"),
+                    "id": row.get("ID"),
+                },
+            )
 
-                lat = float((row.get(lat_key) or "").strip())
-                lon = float((row.get(lng_key) or "").strip())
+        except Exception as e:
+            if i <= 25:
+                print(f"[WARN] US Accidents row {i} skipped: {e}")
+            elif i == 26:
+                print("[WARN] US Accidents: suppressing further row errors…")
+            continue
 
-                try:
-                    sev_raw = int((row.get(sev_key) or 0) or 0)
-                except Exception:
-                    sev_raw = 0
-                severity = max(1, min(sev_raw, 5))
-
-                evt = EventIn(
-                    occurred_at=when,
-                    lat=lat,
-                    lon=lon,
-                    type="accident",
-                    severity=severity,
-                    properties={
-                        "source": "us_accidents",
-                        "city": row.get("City"),
-                        "state": row.get("State"),
-                        "id": row.get("ID"),
-                    },
-                )
-                batch.append(evt)
-
-                if len(batch) >= batch_size:
-                    yield batch
-                    batch = []
-
-            except Exception as e:
-                if i <= 25:
-                    print(f"[WARN] US Accidents row {i} skipped: {e}")
-                elif i == 26:
-                    print("[WARN] US Accidents: suppressing further row errors…")
-                continue
+        yield out
 
-    finally:
-        _close_reader(reader)
+def iter_us_accidents_rows(csv_path: str) -> Iterator[EventRow]:
+    """US Accidents rows (see ROW_FIELDS) streamed from a CSV file."""
+    return _iter_file(csv_path, _parse_us_accidents)
 
-    if batch:
-        yield batch
+def load_us_accidents(csv_path: str, batch_size: int = 1000) -> Iterator[List[EventIn]]:
+    """US Accidents rows as EventIn batches."""
+    yield from _batched_events(iter_us_accidents_rows(csv_path), batch_size)
+
+# Reader-level parsers by dataset name (the properties->>'source' value);
+# used by parallel_loaders to parse byte-range chunks in worker processes.
+PARSERS: Dict[str, Callable[[csv.DictReader], Iterator[EventRow]]] = {
+    "noaa_severe_weather": _parse_noaa_severe_weather,
+    "us_weather_events": _parse_us_weather_events,
+    "us_accidents": _parse_us_accidents,
+}
+
+# Natural record id inside each dataset's properties (NOAA cells are only
+# unique per scan time, which the unique key adds through occurred_at).
+SOURCE_ID_KEYS: Dict[str, Tuple[str, ...]] = {
+    "noaa_severe_weather": ("wsr_id", "cell_id"),
+    "us_weather_events": ("event_id",),
+    "us_accidents": ("id",),
+}
+
+def source_id_sql(props: str = "properties") -> str:
+    """SQL expression for the record id in JSONB `props` (NULL when unknown or empty)."""
+    cases = " ".join(
+        f"WHEN '{src}' THEN " + " || ':' || ".join(f"NULLIF({props}->>'{k}', '')" for k in keys)
+        for src, keys in sorted(SOURCE_ID_KEYS.items())
+    )
+    return f"(CASE {props}->>'source' {cases} END)"
@@ -1,14 +1,43 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 import os
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+
+# Connection pool per engine (and per uvicorn worker process).
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+_pool_args = dict(
+    pool_pre_ping=True, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT,
+)
+
+engine = create_engine(DATABASE_URL, **_pool_args)
+# process-pool workers (workers.run_cpu) are forked: give the child fresh
+# connections instead of sharing the parent's sockets
+os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def _async_url(url: str) -> str:
+    """Same database through asyncpg (ASYNC_DATABASE_URL overrides)."""
+    driver, rest = url.split("://", 1)
+    return "postgresql+asyncpg://" + rest if driver.startswith("postgresql") else url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **_pool_args)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
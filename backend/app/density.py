@@ -0,0 +1,138 @@
+"""
+Kernel density rasters for /aggregations/density.
+
+The viewport is divided into a web mercator grid (one cell per CELL_PX
+screen pixels at the requested zoom, at most MAX_GRID cells a side), so
+the raster can be drawn over the map as an image with the viewport
+bounds. Events are counted per cell in SQL (crud.density_bins_async) over
+the grid plus a margin of PAD_SIGMAS bandwidths, so kernels near the edge
+still see the points just outside. The counts are convolved with a
+Gaussian kernel (sigma = bandwidth in meters, converted to cells at the
+viewport's center latitude) by FFT, and the margin is cropped again.
+
+Values are events per km^2 as float32, rows north to south. Each row is
+divided by the ground area of its own cells (mercator cells shrink with
+cos^2(lat)), so tall viewports are not skewed toward the poles.
+"""
+
+from __future__ import annotations
+
+import math
+import struct
+import zlib
+from typing import NamedTuple, Tuple
+
+import numpy as np
+from scipy.signal import fftconvolve
+
+EARTH_M = 6371000.0
+CELL_PX = 4
+MAX_GRID = 1024
+PAD_SIGMAS = 3.0
+# kernels wider than this many cells are clamped (the raster is too coarse
+# for the bandwidth to matter much)
+MAX_SIGMA_CELLS = 64.0
+
+
+def merc_y(lat: float) -> float:
+    """Web mercator y in radians for a latitude in degrees."""
+    return math.log(math.tan(math.pi / 4 + math.radians(lat) / 2))
+
+
+class Grid(NamedTuple):
+    """Viewport grid plus `pad` margin cells on every side."""
+    x0: float      # west edge of the padded grid, degrees
+    dx: float      # cell width, degrees
+    y0: float      # south edge of the padded grid, mercator radians
+    dy: float      # cell height, mercator radians
+    width: int     # viewport cells
+    height: int
+    pad: int
+    sigma: float   # kernel sigma in cells
+    cell_m: float  # cell edge at the center latitude, meters
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.height + 2 * self.pad, self.width + 2 * self.pad
+
+    def padded_bbox(self) -> Tuple[float, float, float, float]:
+        """Degrees bbox of the padded grid (maxx < minx when it crosses the antimeridian)."""
+        rows, cols = self.shape
+        miny = math.degrees(math.atan(math.sinh(self.y0)))
+        maxy = math.degrees(math.atan(math.sinh(self.y0 + rows * self.dy)))
+        if cols * self.dx >= 360.0:
+            return -180.0, miny, 180.0, maxy
+        return _wrap_lon(self.x0), miny, _wrap_lon(self.x0 + cols * self.dx), maxy
+
+
+def _wrap_lon(lon: float) -> float:
+    return lon if -180.0 <= lon <= 180.0 else (lon + 180.0) % 360.0 - 180.0
+
+
+def grid_for(bbox: Tuple[float, float, float, float], zoom: float, bandwidth_m: float) -> Grid:
+    """Grid for a (minx, miny, maxx, maxy) viewport; maxx < minx crosses the antimeridian."""
+    minx, miny, maxx, maxy = bbox
+    span_x = (maxx - minx) % 360.0 or 360.0
+    ylo, yhi = merc_y(miny), merc_y(maxy)
+    world_px = 256.0 * 2.0 ** zoom
+    w = span_x / 360.0 * world_px / CELL_PX
+    h = (yhi - ylo) / (2 * math.pi) * world_px / CELL_PX
+    scale = min(1.0, MAX_GRID / max(w, 1.0), MAX_GRID / max(h, 1.0))
+    width, height = max(1, round(w * scale)), max(1, round(h * scale))
+    dx, dy = span_x / width, (yhi - ylo) / height
+
+    # mercator cells shrink with cos(lat) on the ground
+    center = math.radians((miny + maxy) / 2)
+    cell_m = dy * EARTH_M * math.cos(center)
+    sigma = min(max(bandwidth_m / cell_m, 0.0), MAX_SIGMA_CELLS)
+    pad = math.ceil(PAD_SIGMAS * sigma)
+    return Grid(minx - pad * dx, dx, ylo - pad * dy, dy, width, height, pad, sigma, cell_m)
+
+
+def gaussian_kernel(sigma: float) -> np.ndarray:
+    r = max(1, math.ceil(PAD_SIGMAS * sigma))
+    x = np.arange(-r, r + 1, dtype=np.float64)
+    k1 = np.exp(-0.5 * (x / sigma) ** 2) if sigma > 0 else (x == 0).astype(np.float64)
+    k = np.outer(k1, k1)
+    return k / k.sum()
+
+
+def raster(grid: Grid, ix: np.ndarray, iy: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """
+    Density (events per km^2, float32, rows north to south) from per-cell
+    counts of the padded grid: cell (ix, iy) counted from the west/south
+    edge. Cells outside the padded grid are ignored.
+    """
+    rows, cols = grid.shape
+    inside = (ix >= 0) & (ix < cols) & (iy >= 0) & (iy < rows)
+    counts = np.zeros(grid.shape, dtype=np.float64)
+    np.add.at(counts, (iy[inside], ix[inside]), n[inside])
+    if grid.sigma > 0 and counts.any():
+        counts = fftconvolve(counts, gaussian_kernel(grid.sigma), mode="same")
+    p = grid.pad
+    out = counts[p:p + grid.height, p:p + grid.width]
+    # ground area of one cell per row, at the row's center latitude
+    # (cos(lat) = 1 / cosh(mercator y))
+    y = grid.y0 + (np.arange(p, p + grid.height) + 0.5) * grid.dy
+    cell_km2 = math.radians(grid.dx) * grid.dy * (EARTH_M / 1000.0) ** 2 / np.cosh(y) ** 2
+    # FFT round-off leaves tiny negatives where there are no points
+    return np.clip(out / cell_km2[:, None], 0.0, None)[::-1].astype(np.float32)
+
+
+def png(values: np.ndarray, vmax: float) -> bytes:
+    """8-bit grayscale PNG of `values` scaled to 0..vmax."""
+    scaled = np.zeros(values.shape, dtype=np.uint8)
+    if vmax > 0:
+        scaled = np.round(np.clip(values / vmax, 0.0, 1.0) * 255.0).astype(np.uint8)
+    height, width = scaled.shape
+    raw = b"".join(b"\0" + scaled[r].tobytes() for r in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw, 6))
+        + chunk(b"IEND", b"")
+    )
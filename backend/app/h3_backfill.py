@@ -0,0 +1,57 @@
+"""
+Fill events.h3_cell for rows that were inserted without it (e.g. the psql
+seeding snippet in the README, or data loaded before the column existed).
+
+Usage (inside the API container):
+    python -m app.h3_backfill            # default batch of 10k rows
+    python -m app.h3_backfill 50000
+"""
+
+from __future__ import annotations
+
+import sys
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import rollups
+from .clustering import H3_MAX_RES, h3_cells
+from .db import SessionLocal
+
+
+def backfill_h3_cells(db: Session, batch_size: int = 10_000) -> int:
+    """Compute h3_cell for every row where it is NULL; returns rows updated."""
+    total = 0
+    while True:
+        rows = db.execute(
+            text("SELECT id, lat, lon FROM events WHERE h3_cell IS NULL LIMIT :n"),
+            {"n": batch_size},
+        ).all()
+        if not rows:
+            break
+
+        db.execute(
+            text(
+                "UPDATE events e SET h3_cell = v.cell "
+                "FROM unnest(CAST(:ids AS integer[]), CAST(:cells AS bigint[])) AS v(id, cell) "
+                "WHERE e.id = v.id"
+            ),
+            {
+                "ids": [r.id for r in rows],
+                "cells": h3_cells([r.lat for r in rows], [r.lon for r in rows], H3_MAX_RES)
+                .astype(np.int64).tolist(),
+            },
+        )
+        rollups.apply_events(db, [r.id for r in rows], +1)
+        db.commit()
+        total += len(rows)
+        print(f" h3_cell backfilled: {total}")
+    return total
+
+
+if __name__ == "__main__":
+    batch = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].strip() else 10_000
+    with SessionLocal() as db:
+        n = backfill_h3_cells(db, batch_size=batch)
+    print(f"Done. Rows updated: {n}")
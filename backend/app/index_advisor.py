@@ -0,0 +1,104 @@
+"""
+Index diagnostics: EXPLAIN ANALYZE the SQL the endpoints actually send.
+
+Builds each endpoint's query with the crud SQL builders for a few
+representative viewports/time windows, once per source and once for all
+sources, runs EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) and reports the
+indexes each plan used, any sequential scans and the execution time.
+Finishes with the events indexes no query touched.
+
+Usage (inside the API container):
+    python -m app.index_advisor                  # all scenarios
+    python -m app.index_advisor us_accidents     # one source only
+"""
+
+from __future__ import annotations
+
+import sys
+from datetime import timedelta
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import crud
+from .data_loaders import PARSERS
+from .db import SessionLocal
+
+VIEWPORTS = {
+    "omaha": (-96.5, 40.9, -95.5, 41.6),
+    "conus": (-125.0, 24.0, -66.0, 50.0),
+}
+
+
+def _scenarios(db: Session, sources: List[Optional[str]]) -> Iterator[Tuple[str, str, str, dict]]:
+    """(endpoint, label, sql, params) for every query shape worth checking."""
+    latest = db.execute(text("SELECT max(occurred_at) FROM events")).scalar()
+    windows = {"all time": (None, None)}
+    if latest:
+        windows["last 30 days"] = (latest - timedelta(days=30), latest)
+
+    for src in sources:
+        src_list = [src] if src else None
+        for vp_name, bbox in VIEWPORTS.items():
+            for w_name, (start, end) in windows.items():
+                label = f"{src or 'all sources'} / {vp_name} / {w_name}"
+                filt = dict(bbox=bbox, start=start, end=end, sources=src_list)
+                yield ("/events", label, *crud._events_sql("*", limit=20_000, after_id=None, **filt))
+                yield ("/events keyset", label, *crud._events_sql("*", limit=20_000, after_id=0, **filt))
+                yield ("/clusters/dbscan", label,
+                       *crud._events_sql("id, lat, lon", limit=20_000, after_id=None, **filt))
+                yield ("/aggregations/h3", label, *crud._h3_counts_sql(res=7, use_rollup=False, **filt))
+                yield ("/aggregations/h3 rollup", label, *crud._h3_counts_sql(res=5, use_rollup=True, **filt))
+                yield ("h3 pending rows", label, *crud._h3_pending_sql(**filt))
+                yield ("/aggregations/h3 metrics", label,
+                       *crud._h3_metrics_sql(res=7, metrics=crud.H3_METRICS, **filt))
+                yield ("/aggregations/density", label,
+                       *crud._density_sql(x0=-125.0, dx=0.05, y0=0.4, dy=0.001, **filt))
+                yield ("/aggregations/timeseries", label,
+                       *crud._timeseries_sql(step=timedelta(hours=1), res=None, use_rollup=False, **filt))
+
+
+def _walk(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("Plans", []):
+        yield from _walk(child)
+
+
+def explain(db: Session, sql: str, params: dict) -> Tuple[float, List[str], List[str]]:
+    """(execution ms, indexes used, relations read by seq scan)."""
+    plan = db.execute(text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql), params).scalar_one()
+    top = plan[0]
+    indexes, seq = [], []
+    for node in _walk(top["Plan"]):
+        if "Index Name" in node and node["Index Name"] not in indexes:
+            indexes.append(node["Index Name"])
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"] not in seq:
+            seq.append(node["Relation Name"])
+    return top["Execution Time"], indexes, seq
+
+
+def events_indexes(db: Session) -> List[str]:
+    return list(db.execute(text(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'events' ORDER BY indexname"
+    )).scalars())
+
+
+def main(argv: List[str]) -> None:
+    sources: List[Optional[str]] = argv or [None, "demo", *sorted(PARSERS)]
+    used: set[str] = set()
+    with SessionLocal() as db:
+        for endpoint, label, sql, params in _scenarios(db, sources):
+            ms, indexes, seq = explain(db, sql, params)
+            db.rollback()  # EXPLAIN ANALYZE really runs the query; keep nothing
+            used.update(indexes)
+            flag = f"  SEQ SCAN {', '.join(seq)}" if seq else ""
+            print(f"{endpoint:<24} {label:<48} {ms:>9.1f} ms  {', '.join(indexes) or '-'}{flag}")
+
+        unused = [i for i in events_indexes(db) if i not in used]
+        print()
+        print(f"events indexes used by no query above: {', '.join(unused) or 'none'}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
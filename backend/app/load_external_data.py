@@ -10,15 +10,32 @@ Sources supported:
 
 from __future__ import annotations
 
-import sys
+import argparse
+from functools import partial
+from itertools import chain
 from pathlib import Path
-from typing import Callable, Iterable, Optional, List
+from typing import Callable, Iterable, Iterator, Optional, List
 
 from .data_loaders import (
+    EventRow,
+    _batched_events,
     load_noaa_severe_weather,
     load_us_weather_events,
     load_us_accidents,
+    iter_noaa_severe_weather_rows,
+    iter_us_weather_events_rows,
+    iter_us_accidents_rows,
 )
+from .columnar_loaders import (
+    ColumnBatch,
+    columns_to_rows,
+    load_noaa_severe_weather_columns,
+    load_us_weather_events_columns,
+    load_us_accidents_columns,
+)
+from . import point_store
+from .copy_ingest import copy_ingest, copy_ingest_columns, read_checkpoint, upsert_ingest
+from .parallel_loaders import default_workers, iter_chunks, iter_rows_parallel
 from .crud import bulk_insert_events
 from .db import SessionLocal
 from .schemas import EventIn
@@ -49,37 +66,155 @@ def _ingest(
     return total
 
 
+def _ingest_copy(
+    label: str,
+    csv_path: Path,
+    rows_fn: Callable[[str], Iterator[EventRow]],
+    limit: Optional[int],
+) -> int:
+    """Ingest one dataset through COPY + a single merge; returns rows inserted."""
+    print(f"\n--- Loading {label} (COPY) ---")
+
+    if not csv_path.exists():
+        print(f" [SKIP] File not found: {csv_path}")
+        return 0
+
+    with SessionLocal() as db:
+        total = copy_ingest(db, rows_fn(str(csv_path)), limit=limit)
+
+    print(f" Loaded {label} records: {total}")
+    return total
+
+
+def _ingest_copy_columns(
+    label: str,
+    csv_path: Path,
+    columns_fn: Callable[[str], Iterator[ColumnBatch]],
+    limit: Optional[int],
+) -> int:
+    """Ingest one dataset from columnar batches through COPY; returns rows inserted."""
+    print(f"\n--- Loading {label} (COPY, columnar) ---")
+
+    if not csv_path.exists():
+        print(f" [SKIP] File not found: {csv_path}")
+        return 0
+
+    with SessionLocal() as db:
+        total = copy_ingest_columns(db, columns_fn(str(csv_path)), limit=limit)
+
+    print(f" Loaded {label} records: {total}")
+    return total
+
+
+def _ingest_upsert(
+    label: str,
+    name: str,
+    csv_path: Path,
+    limit: Optional[int],
+    workers: int,
+    restart: bool,
+) -> int:
+    """
+    Upsert one dataset in checkpointed byte-range chunks; returns rows
+    inserted. Resumes from the dataset's checkpoint unless `restart`.
+    """
+    print(f"\n--- Loading {label} (upsert) ---")
+
+    if not csv_path.exists():
+        print(f" [SKIP] File not found: {csv_path}")
+        return 0
+
+    with SessionLocal() as db:
+        start, done = (None, 0) if restart else read_checkpoint(db, name, str(csv_path))
+        if start is not None:
+            print(f" resuming at byte {start:,} ({done:,} rows already merged)")
+        chunks = iter_chunks(name, str(csv_path), start=start, workers=workers)
+        inserted, updated = upsert_ingest(db, name, str(csv_path), chunks, start_rows=done, limit=limit)
+
+    print(f" Loaded {label} records: {inserted} new, {updated} changed")
+    if updated and point_store.enabled():
+        # refresh only adds rows; changed rows need a full snapshot
+        print(" point store: run `python -m app.point_store build` to pick up changed rows")
+    return inserted
+
+
+def _columnar_batches(
+    columns_fn: Callable[[str], Iterator[ColumnBatch]], csv_path: str, batch_size: int,
+) -> Iterator[List[EventIn]]:
+    rows = chain.from_iterable(columns_to_rows(b) for b in columns_fn(csv_path))
+    return _batched_events(rows, batch_size)
+
+
+def _parallel_rows(name: str, csv_path: str, workers: int, ordered: bool) -> Iterator[EventRow]:
+    return chain.from_iterable(iter_rows_parallel(name, csv_path, workers=workers, ordered=ordered))
+
+
+def _parallel_batches(
+    name: str, csv_path: str, batch_size: int, workers: int, ordered: bool,
+) -> Iterator[List[EventIn]]:
+    return _batched_events(_parallel_rows(name, csv_path, workers, ordered), batch_size)
+
+
 def load_databases(
     noaa_path: str | Path,
     us_weather_path: str | Path,
     us_accidents_path: str | Path,
     limit_per_source: Optional[int] = None,
+    mode: str = "orm",
+    workers: int = 1,
+    ordered: bool = True,
+    columnar: bool = False,
+    upsert: bool = False,
+    restart: bool = False,
 ) -> None:
     """
     Load all supported external datasets.
       - limit_per_source: max rows to import **per dataset** (None = no cap)
+      - mode: "orm" (EventIn batches via crud.bulk_insert_events) or
+              "copy" (COPY FROM STDIN into a staging table, then one merge)
+      - workers: >1 parses each CSV in that many processes
+      - ordered: keep file order when parsing in parallel
+      - columnar: parse with the NumPy column loaders (single process)
+      - upsert: merge on the (source, source_id, occurred_at) key instead of
+                appending, committing a resumable checkpoint per chunk group
+                (re-runs are idempotent; `mode`/`ordered` do not apply)
+      - restart: with upsert, ignore existing checkpoints
+
+    Without upsert, records already in the database (same key) are skipped
+    and their rows left as they are; a re-run appends only new records.
+    Rows without a source_id (no natural id in the file) have no key and
+    are inserted again by every run, upsert or not.
     """
-    total_noaa = _ingest(
-        "NOAA Severe Weather (hail)",
-        Path(noaa_path),
-        load_noaa_severe_weather,
-        limit_per_source,
-    )
+    datasets = [
+        ("NOAA Severe Weather (hail)", "noaa_severe_weather", Path(noaa_path),
+         load_noaa_severe_weather, iter_noaa_severe_weather_rows, load_noaa_severe_weather_columns),
+        ("US Weather Events", "us_weather_events", Path(us_weather_path),
+         load_us_weather_events, iter_us_weather_events_rows, load_us_weather_events_columns),
+        ("US Accidents", "us_accidents", Path(us_accidents_path),
+         load_us_accidents, iter_us_accidents_rows, load_us_accidents_columns),
+    ]
 
-    total_us_weather = _ingest(
-        "US Weather Events",
-        Path(us_weather_path),
-        load_us_weather_events,
-        limit_per_source,
-    )
-
-    total_accidents = _ingest(
-        "US Accidents",
-        Path(us_accidents_path),
-        load_us_accidents,
-        limit_per_source,
-    )
+    totals = []
+    for label, name, path, loader_fn, rows_fn, columns_fn in datasets:
+        if upsert:
+            totals.append(_ingest_upsert(label, name, path, limit_per_source, workers, restart))
+            continue
+        if columnar:
+            if mode == "copy":
+                totals.append(_ingest_copy_columns(label, path, columns_fn, limit_per_source))
+            else:
+                totals.append(_ingest(label, path, partial(_columnar_batches, columns_fn), limit_per_source))
+            continue
+        if workers > 1:
+            # same parsers, run over byte-range chunks in a process pool
+            rows_fn = partial(_parallel_rows, name, workers=workers, ordered=ordered)
+            loader_fn = partial(_parallel_batches, name, workers=workers, ordered=ordered)
+        if mode == "copy":
+            totals.append(_ingest_copy(label, path, rows_fn, limit_per_source))
+        else:
+            totals.append(_ingest(label, path, loader_fn, limit_per_source))
 
+    total_noaa, total_us_weather, total_accidents = totals
     grand_total = total_noaa + total_us_weather + total_accidents
     print("\nDone.")
     print(
@@ -88,21 +223,62 @@ def load_databases(
     )
 
 
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Load external datasets into the events table.")
+    # Optional CLI limit: e.g., `python -m app.load_external_data 100000`
+    parser.add_argument("limit", nargs="?", default="", help="max rows per dataset (default: no cap)")
+    parser.add_argument(
+        "--mode", choices=("orm", "copy"), default="orm",
+        help="orm: EventIn batches through the ORM; copy: COPY FROM STDIN + single merge (fast)",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="parse each CSV in N processes (byte-range chunks); 0 = all CPUs",
+    )
+    parser.add_argument(
+        "--unordered", action="store_true",
+        help="with --workers, insert chunks as soon as they are parsed instead of in file order",
+    )
+    parser.add_argument(
+        "--columnar", action="store_true",
+        help="parse with the vectorized NumPy column loaders (not combined with --workers)",
+    )
+    parser.add_argument(
+        "--upsert", action="store_true",
+        help="merge on each record's natural id (re-runs don't duplicate) and resume interrupted loads",
+    )
+    parser.add_argument(
+        "--restart", action="store_true",
+        help="with --upsert, ignore saved checkpoints and read the files from the start",
+    )
+    args = parser.parse_args(argv)
+    if args.columnar and args.workers != 1:
+        parser.error("--columnar cannot be combined with --workers")
+    if args.upsert and args.columnar:
+        parser.error("--upsert cannot be combined with --columnar")
+    return args
+
+
 if __name__ == "__main__":
     # Default container-mounted locations
     noaa_csv = Path("/data/hail-2015.csv")
     us_weather_csv = Path("/data/WeatherEvents_Jan2016-Dec2022.csv")
     us_acc_csv = Path("/data/US_Accidents_March23.csv")
 
-    # Optional CLI limit: e.g., `python -m app.load_external_data 100000`
+    args = _parse_args()
     limit: Optional[int]
-    if len(sys.argv) > 1 and sys.argv[1].strip():
+    if args.limit.strip():
         try:
-            limit = int(sys.argv[1])
+            limit = int(args.limit)
         except ValueError:
-            print(f"[WARN] Invalid limit '{sys.argv[1]}'; running without a limit.")
+            print(f"[WARN] Invalid limit '{args.limit}'; running without a limit.")
             limit = None
     else:
         limit = None
 
-    load_databases(noaa_csv, us_weather_csv, us_acc_csv, limit_per_source=limit)
+    workers = args.workers if args.workers > 0 else default_workers()
+    load_databases(
+        noaa_csv, us_weather_csv, us_acc_csv,
+        limit_per_source=limit, mode=args.mode, workers=workers, ordered=not args.unordered,
+        columnar=args.columnar, upsert=args.upsert, restart=args.restart,
+    )
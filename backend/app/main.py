@@ -1,13 +1,27 @@
 from __future__ import annotations
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional, List, Iterable
-from collections import Counter
+import json
+import logging
+import math
+import re
 
-from fastapi import FastAPI, Depends, Request, Query
+import numpy as np
+from fastapi import FastAPI, Depends, HTTPException, Path, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from contextlib import asynccontextmanager
 
+from . import workers
 
-app = FastAPI(title="NGR001 Geospatial API")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    workers.shutdown()
+
+
+app = FastAPI(title="NGR001 Geospatial API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,8 +33,17 @@ app.add_middleware(
     max_age=86400,
 )
 
-from .db import get_db
-from . import crud, schemas, clustering
+from .db import get_db, get_async_db, SessionLocal
+from . import crud, schemas, clustering, packed, cache, tiles, rollups, point_store, hotspots, density, region_dbscan
+
+NDJSON = "application/x-ndjson"
+logger = logging.getLogger("uvicorn.error")
+
+
+@app.exception_handler(crud.H3BackfillPending)
+async def _h3_backfill_pending(request: Request, exc: crud.H3BackfillPending):
+    # H3 answers need the backfill to catch up first; retry later
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "60"})
 
 # ---------------- helpers ----------------
 
@@ -32,6 +55,34 @@ def _clamp_bbox(minx: float, miny: float, maxx: float, maxy: float):
     return minx, miny, maxx, maxy
 
 
+# Aggregation viewports are snapped outward to this grid so nearby
+# pans/zooms share cache entries. The query runs on the snapped bbox (a
+# cached answer must hold for every viewport that snaps to it), so the
+# response reports it in the X-Query-Bbox header: results can include
+# points up to SNAP_DEG outside the requested edges.
+SNAP_DEG = 0.01
+QUERY_BBOX_HEADER = "X-Query-Bbox"
+
+
+def _snap_bbox(request: Request, minx: float, miny: float, maxx: float, maxy: float):
+    minx, miny, maxx, maxy = (
+        math.floor(minx / SNAP_DEG) * SNAP_DEG, math.floor(miny / SNAP_DEG) * SNAP_DEG,
+        math.ceil(maxx / SNAP_DEG) * SNAP_DEG, math.ceil(maxy / SNAP_DEG) * SNAP_DEG,
+    )
+    bbox = tuple(round(v, 6) for v in _clamp_bbox(minx, miny, maxx, maxy))
+    request.state.query_bbox = bbox
+    return bbox
+
+
+@app.middleware("http")
+async def _query_bbox_header(request: Request, call_next):
+    response = await call_next(request)
+    bbox = getattr(request.state, "query_bbox", None)
+    if bbox is not None:
+        response.headers[QUERY_BBOX_HEADER] = ",".join(f"{v:g}" for v in bbox)
+    return response
+
+
 def _split_bbox(minx: float, miny: float, maxx: float, maxy: float):
     minx, miny, maxx, maxy = _clamp_bbox(minx, miny, maxx, maxy)
     crosses = (maxx < minx) or ((maxx - minx) > 180.0)
@@ -68,91 +119,582 @@ def health():
 
 
 @app.post("/events/bulk")
-def bulk(items: List[schemas.EventIn], db=Depends(get_db)):
-    n = crud.bulk_insert_events(db, items)
-    return {"inserted": n}
+async def bulk(items: List[schemas.EventIn], db=Depends(get_async_db)):
+    """Records already stored (same source, source id and time) are skipped."""
+    n = await crud.bulk_insert_events_async(db, items)
+    cache.invalidate()
+    await _sync_point_store()
+    return {"inserted": n, "skipped": len(items) - n}
 
 @app.patch("/events/bulk_update")
-def update_event(items: List[schemas.EventUpdate], db=Depends(get_db)):
-    updated = crud.bulk_update_events(db, items)
-    return {"updated": updated}
+async def update_event(items: List[schemas.EventUpdate], db=Depends(get_async_db)):
+    """Set-based update; `missing` lists the ids that matched no event."""
+    try:
+        updated, missing = await crud.bulk_update_events_async(db, items)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"invalid severity: {e}")
+    cache.invalidate()
+    missing_ids = set(missing)
+    await _sync_point_store([i.id for i in items if i.id not in missing_ids])
+    return {"updated": updated, "missing": missing}
+
+async def _sync_point_store(updated_ids=()):
+    # binning and file writes run in the process pool, off the event loop
+    if not point_store.enabled():
+        return
+    try:
+        await workers.run_cpu(point_store.sync_job, list(updated_ids))
+    except Exception:
+        # the write itself succeeded; `python -m app.point_store refresh` catches up
+        logger.exception("point store sync failed")
+
+
+async def _h3_counts(db, *, res, bbox, start, end, selected, rollup):
+    # Point-in-bbox counts come from the memory-mapped point store when
+    # there is one; rollup=true requests the rollup covers stay on it.
+    if not (rollup and rollups.covers(res, start, end)) and point_store.get() is not None:
+        return await workers.run_cpu(point_store.h3_counts, res, bbox=bbox, start=start, end=end,
+                                     sources=selected)
+    return await crud.aggregate_h3_async(
+        db, res=res, bbox=bbox, start=start, end=end, sources=selected, use_rollup=rollup,
+    )
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    return cache.stats()
 
 @app.get("/events")
-def events(
+async def events(
     request: Request,
+    response: Response,
     minx: float | None = None, miny: float | None = None,
     maxx: float | None = None, maxy: float | None = None,
     start: Optional[datetime] = None, end: Optional[datetime] = None,
     include: List[str] = Query(default=[]),
     sources: Optional[str] = None,
     limit: int = 20_000,
-    db=Depends(get_db),
+    after_id: Optional[int] = None,
+    sample: bool = False,
+    per_cell: int = Query(default=crud.SAMPLE_PER_CELL, ge=1, le=1000),
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    db=Depends(get_async_db),
 ):
+    """
+    Events in the viewport. Pass after_id (0 for the first page) to page by
+    id; the next page starts after the last id returned (also sent as
+    X-Next-After-Id when the page is full). sample=true instead returns a
+    spatially even sample of at most `limit` rows (up to per_cell per H3
+    cell sized to the viewport) with X-Total-Count, X-Truncated and
+    X-Sample-Res headers. format=ndjson or Accept: application/x-ndjson
+    sends one JSON object per line; format=columns or
+    Accept: application/vnd.ngr001.columns returns packed columns (see
+    packed.py, properties reduced to their source).
+    """
     selected = _combine_sources(request, include, sources)
 
-    if None in (minx, miny, maxx, maxy):
-        rows = crud.query_events(db, bbox=None, start=start, end=end, limit=limit, sources=selected)
-        return [schemas.EventOut.model_validate(r, from_attributes=True) for r in rows]
+    # both halves of an antimeridian-crossing viewport go into one query,
+    # so limit and keyset order apply globally
+    region = None
+    if None not in (minx, miny, maxx, maxy):
+        region = _split_bbox(minx, miny, maxx, maxy)
+
+    if sample:
+        if after_id is not None:
+            raise HTTPException(status_code=400, detail="sample and after_id cannot be combined")
+        return await _sampled_events(request, db, region, start, end, selected, limit, per_cell, fmt)
+
+    if fmt == "ndjson" or NDJSON in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _ndjson_events(region, start, end, selected, limit, after_id),
+            media_type=NDJSON,
+        )
+
+    if packed.wanted(request, fmt):
+        rows = await crud.fetch_events_async(db, bbox=region, start=start, end=end, limit=limit,
+                                             sources=selected, after_id=after_id,
+                                             columns=crud.EVENT_POINT_COLUMNS)
+        headers = {}
+        if after_id is not None and rows and len(rows) == limit:
+            headers["X-Next-After-Id"] = str(rows[-1].id)
+        return packed.response(packed.events(rows), headers=headers)
+
+    out = await crud.query_events_async(db, bbox=region, start=start, end=end, limit=limit,
+                                        sources=selected, after_id=after_id)
+    if after_id is not None and out and len(out) == limit:
+        response.headers["X-Next-After-Id"] = str(out[-1].id)
+    return [schemas.EventOut.model_validate(r, from_attributes=True) for r in out]
 
-    out: list = []
-    for bbox in _split_bbox(minx, miny, maxx, maxy):
-        out.extend(crud.query_events(db, bbox=bbox, start=start, end=end, limit=limit, sources=selected))
 
-    out = out[:limit]
+@app.get("/events/h3/{cell}")
+async def events_in_cell(
+    request: Request,
+    cell: str,
+    start: Optional[datetime] = None, end: Optional[datetime] = None,
+    include: List[str] = Query(default=[]),
+    sources: Optional[str] = None,
+    limit: int = 20_000,
+    db=Depends(get_async_db),
+):
+    """
+    Events counted in one cell of /aggregations/h3 (the hex drill-down):
+    cells follow the H3 parent of each event's res-15 cell, so this matches
+    the counts where a bbox around the hexagon would not.
+    """
+    selected = _combine_sources(request, include, sources)
+    try:
+        out = await crud.events_in_cell_async(db, cell=cell, start=start, end=end, limit=limit,
+                                              sources=selected)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return [schemas.EventOut.model_validate(r, from_attributes=True) for r in out]
 
+
+def _ndjson_events(region, start, end, selected, limit, after_id):
+    # The request's session is closed before a StreamingResponse body runs,
+    # so the stream owns its own session.
+    with SessionLocal() as db:
+        rows = crud.iter_events(db, bbox=region, start=start, end=end, limit=limit,
+                                sources=selected, after_id=after_id)
+        for r in rows:
+            yield _ndjson_line(r)
+
+
+def _ndjson_line(r) -> str:
+    return json.dumps({
+        "id": r.id,
+        "occurred_at": r.occurred_at.isoformat(),
+        "lat": r.lat, "lon": r.lon,
+        "type": r.type, "severity": r.severity,
+        "properties": r.properties or {},
+    }) + "\n"
+
+
+async def _sampled_events(request, db, region, start, end, selected, limit, per_cell, fmt):
+    as_ndjson = fmt == "ndjson" or NDJSON in request.headers.get("accept", "")
+    as_packed = not as_ndjson and packed.wanted(request, fmt)
+    rows, total, res = await crud.sample_events_async(
+        db, bbox=region, start=start, end=end, limit=limit, sources=selected, per_cell=per_cell,
+        columns=crud.EVENT_POINT_COLUMNS if as_packed else crud.EVENT_COLUMNS,
+    )
+    headers = {
+        "X-Total-Count": str(total),
+        "X-Truncated": "true" if len(rows) < total else "false",
+        "X-Sample-Res": str(res),
+    }
+    if as_packed:
+        # rows end with the `total` column; packed.events takes EVENT_POINT_COLUMNS only
+        return packed.response(packed.events([r[:-1] for r in rows]), headers=headers)
+    if as_ndjson:
+        return Response("".join(_ndjson_line(r) for r in rows), media_type=NDJSON, headers=headers)
+    out = [schemas.EventOut.model_validate(r, from_attributes=True).model_dump(mode="json") for r in rows]
+    return JSONResponse(out, headers=headers)
+
+
 @app.get("/aggregations/h3")
-def h3_agg(
+async def h3_agg(
     request: Request,
-    res: int = 7,
+    res: int = Query(default=7, ge=0, le=15),
     minx: float | None = None, miny: float | None = None,
     maxx: float | None = None, maxy: float | None = None,
     start: Optional[datetime] = None, end: Optional[datetime] = None,
     include: List[str] = Query(default=[]),
     sources: Optional[str] = None,
-    limit: int = 200_000,
-    db=Depends(get_db),
+    rollup: bool = False,
+    metrics: Optional[str] = None,
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    db=Depends(get_async_db),
 ):
+    """
+    H3 counts per cell of the points inside the bbox. With rollup=true,
+    res <= 9 with start/end at UTC midnight is answered from the daily
+    rollup instead, where the viewport selects whole cells by their
+    center: a cell on the edge counts all of its points, including those
+    outside the bbox (rows the h3 backfill hasn't reached are counted the
+    same way).
+
+    `metrics=severity,sources,types,time` (or `all`) adds per-cell severity
+    sum/mean/max, per-source and per-type counts and the first/last
+    occurred_at, computed in the same grouped scan; those always count the
+    points inside the bbox.
+    """
     selected = _combine_sources(request, include, sources)
 
-    parts: list[tuple[float, float, float, float]]
-    if None in (minx, miny, maxx, maxy):
-        parts = [(None, None, None, None)]
-    else:
-        parts = _split_bbox(minx, miny, maxx, maxy)
+    bbox = None
+    if None not in (minx, miny, maxx, maxy):
+        bbox = _snap_bbox(request, minx, miny, maxx, maxy)
+
+    wanted = _parse_metrics(metrics)
+    if wanted:
+        return await _h3_metrics(request, db, res=res, bbox=bbox, start=start, end=end,
+                                 selected=selected, metrics=wanted, fmt=fmt)
 
-    bins = Counter()
-    for p in parts:
-        bbox = None if p[0] is None else p
-        rows = crud.query_events(db, bbox=bbox, start=start, end=end, limit=limit, sources=selected)
-        pts = [(r.lat, r.lon) for r in rows]
-        if pts:
-            bins.update(clustering.h3_bin(pts, res=res))
+    async def compute():
+        # counts are grouped in SQL (from the rollup with rollup=true when
+        # the filters allow it) or taken from the point store
+        return await _h3_counts(
+            db, res=res, bbox=_split_bbox(*bbox) if bbox else None,
+            start=start, end=end, selected=selected, rollup=rollup,
+        )
 
+    bins = await cache.cached_async("h3", {
+        "bbox": bbox, "res": res, "start": start, "end": end,
+        "sources": sorted(selected), "rollup": rollup,
+    }, compute)
+
+    if packed.wanted(request, fmt):
+        return packed.response(packed.h3_counts(bins), meta={"res": res})
     return [{"h3": h, "count": int(c)} for h, c in bins.items()]
 
 
+def _parse_metrics(metrics: Optional[str]) -> List[str]:
+    names = {m.strip() for m in (metrics or "").split(",") if m.strip()}
+    if "all" in names:
+        return list(crud.H3_METRICS)
+    names.discard("count")  # always included
+    unknown = names - set(crud.H3_METRICS)
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"unknown metrics {sorted(unknown)}; choose from count, {', '.join(crud.H3_METRICS)}, all",
+        )
+    return [m for m in crud.H3_METRICS if m in names]
+
+
+async def _h3_metrics(request, db, *, res, bbox, start, end, selected, metrics, fmt):
+    async def compute():
+        return await crud.aggregate_h3_metrics_async(
+            db, res=res, metrics=metrics, bbox=_split_bbox(*bbox) if bbox else None,
+            start=start, end=end, sources=selected,
+        )
+
+    cells = await cache.cached_async("h3_metrics", {
+        "bbox": bbox, "res": res, "start": start, "end": end,
+        "sources": sorted(selected), "metrics": metrics,
+    }, compute)
+
+    if packed.wanted(request, fmt):
+        return packed.response(packed.h3_metrics(cells), meta={"res": res, "metrics": metrics})
+    return [{"h3": h, **m} for h, m in cells.items()]
+
+
+_STEP_UNITS = {"m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+
+
+def _parse_step(step: str) -> timedelta:
+    """'15m', '6h', '1d', '2w' -> timedelta."""
+    m = re.fullmatch(r"\s*(\d+)\s*([mhdw])\s*", step or "")
+    if not m or int(m.group(1)) == 0:
+        raise HTTPException(status_code=400, detail="step must look like 15m, 6h, 1d or 1w")
+    return timedelta(**{_STEP_UNITS[m.group(2)]: int(m.group(1))})
+
+
+@app.get("/aggregations/timeseries")
+async def timeseries_agg(
+    request: Request,
+    step: str = "1d",
+    minx: float | None = None, miny: float | None = None,
+    maxx: float | None = None, maxy: float | None = None,
+    start: Optional[datetime] = None, end: Optional[datetime] = None,
+    include: List[str] = Query(default=[]),
+    sources: Optional[str] = None,
+    rollup: bool = False,
+    db=Depends(get_async_db),
+):
+    """
+    Event counts per time bucket of `step`, bucketed in SQL with date_bin
+    from `start`: {start, step_s, counts} with one count per bucket (empty
+    buckets included) for an animation slider. Without a viewport,
+    whole-day steps come from the daily rollup with rollup=true (same
+    counts); with one, points inside the viewport are always counted from
+    events.
+    """
+    selected = _combine_sources(request, include, sources)
+    delta = _parse_step(step)
+    bbox = None
+    if None not in (minx, miny, maxx, maxy):
+        bbox = _snap_bbox(request, minx, miny, maxx, maxy)
+
+    async def compute():
+        return await crud.timeseries_async(
+            db, step=delta, bbox=_split_bbox(*bbox) if bbox else None,
+            start=start, end=end, sources=selected, use_rollup=rollup,
+        )
+
+    try:
+        return await cache.cached_async("timeseries", {
+            "bbox": bbox, "step": delta.total_seconds(), "start": start, "end": end,
+            "sources": sorted(selected), "rollup": rollup,
+        }, compute)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/aggregations/h3/timeseries")
+async def h3_timeseries_agg(
+    request: Request,
+    step: str = "1d",
+    res: int = Query(default=5, ge=0, le=15),
+    minx: float | None = None, miny: float | None = None,
+    maxx: float | None = None, maxy: float | None = None,
+    start: Optional[datetime] = None, end: Optional[datetime] = None,
+    include: List[str] = Query(default=[]),
+    sources: Optional[str] = None,
+    rollup: bool = False,
+    db=Depends(get_async_db),
+):
+    """
+    /aggregations/timeseries per H3 cell at `res`: {start, step_s, cells,
+    counts} where counts[i] is the dense series of cells[i]. Points inside
+    the bbox are counted; rollup=true reads whole cells by center from the
+    daily rollup when the step and range allow it, as /aggregations/h3.
+    """
+    selected = _combine_sources(request, include, sources)
+    delta = _parse_step(step)
+    bbox = None
+    if None not in (minx, miny, maxx, maxy):
+        bbox = _snap_bbox(request, minx, miny, maxx, maxy)
+
+    async def compute():
+        return await crud.h3_timeseries_async(
+            db, step=delta, res=res, bbox=_split_bbox(*bbox) if bbox else None,
+            start=start, end=end, sources=selected, use_rollup=rollup,
+        )
+
+    try:
+        return await cache.cached_async("h3_timeseries", {
+            "bbox": bbox, "res": res, "step": delta.total_seconds(), "start": start, "end": end,
+            "sources": sorted(selected), "rollup": rollup,
+        }, compute)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/aggregations/density")
+async def density_agg(
+    request: Request,
+    zoom: float = Query(default=8, ge=0, le=22),
+    bandwidth_m: float = Query(default=1000, gt=0, le=500_000),
+    minx: float | None = None, miny: float | None = None,
+    maxx: float | None = None, maxy: float | None = None,
+    start: Optional[datetime] = None, end: Optional[datetime] = None,
+    include: List[str] = Query(default=[]),
+    sources: Optional[str] = None,
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    db=Depends(get_async_db),
+):
+    """
+    Gaussian kernel density (events per km^2) over the viewport as a web
+    mercator raster of one cell per 4 screen pixels at `zoom`, rows north
+    to south (see density.py). format=png returns an 8-bit grayscale image
+    scaled to the max (X-Density-Max, X-Bounds headers); format=columns a
+    packed float32 "density" column with the grid in meta; otherwise JSON.
+    """
+    selected = _combine_sources(request, include, sources)
+    bbox = (-180.0, -85.0, 180.0, 85.0)
+    if None not in (minx, miny, maxx, maxy):
+        bbox = _snap_bbox(request, minx, miny, maxx, maxy)
+    if bbox[3] <= bbox[1]:
+        raise HTTPException(status_code=400, detail="empty viewport")
+
+    async def compute():
+        grid = density.grid_for(bbox, zoom, bandwidth_m)
+        ix, iy, n = await crud.density_bins_async(
+            db, x0=grid.x0, dx=grid.dx, y0=grid.y0, dy=grid.dy,
+            bbox=_split_bbox(*grid.padded_bbox()), start=start, end=end, sources=selected,
+        )
+        return grid, await workers.run_cpu(density.raster, grid, ix, iy, n)
+
+    grid, values = await cache.cached_async("density", {
+        "bbox": bbox, "zoom": zoom, "bandwidth_m": bandwidth_m, "start": start, "end": end,
+        "sources": sorted(selected),
+    }, compute)
+
+    vmax = float(values.max()) if values.size else 0.0
+    meta = {
+        "width": grid.width, "height": grid.height, "bounds": list(bbox), "max": vmax,
+        "cell_m": grid.cell_m, "bandwidth_m": bandwidth_m, "unit": "events/km2",
+    }
+    if fmt == "png" or "image/png" in request.headers.get("accept", ""):
+        return Response(density.png(values, vmax), media_type="image/png", headers={
+            "X-Density-Max": repr(vmax), "X-Bounds": ",".join(map(str, bbox)),
+        })
+    if packed.wanted(request, fmt):
+        return packed.response({"density": values.ravel()}, meta=meta)
+    return {**meta, "values": values.round(6).tolist()}
+
+
+@app.get("/tiles/h3/{z}/{x}/{y}")
+async def h3_tile(
+    request: Request,
+    z: int = Path(ge=0, le=22), x: int = Path(ge=0), y: int = Path(ge=0),
+    res: int = Query(default=7, ge=0, le=15),
+    start: Optional[datetime] = None, end: Optional[datetime] = None,
+    include: List[str] = Query(default=[]),
+    sources: Optional[str] = None,
+    rollup: bool = False,
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    db=Depends(get_async_db),
+):
+    """
+    H3 counts for one XYZ tile, same shape as /aggregations/h3: a cell
+    spanning tiles is split between them. With rollup=true each cell is
+    counted whole in the tile holding its center. Either way the client
+    sums counts per cell across tiles.
+    """
+    if not tiles.valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="tile out of range")
+    selected = _combine_sources(request, include, sources)
+    bbox = tiles.tile_bbox(z, x, y)
+
+    bins = await cache.cached_async("h3_tile", {
+        "tile": (z, x, y), "res": res, "start": start, "end": end,
+        "sources": sorted(selected), "rollup": rollup,
+    }, lambda: _h3_counts(
+        db, res=res, bbox=bbox, start=start, end=end, selected=selected, rollup=rollup,
+    ))
+
+    if packed.wanted(request, fmt):
+        body, media_type = packed.pack(packed.h3_counts(bins), meta={"res": res, "tile": [z, x, y]}), packed.PACKED
+    else:
+        body = json.dumps([{"h3": h, "count": int(c)} for h, c in bins.items()]).encode()
+        media_type = "application/json"
+
+    headers = {
+        "ETag": tiles.etag(body),
+        "Cache-Control": tiles.TILE_CACHE_CONTROL,
+        "Vary": "Accept",
+    }
+    if tiles.not_modified(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+MVT = "application/vnd.mapbox-vector-tile"
+
+
+@app.get("/tiles/events/{z}/{x}/{y}.mvt")
+def events_tile(
+    request: Request,
+    z: int = Path(ge=0, le=22), x: int = Path(ge=0), y: int = Path(ge=0),
+    start: Optional[datetime] = None, end: Optional[datetime] = None,
+    include: List[str] = Query(default=[]),
+    sources: Optional[str] = None,
+    db=Depends(get_db),
+):
+    """Raw events as a vector tile (layer "events"); thinned below zoom crud.MVT_FULL_ZOOM."""
+    if not tiles.valid_tile(z, x, y):
+        raise HTTPException(status_code=404, detail="tile out of range")
+    selected = _combine_sources(request, include, sources)
+
+    body = cache.cached("events_mvt", {
+        "tile": (z, x, y), "start": start, "end": end, "sources": sorted(selected),
+    }, lambda: crud.events_mvt(db, z=z, x=x, y=y, start=start, end=end, sources=selected))
+
+    headers = {
+        "ETag": tiles.etag(body),
+        "Cache-Control": tiles.TILE_CACHE_CONTROL,
+    }
+    if tiles.not_modified(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=MVT, headers=headers)
+
+
 @app.get("/clusters/dbscan")
-def dbscan(
+async def dbscan(
     request: Request,
-    eps_m: int = 500, min_samples: int = 5,
+    eps_m: int = Query(default=500, gt=0, le=region_dbscan.MAX_EPS_M),
+    min_samples: int = 5,
     minx: float | None = None, miny: float | None = None,
     maxx: float | None = None, maxy: float | None = None,
     start: Optional[datetime] = None, end: Optional[datetime] = None,
     include: List[str] = Query(default=[]),
     sources: Optional[str] = None,
     limit: int = 20_000,
-    db=Depends(get_db),
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    db=Depends(get_async_db),
 ):
     selected = _combine_sources(request, include, sources)
 
     bbox = None
     if None not in (minx, miny, maxx, maxy):
-        # For DBSCAN we can keep a single bbox; if you see dateline errors here,
-        # apply the same _split_bbox pattern and merge results.
-        bbox = (minx, miny, maxx, maxy)
-
-    rows = crud.query_events(db, bbox=bbox, start=start, end=end, limit=limit, sources=selected)
-    pts = [(r.lat, r.lon) for r in rows]
-    labels = clustering.dbscan_haversine(pts, eps_m=eps_m, min_samples=min_samples)
-    return [{"id": r.id, "lat": r.lat, "lon": r.lon, "label": int(label)} for r, label in zip(rows, labels)]
+        bbox = _snap_bbox(request, minx, miny, maxx, maxy)
+
+    async def compute():
+        region = _split_bbox(*bbox) if bbox else None
+        if point_store.get() is not None:
+            ids, lat, lon = await workers.run_cpu(point_store.points, region, start=start, end=end,
+                                                  sources=selected, limit=limit)
+        else:
+            rows = await crud.fetch_events_async(db, bbox=region, start=start, end=end, limit=limit,
+                                                 sources=selected, columns=("id", "lat", "lon"))
+            ids = np.array([r.id for r in rows], dtype=np.int64)
+            lat = np.array([r.lat for r in rows], dtype=np.float64)
+            lon = np.array([r.lon for r in rows], dtype=np.float64)
+        # labels depend on point order; id order makes them deterministic
+        order = np.argsort(ids, kind="stable")
+        ids, lat, lon = ids[order], lat[order], lon[order]
+        if len(ids) < limit:
+            # every point of the viewport is here: reuse the cached state of
+            # regions shared with earlier viewports (same labels as a full run)
+            labels = await region_dbscan.dbscan(
+                ids, lat, lon, eps_m=eps_m, min_samples=min_samples, region=region,
+                filters={"start": start, "end": end, "sources": sorted(selected)},
+            )
+        else:
+            # sklearn runs in the process pool, not on the event loop
+            labels = await workers.run_cpu(
+                clustering.dbscan_chord, np.column_stack((lat, lon)), eps_m=eps_m, min_samples=min_samples,
+            )
+        return ids.tolist(), lat.tolist(), lon.tolist(), labels.tolist()
+
+    ids, lat, lon, labels = await cache.cached_async("dbscan", {
+        "bbox": bbox, "eps_m": eps_m, "min_samples": min_samples, "start": start, "end": end,
+        "sources": sorted(selected), "limit": limit,
+    }, compute)
+
+    if packed.wanted(request, fmt):
+        return packed.response(packed.clusters(ids, lat, lon, labels))
+    return [{"id": i, "lat": a, "lon": b, "label": l} for i, a, b, l in zip(ids, lat, lon, labels)]
+
+
+@app.get("/analytics/hotspots")
+async def hotspots_agg(
+    request: Request,
+    res: int = Query(default=7, ge=0, le=15),
+    k: int = Query(default=1, ge=1, le=hotspots.MAX_K),
+    minx: float | None = None, miny: float | None = None,
+    maxx: float | None = None, maxy: float | None = None,
+    start: Optional[datetime] = None, end: Optional[datetime] = None,
+    include: List[str] = Query(default=[]),
+    sources: Optional[str] = None,
+    rollup: bool = False,
+    fmt: Optional[str] = Query(default=None, alias="format"),
+    db=Depends(get_async_db),
+):
+    """
+    Getis-Ord Gi* over the /aggregations/h3 counts with k-ring
+    neighbourhoods: {h3, count, z, p, bin} per cell with events, bin in
+    -3..3 (99/95/90% cold or hot spot, 0 = not significant).
+    """
+    selected = _combine_sources(request, include, sources)
+
+    bbox = None
+    if None not in (minx, miny, maxx, maxy):
+        bbox = _snap_bbox(request, minx, miny, maxx, maxy)
+
+    async def compute():
+        bins = await _h3_counts(
+            db, res=res, bbox=_split_bbox(*bbox) if bbox else None,
+            start=start, end=end, selected=selected, rollup=rollup,
+        )
+        return await workers.run_cpu(hotspots.gi_star, bins, k)
+
+    stats = await cache.cached_async("hotspots", {
+        "bbox": bbox, "res": res, "k": k, "start": start, "end": end,
+        "sources": sorted(selected), "rollup": rollup,
+    }, compute)
+
+    if packed.wanted(request, fmt):
+        return packed.response(packed.hotspots(stats), meta={"res": res, "k": k})
+    return [{"h3": h, "count": c, "z": z, "p": p, "bin": b} for h, (c, z, p, b) in stats.items()]
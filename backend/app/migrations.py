@@ -0,0 +1,215 @@
+"""
+Schema migrations on top of db/init.sql.
+
+init.sql creates a fresh database; every schema change after it is a
+numbered step here. Applied steps are recorded in schema_migrations, and
+each statement is idempotent (IF NOT EXISTS, or a callable that checks
+first), so a step interrupted halfway can simply be re-run. Statements run
+in autocommit mode so indexes can be built CONCURRENTLY without blocking
+ingest.
+
+Usage (inside the API container; docker-compose runs `upgrade` on start):
+    python -m app.migrations upgrade
+    python -m app.migrations status
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from typing import Callable, List, NamedTuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from . import partitions, rollups
+from .data_loaders import PARSERS, source_id_sql
+from .db import engine
+
+
+class Migration(NamedTuple):
+    version: str
+    name: str
+    # SQL strings, or callables taking the engine for steps that need
+    # their own transaction
+    statements: List[Union[str, Callable[[Engine], None]]]
+
+
+def _dedupe_events(eng: Engine) -> None:
+    # repeated loads left copies of the same record; keep the first
+    with Session(eng) as db:
+        removed = db.execute(text(
+            "DELETE FROM events e USING ("
+            " SELECT id, row_number() OVER (PARTITION BY source, source_id, occurred_at ORDER BY id) AS rn"
+            " FROM events WHERE source_id IS NOT NULL"
+            ") d WHERE e.id = d.id AND d.rn > 1"
+        )).rowcount
+        db.commit()
+        if removed:
+            rollups.rebuild(db)
+    print(f"   {removed} duplicate rows removed")
+
+
+def _partition_events(eng: Engine) -> None:
+    with Session(eng) as db:
+        moved = partitions.convert(db)
+    print(f"   {moved} rows moved into yearly partitions")
+
+
+def _utc_rollup_buckets(eng: Engine) -> None:
+    # buckets used to follow the session TimeZone; identical when it was UTC
+    with Session(eng) as db:
+        if not rollups.needs_utc_rebuild(db):
+            print("   rollup buckets already at UTC midnight")
+            return
+        n = rollups.rebuild(db)
+    print(f"   rollup rebuilt with UTC day buckets: {n} rows")
+
+
+def _source_indexes() -> List[str]:
+    # One GiST per dataset: a viewport query for one source only walks that
+    # source's points. The demo points are selected by type instead.
+    stmts = [
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_geom_{src} "
+        f"ON events USING gist ((geom::geometry)) WHERE source = '{src}'"
+        for src in sorted(PARSERS)
+    ]
+    stmts.append(
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_geom_demo "
+        "ON events USING gist ((geom::geometry)) WHERE type = 'demo'"
+    )
+    return stmts
+
+
+MIGRATIONS: List[Migration] = [
+    Migration("0001", "h3 cell column and rollup tables", [
+        "ALTER TABLE events ADD COLUMN IF NOT EXISTS h3_cell BIGINT",
+        "CREATE TABLE IF NOT EXISTS event_h3_rollup ("
+        " res SMALLINT NOT NULL, h3_cell BIGINT NOT NULL,"
+        " source TEXT NOT NULL DEFAULT '', type TEXT NOT NULL DEFAULT '',"
+        " bucket TIMESTAMPTZ NOT NULL, count BIGINT NOT NULL,"
+        " PRIMARY KEY (res, h3_cell, source, type, bucket))",
+        "CREATE TABLE IF NOT EXISTS h3_cells ("
+        " h3_cell BIGINT PRIMARY KEY, res SMALLINT NOT NULL,"
+        " lat DOUBLE PRECISION NOT NULL, lon DOUBLE PRECISION NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS idx_h3_cells_res_pos ON h3_cells (res, lon, lat)",
+    ]),
+    # rewrites events once; afterwards filters use a plain indexed column
+    # instead of extracting properties->>'source' per row
+    Migration("0002", "generated source column", [
+        "ALTER TABLE events ADD COLUMN IF NOT EXISTS source TEXT "
+        "GENERATED ALWAYS AS (properties->>'source') STORED",
+    ]),
+    Migration("0003", "indexes for the endpoint query shapes", [
+        # source + time range; h3_cell included so SQL-side H3 grouping
+        # without a bbox can be answered from the index
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_source_time "
+        "ON events (source, occurred_at) INCLUDE (h3_cell)",
+        *_source_indexes(),
+        # rows still waiting for the h3 backfill (binned in Python meanwhile)
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_events_h3_pending "
+        "ON events (id) WHERE h3_cell IS NULL",
+        "ANALYZE events",
+    ]),
+    # events becomes PARTITION BY RANGE (occurred_at), one partition per
+    # year; from here on indexes on events cannot be built CONCURRENTLY
+    # (build them per partition and ATTACH instead)
+    Migration("0004", "partition events by year", [_partition_events]),
+    # natural record ids for idempotent loads (load_external_data --upsert);
+    # occurred_at is part of the key because unique indexes on a partitioned
+    # table must contain the partition key (NOAA cell ids need it anyway)
+    Migration("0005", "source record key and ingest checkpoints", [
+        "ALTER TABLE events ADD COLUMN IF NOT EXISTS source_id TEXT "
+        f"GENERATED ALWAYS AS {source_id_sql()} STORED",
+        _dedupe_events,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_events_source_record "
+        "ON events (source, source_id, occurred_at)",
+        "CREATE TABLE IF NOT EXISTS ingest_checkpoints ("
+        " dataset TEXT PRIMARY KEY, path TEXT NOT NULL,"
+        " file_size BIGINT NOT NULL, file_mtime DOUBLE PRECISION NOT NULL,"
+        " byte_offset BIGINT NOT NULL, rows BIGINT NOT NULL,"
+        " updated_at TIMESTAMPTZ NOT NULL DEFAULT now())",
+    ]),
+    Migration("0006", "rollup day buckets in UTC", [_utc_rollup_buckets]),
+]
+
+
+def _wait_for_db(eng: Engine, timeout_s: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout_s
+    while True:
+        try:
+            with eng.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return
+        except OperationalError:
+            if time.monotonic() > deadline:
+                raise
+            print(" waiting for the database...")
+            time.sleep(2)
+
+
+def applied(eng: Engine = engine) -> set[str]:
+    with eng.connect() as conn:
+        exists = conn.execute(text("SELECT to_regclass('schema_migrations')")).scalar()
+        if not exists:
+            return set()
+        return set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+
+
+def upgrade(eng: Engine = engine) -> List[str]:
+    """Apply pending migrations in order; returns the versions applied."""
+    _wait_for_db(eng)
+    done = []
+    with eng.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_migrations ("
+            "version TEXT PRIMARY KEY, name TEXT NOT NULL, "
+            "applied_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+        ))
+        already = set(conn.execute(text("SELECT version FROM schema_migrations")).scalars())
+        for m in MIGRATIONS:
+            if m.version in already:
+                continue
+            print(f" applying {m.version} {m.name}")
+            t0 = time.perf_counter()
+            for stmt in m.statements:
+                if callable(stmt):
+                    stmt(eng)
+                else:
+                    conn.execute(text(stmt))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+                {"v": m.version, "n": m.name},
+            )
+            print(f"   done in {time.perf_counter() - t0:.1f}s")
+            done.append(m.version)
+    return done
+
+
+def invalid_indexes(eng: Engine = engine) -> List[str]:
+    """Indexes left INVALID by an interrupted CREATE INDEX CONCURRENTLY."""
+    with eng.connect() as conn:
+        return list(conn.execute(text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE NOT i.indisvalid"
+        )).scalars())
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if cmd == "upgrade":
+        versions = upgrade()
+        print(f"Applied {len(versions)} migration(s)" if versions else "Schema is up to date")
+    elif cmd == "status":
+        done = applied()
+        for m in MIGRATIONS:
+            print(f" {m.version} {'applied' if m.version in done else 'pending'}  {m.name}")
+        bad = invalid_indexes()
+        if bad:
+            print(f" invalid indexes (DROP them and re-run upgrade): {', '.join(bad)}")
+        sys.exit(1 if bad or len(done) < len(MIGRATIONS) else 0)
+    else:
+        print("usage: python -m app.migrations upgrade | status")
+        sys.exit(2)
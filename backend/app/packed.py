@@ -0,0 +1,192 @@
+"""
+Packed columnar responses ("application/vnd.ngr001.columns").
+
+/events, /aggregations/h3, /analytics/hotspots and /clusters/dbscan return this instead of JSON
+when the request sends `Accept: application/vnd.ngr001.columns` or
+`format=columns`. Every column is one contiguous little-endian buffer, so
+the browser can wrap it in a typed array (Float64Array, BigUint64Array, ...)
+and hand it to deck.gl without parsing per-row objects.
+
+Layout (all integers little-endian):
+
+    0       4 bytes   magic "NGRC"
+    4       uint16    format version (1)
+    6       uint16    reserved (0)
+    8       uint32    header length H
+    12      H bytes   UTF-8 JSON header, space-padded to a multiple of 8
+    ...               column buffers, each starting on an 8-byte boundary
+
+Header:
+
+    {"rows": n, "meta": {...},
+     "columns": [{"name": "lat", "dtype": "float64", "offset": 48, "length": n}, ...]}
+
+`offset` is relative to the first column buffer (byte 12 + H) and
+`length` counts elements. dtype is one of int16/int32/uint16/uint32/uint64/float32/float64.
+String columns are dictionary encoded: the buffer holds uint16 (or uint32)
+codes into the column's "dictionary" list, which may contain null. Integer
+columns with missing values carry a "null" sentinel.
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+from typing import Any, Iterable, Mapping, Optional, Sequence
+
+import numpy as np
+from fastapi import Request, Response
+
+PACKED = "application/vnd.ngr001.columns"
+MAGIC = b"NGRC"
+VERSION = 1
+
+INT32_NULL = -(2 ** 31)
+
+_PREAMBLE = struct.Struct("<4sHHI")
+
+
+def wanted(request: Request, fmt: Optional[str]) -> bool:
+    """True when the client asked for the packed format."""
+    return fmt == "columns" or PACKED in request.headers.get("accept", "")
+
+
+def pack(columns: Mapping[str, Any], meta: Optional[dict] = None) -> bytes:
+    """
+    Serialize equal-length columns. Values are numpy arrays, or
+    (codes, dictionary) pairs from dictionary_encode; an optional third
+    item is the null sentinel of an integer column.
+    """
+    specs, buffers = [], []
+    rows = 0
+    for name, col in columns.items():
+        spec: dict = {"name": name}
+        if isinstance(col, tuple):
+            arr = col[0]
+            if len(col) > 1 and col[1] is not None:
+                spec["dictionary"] = col[1]
+            if len(col) > 2:
+                spec["null"] = col[2]
+        else:
+            arr = col
+        arr = np.ascontiguousarray(arr, dtype=np.asarray(arr).dtype.newbyteorder("<"))
+        spec.update({"dtype": arr.dtype.name, "length": len(arr)})
+        rows = len(arr)
+        specs.append(spec)
+        buffers.append(arr.tobytes())
+
+    pos = 0
+    for spec, buf in zip(specs, buffers):
+        spec["offset"] = pos
+        pos += _pad8(len(buf))
+    header = json.dumps({"rows": rows, "meta": meta or {}, "columns": specs}).encode()
+    header_len = _pad8(_PREAMBLE.size + len(header)) - _PREAMBLE.size
+    header_bytes = header.ljust(header_len, b" ")
+
+    out = bytearray(_PREAMBLE.pack(MAGIC, VERSION, 0, header_len))
+    out += header_bytes
+    for buf in buffers:
+        out += buf
+        out += b"\0" * (_pad8(len(buf)) - len(buf))
+    return bytes(out)
+
+
+def _pad8(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def response(columns: Mapping[str, Any], meta: Optional[dict] = None, headers: Optional[dict] = None) -> Response:
+    return Response(pack(columns, meta), media_type=PACKED, headers=headers)
+
+
+def dictionary_encode(values: Iterable[Optional[str]]) -> tuple[np.ndarray, list]:
+    """(codes, dictionary) for a string column; codes are uint16 when they fit."""
+    lookup: dict = {}
+    codes = [lookup.setdefault(v, len(lookup)) for v in values]
+    dtype = np.uint16 if len(lookup) <= 0xFFFF else np.uint32
+    return np.array(codes, dtype=dtype), list(lookup)
+
+
+def events(rows: Sequence[Sequence]) -> dict:
+    """
+    Columns for event rows selected with crud.EVENT_POINT_COLUMNS
+    (id, occurred_at, lat, lon, type, severity, source). occurred_at is
+    float64 milliseconds since the epoch, matching JavaScript Date.
+    """
+    n = len(rows)
+    ids, occurred, lat, lon, types, severity, source = zip(*rows) if n else ((),) * 7
+    return {
+        "id": np.fromiter(ids, np.int32, n),
+        "occurred_at": np.fromiter((t.timestamp() * 1000.0 for t in occurred), np.float64, n),
+        "lat": np.fromiter(lat, np.float64, n),
+        "lon": np.fromiter(lon, np.float64, n),
+        "type": dictionary_encode(types),
+        "severity": (
+            np.fromiter((INT32_NULL if s is None else s for s in severity), np.int32, n),
+            None, INT32_NULL,
+        ),
+        "source": dictionary_encode(source),
+    }
+
+
+def h3_counts(bins: Mapping[str, int]) -> dict:
+    """Columns for {h3 index: count}; cells are uint64 (BigUint64Array in JS)."""
+    n = len(bins)
+    return {
+        "h3": np.fromiter((int(h, 16) for h in bins), np.uint64, n),
+        "count": np.fromiter(bins.values(), np.uint32, n),
+    }
+
+
+def h3_metrics(cells: Mapping[str, dict]) -> dict:
+    """
+    Columns for crud.aggregate_h3_metrics_async results: h3/count as in
+    h3_counts, severity_sum/severity_max (int32, null sentinel),
+    severity_mean (float32, NaN when unknown), t_min/t_max (float64 ms
+    since the epoch) and one uint32 column per source ("source:<name>") and
+    per type ("type:<name>").
+    """
+    n = len(cells)
+    rows = list(cells.values())
+    cols: dict = h3_counts({h: m["count"] for h, m in cells.items()})
+    if rows and "severity_sum" in rows[0]:
+        for key in ("severity_sum", "severity_max"):
+            cols[key] = (
+                np.fromiter((INT32_NULL if m[key] is None else m[key] for m in rows), np.int32, n),
+                None, INT32_NULL,
+            )
+        cols["severity_mean"] = np.fromiter(
+            (np.nan if m["severity_mean"] is None else m["severity_mean"] for m in rows), np.float32, n,
+        )
+    if rows and "t_min" in rows[0]:
+        for key in ("t_min", "t_max"):
+            cols[key] = np.fromiter((m[key].timestamp() * 1000.0 for m in rows), np.float64, n)
+    for group, prefix in (("sources", "source"), ("types", "type")):
+        if rows and group in rows[0]:
+            names = sorted({k for m in rows for k in m[group]}, key=lambda k: (k is None, k or ""))
+            for name in names:
+                cols[f"{prefix}:{name}"] = np.fromiter((m[group].get(name, 0) for m in rows), np.uint32, n)
+    return cols
+
+
+def hotspots(stats: Mapping[str, tuple]) -> dict:
+    """Columns for hotspots.gi_star results: h3, count, z/p (float32), bin (int16, -3..3)."""
+    n = len(stats)
+    values = list(stats.values())
+    return {
+        "h3": np.fromiter((int(h, 16) for h in stats), np.uint64, n),
+        "count": np.fromiter((v[0] for v in values), np.uint32, n),
+        "z": np.fromiter((v[1] for v in values), np.float32, n),
+        "p": np.fromiter((v[2] for v in values), np.float32, n),
+        "bin": np.fromiter((v[3] for v in values), np.int16, n),
+    }
+
+
+def clusters(ids: Sequence[int], lat: Sequence[float], lon: Sequence[float], labels) -> dict:
+    n = len(ids)
+    return {
+        "id": np.fromiter(ids, np.int32, n),
+        "lat": np.fromiter(lat, np.float64, n),
+        "lon": np.fromiter(lon, np.float64, n),
+        "label": np.asarray(labels, dtype=np.int32),
+    }
@@ -0,0 +1,178 @@
+"""
+Multi-process parsing for the large external CSVs.
+
+The file is split into byte ranges that end on line boundaries; each range
+is decoded and parsed by the regular data_loaders parser in a worker
+process, and the resulting row batches are fed back in file order
+(ordered=True) or as soon as they are ready.
+
+Records must not contain embedded newlines (true for the supported
+datasets); a record torn at a chunk boundary would be skipped like any
+other malformed row.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import csv
+import io
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from .data_loaders import _ENCODINGS, PARSERS, EventRow, _sniff_dialect
+
+DEFAULT_CHUNK_BYTES = 32 * 1024 * 1024
+
+_DIALECT_ATTRS = ("delimiter", "quotechar", "doublequote", "escapechar", "skipinitialspace")
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+
+def _detect(path: str) -> Tuple[str, dict, List[str], int]:
+    """Encoding, picklable dialect kwargs, header fields and data start offset."""
+    with open(path, "rb") as f:
+        header_line = f.readline()
+        data_start = f.tell()
+        sample = header_line + f.read(65536)
+    # don't let the sample end inside a multi-byte character
+    sample = sample[: sample.rfind(b"\n") + 1] or sample
+
+    last_err: Optional[Exception] = None
+    for enc in _ENCODINGS:
+        try:
+            text = sample.decode(enc)
+        except UnicodeDecodeError as e:
+            last_err = e
+            continue
+        dialect = _sniff_dialect(text)
+        fmt = {a: getattr(dialect, a) for a in _DIALECT_ATTRS}
+        fieldnames = next(csv.reader([header_line.decode(enc).rstrip("\r\n")], **fmt))
+        return enc, fmt, fieldnames, data_start
+    raise last_err or RuntimeError("Failed to open CSV with any known encoding.")
+
+
+def split_chunks(path: str, start: int, chunk_bytes: int = DEFAULT_CHUNK_BYTES) -> List[Tuple[int, int]]:
+    """Byte ranges [start, end) of roughly chunk_bytes, each ending after a newline."""
+    size = Path(path).stat().st_size
+    bounds = [start]
+    with open(path, "rb") as f:
+        pos = start + chunk_bytes
+        while pos < size:
+            f.seek(pos)
+            f.readline()
+            pos = f.tell()
+            if pos >= size:
+                break
+            bounds.append(pos)
+            pos += chunk_bytes
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def _parse_chunk(
+    dataset: str, path: str, encoding: str, fmt: dict,
+    fieldnames: List[str], start: int, end: int, quiet: bool,
+) -> List[EventRow]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    text = None
+    for enc in (encoding,) + tuple(e for e in _ENCODINGS if e != encoding):
+        try:
+            text = data.decode(enc)
+            break
+        except UnicodeDecodeError:
+            continue
+    if text is None:
+        text = data.decode("latin-1")
+
+    reader = csv.DictReader(io.StringIO(text, newline=""), fieldnames=fieldnames, **fmt)
+    parse = PARSERS[dataset]
+    if not quiet:
+        return list(parse(reader))
+    # only the first chunk reports row warnings, so N chunks don't print N times
+    with contextlib.redirect_stdout(io.StringIO()):
+        return list(parse(reader))
+
+
+def iter_rows_parallel(
+    dataset: str,
+    csv_path: str,
+    workers: Optional[int] = None,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+    ordered: bool = True,
+) -> Iterator[List[EventRow]]:
+    """
+    Parse `csv_path` with the `dataset` parser in a process pool; yields one
+    list of rows per chunk. At most 2 * workers chunks are in flight, so a
+    slow consumer (the insert path) bounds memory.
+    """
+    for _, rows in _iter_chunks(dataset, csv_path, None, workers or default_workers(), chunk_bytes, ordered):
+        if rows:
+            yield rows
+
+
+def iter_chunks(
+    dataset: str,
+    csv_path: str,
+    start: Optional[int] = None,
+    workers: int = 1,
+    chunk_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> Iterator[Tuple[int, List[EventRow]]]:
+    """
+    (end byte offset, rows) per chunk in file order, starting at byte
+    `start` (a previous chunk end; None = first data row). Resumable
+    loads checkpoint the offsets. workers=1 parses in this process.
+    """
+    yield from _iter_chunks(dataset, csv_path, start, workers, chunk_bytes, True)
+
+
+def _iter_chunks(
+    dataset: str, csv_path: str, start: Optional[int], workers: int, chunk_bytes: int, ordered: bool,
+) -> Iterator[Tuple[int, List[EventRow]]]:
+    path = Path(csv_path)
+    if not path.exists():
+        print(f"[ERROR] File not found: {csv_path}")
+        return
+
+    encoding, fmt, fieldnames, data_start = _detect(str(path))
+    chunks = split_chunks(str(path), data_start if start is None else start, chunk_bytes)
+
+    if workers <= 1:
+        for i, (a, b) in enumerate(chunks):
+            yield b, _parse_chunk(dataset, str(path), encoding, fmt, fieldnames, a, b, i > 0)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque[Tuple[int, Future]] = deque()
+        todo = iter(enumerate(chunks))
+
+        def submit_next() -> bool:
+            nxt = next(todo, None)
+            if nxt is None:
+                return False
+            i, (a, b) = nxt
+            pending.append((b, pool.submit(_parse_chunk, dataset, str(path), encoding, fmt, fieldnames, a, b, i > 0)))
+            return True
+
+        for _ in range(2 * workers):
+            if not submit_next():
+                break
+
+        while pending:
+            if ordered:
+                end, fut = pending.popleft()
+            else:
+                done, _ = wait([f for _, f in pending], return_when=FIRST_COMPLETED)
+                fut = done.pop()
+                end, _ = next(p for p in pending if p[1] is fut)
+                pending.remove((end, fut))
+            rows = fut.result()
+            submit_next()
+            yield end, rows
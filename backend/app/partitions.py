@@ -0,0 +1,209 @@
+"""
+Yearly range partitions of events by occurred_at.
+
+events is partitioned BY RANGE (occurred_at) into events_y<YEAR> tables
+([Jan 1, Jan 1 next year) UTC), with primary key (id, occurred_at). There
+is no default partition: every insert path calls ensure_partitions first
+(crud bulk insert/update, the COPY ingest), which creates missing years.
+(A default partition would hold rows of a missing year and then block
+creating that year's partition.) Queries with start/end only touch the
+matching years.
+
+The years known to exist are cached per process, but only once the
+transaction that created or saw them commits (a Session after_commit
+hook), so a rolled back CREATE is not remembered as existing.
+
+convert() turns an existing unpartitioned events table into this layout;
+it runs as migration 0004 (python -m app.migrations upgrade) or directly:
+
+    python -m app.partitions migrate          # convert existing data
+    python -m app.partitions ensure 2024 2026 # pre-create years
+    python -m app.partitions list             # partitions and row counts
+"""
+
+from __future__ import annotations
+
+import sys
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+
+PARTITION_PREFIX = "events_y"
+
+# years known to exist in this process (partitions are never dropped here)
+_known_years: set[int] = set()
+_is_partitioned = False
+
+# Session.info key: what this transaction created, applied to the caches on commit
+_PENDING = "partitions_pending"
+
+
+def _pending(db: Session) -> dict:
+    return db.info.setdefault(_PENDING, {"years": set(), "converted": False})
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_pending(db: Session) -> None:
+    global _is_partitioned
+    if db.in_nested_transaction():
+        return  # a released savepoint, not the outer commit
+    pending = db.info.pop(_PENDING, None)
+    if pending is None:
+        return
+    if pending["converted"]:
+        _is_partitioned = True
+        _known_years.clear()
+    _known_years.update(pending["years"])
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_pending(db: Session, transaction) -> None:
+    # rollback or close: runs after after_commit for a committed transaction
+    if transaction.parent is None:
+        db.info.pop(_PENDING, None)
+
+
+def is_partitioned(db: Session) -> bool:
+    global _is_partitioned
+    if _is_partitioned:
+        return True
+    found = bool(db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'events' AND c.relnamespace = current_schema()::regnamespace"
+    )).first())
+    # only a committed positive answer is cached: the migration may run
+    # later, or be this transaction's own convert()
+    if found and not db.info.get(_PENDING, {}).get("converted"):
+        _is_partitioned = True
+    return found
+
+
+def _year(t: datetime) -> int:
+    if t.tzinfo is not None:
+        t = t.astimezone(timezone.utc)
+    return t.year
+
+
+def _create_years(db: Session, years: Iterable[int]) -> List[int]:
+    created = []
+    for y in sorted(set(years)):
+        name = f"{PARTITION_PREFIX}{y}"
+        exists = db.execute(text("SELECT to_regclass(:n)"), {"n": name}).scalar()
+        if not exists:
+            db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF events "
+                f"FOR VALUES FROM ('{y}-01-01 00:00:00+00') TO ('{y + 1}-01-01 00:00:00+00')"
+            ))
+            created.append(y)
+    _pending(db)["years"].update(years)
+    return created
+
+
+def ensure_partitions(db: Session, times: Iterable[Optional[datetime]]) -> List[int]:
+    """
+    Make sure a partition exists for every year in `times` (min..max);
+    returns the years created. No-op before the table is partitioned. The
+    caller owns the transaction.
+    """
+    years = {_year(t) for t in times if t is not None}
+    if not years:
+        return []
+    missing = set(range(min(years), max(years) + 1)) - _known_years
+    if db.info.get(_PENDING):
+        missing -= db.info[_PENDING]["years"]
+    if not missing or not is_partitioned(db):
+        return []
+    # serialize concurrent writers creating the same year
+    db.execute(text("SELECT pg_advisory_xact_lock(hashtext('events_partitions'))"))
+    return _create_years(db, missing)
+
+
+def convert(db: Session) -> int:
+    """
+    Rebuild an unpartitioned events table as a partitioned one (same
+    columns, defaults, generated columns, id sequence and secondary
+    indexes); returns rows moved. One transaction: it either completes or
+    leaves the old table untouched. Commits on success.
+    """
+    if is_partitioned(db):
+        return 0
+
+    seq = db.execute(text("SELECT pg_get_serial_sequence('events', 'id')")).scalar()
+    index_defs = db.execute(text(
+        "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() "
+        "AND tablename = 'events' AND indexname <> 'events_pkey'"
+    )).scalars().all()
+    years = db.execute(text(
+        "SELECT DISTINCT extract(year FROM occurred_at AT TIME ZONE 'UTC')::int FROM events"
+    )).scalars().all()
+    columns = db.execute(text(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = 'events' AND is_generated = 'NEVER' "
+        "ORDER BY ordinal_position"
+    )).scalars().all()
+    cols = ", ".join(columns)
+
+    db.execute(text("ALTER TABLE events RENAME TO events_unpartitioned"))
+    db.execute(text("ALTER INDEX IF EXISTS events_pkey RENAME TO events_unpartitioned_pkey"))
+    db.execute(text(
+        "CREATE TABLE events (LIKE events_unpartitioned INCLUDING DEFAULTS INCLUDING GENERATED) "
+        "PARTITION BY RANGE (occurred_at)"
+    ))
+    db.execute(text("ALTER TABLE events ADD PRIMARY KEY (id, occurred_at)"))
+    if seq:
+        # keep the id sequence alive when the old table is dropped
+        db.execute(text(f"ALTER SEQUENCE {seq} OWNED BY events.id"))
+
+    _pending(db)["converted"] = True
+    _create_years(db, [*years, datetime.now(timezone.utc).year])
+
+    moved = db.execute(text(
+        f"INSERT INTO events ({cols}) SELECT {cols} FROM events_unpartitioned"
+    )).rowcount
+    db.execute(text("DROP TABLE events_unpartitioned"))
+    for d in index_defs:
+        db.execute(text(d))
+    db.commit()
+    db.execute(text("ANALYZE events"))
+    db.commit()
+    return moved
+
+
+def partition_counts(db: Session) -> List[tuple]:
+    return db.execute(text(
+        "SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bounds, "
+        "coalesce(s.n_live_tup, 0) AS approx_rows "
+        "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid "
+        "WHERE i.inhparent = 'events'::regclass ORDER BY c.relname"
+    )).all()
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    with SessionLocal() as db:
+        if cmd == "migrate":
+            if is_partitioned(db):
+                print("events is already partitioned")
+            else:
+                n = convert(db)
+                print(f"events partitioned by year: {n} rows moved")
+        elif cmd == "ensure" and len(sys.argv) >= 3:
+            first = int(sys.argv[2])
+            last = int(sys.argv[3]) if len(sys.argv) > 3 else first
+            if not is_partitioned(db):
+                print("events is not partitioned yet (python -m app.partitions migrate)")
+                sys.exit(1)
+            created = _create_years(db, range(first, last + 1))
+            db.commit()
+            print(f"created: {created or 'nothing'}")
+        elif cmd == "list":
+            for r in partition_counts(db):
+                print(f" {r.name:<16} {r.bounds:<80} ~{r.approx_rows} rows")
+        else:
+            print("usage: python -m app.partitions migrate | ensure YEAR [YEAR] | list")
+            sys.exit(2)
@@ -0,0 +1,463 @@
+"""
+Memory-mapped columnar snapshot of events for in-process analytics.
+
+Enabled by POINT_STORE_DIR. manifest.json there names the current data
+directory (row count, id watermark, source/type dictionaries), which holds
+one raw little-endian file per column:
+
+    id.bin        int64    event id (ascending)
+    lat.bin       float64
+    lon.bin       float64
+    t.bin         int64    occurred_at, microseconds since the Unix epoch
+    severity.bin  uint8    0 = NULL
+    source.bin    uint8    1-based index into manifest "sources", 0 = NULL
+    type.bin      uint16   1-based index into manifest "types", 0 = NULL
+    h3.bin        uint64   res-15 H3 cell
+
+Every uvicorn worker maps the files read-only, so the OS page cache holds
+one copy. Filters are NumPy masks over the mapped columns; H3 counts and
+DBSCAN inputs come from the store instead of SQL when it is present.
+
+Refreshing appends events with id > watermark (the files only grow and the
+manifest is replaced atomically, so readers never see partial rows), and
+the API write paths patch updated rows into a new data directory (mapped
+files are never rewritten in place). Ids are not committed in
+order (concurrent inserts), so refresh also re-checks the last
+LATE_WINDOW_IDS ids below the watermark; when a row there is missing, the
+store is rewritten from that row on. A full build or such a rewrite writes
+a new data directory and switches the manifest to it at the end. Writers
+hold a file lock.
+
+Loads outside the API (load_external_data, psql) need a refresh. Refresh
+only adds rows: changes to existing rows outside the API (load_external_data
+--upsert, a psql UPDATE) need a build:
+
+    python -m app.point_store build      # full snapshot
+    python -m app.point_store refresh    # add new events
+    python -m app.point_store status
+"""
+
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from . import clustering
+
+POINT_STORE_DIR = os.getenv("POINT_STORE_DIR", "")
+BATCH_ROWS = 200_000
+# ids below the watermark re-checked by refresh for rows that committed
+# after a higher id was stored
+LATE_WINDOW_IDS = int(os.getenv("POINT_STORE_LATE_WINDOW_IDS", "100000"))
+
+COLUMNS: Dict[str, np.dtype] = {
+    "id": np.dtype("<i8"),
+    "lat": np.dtype("<f8"),
+    "lon": np.dtype("<f8"),
+    "t": np.dtype("<i8"),
+    "severity": np.dtype("u1"),
+    "source": np.dtype("u1"),
+    "type": np.dtype("<u2"),
+    "h3": np.dtype("<u8"),
+}
+MANIFEST = "manifest.json"
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_US = timedelta(microseconds=1)
+
+BBox = Tuple[float, float, float, float]
+
+
+def enabled() -> bool:
+    return bool(POINT_STORE_DIR)
+
+
+def _epoch_us(t: datetime) -> int:
+    if t.tzinfo is None:
+        t = t.replace(tzinfo=timezone.utc)
+    return (t - _EPOCH) // _US
+
+
+class PointStore:
+    """Read-only view of one manifest version."""
+
+    def __init__(self, root: Path, manifest: dict):
+        self.root = root / manifest["data"]
+        self.count: int = manifest["count"]
+        self.max_id: int = manifest["max_id"]
+        self.sources: List[str] = manifest["sources"]
+        self.types: List[str] = manifest["types"]
+        self.cols: Dict[str, np.ndarray] = {
+            name: (np.memmap(self.root / f"{name}.bin", dtype=dt, mode="r", shape=(self.count,))
+                   if self.count else np.empty(0, dtype=dt))
+            for name, dt in COLUMNS.items()
+        }
+
+    def mask(
+        self,
+        bbox=None,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        sources: Optional[Iterable[str]] = None,
+    ) -> np.ndarray:
+        """
+        Rows matching the crud._event_filters semantics: `bbox` is one box or
+        several OR-ed (max edges exclusive below 180°/90°), end exclusive.
+        """
+        c = self.cols
+        m = np.ones(self.count, dtype=bool)
+        if start is not None:
+            m &= c["t"] >= _epoch_us(start)
+        if end is not None:
+            m &= c["t"] < _epoch_us(end)
+        if bbox:
+            if isinstance(bbox[0], (int, float)):
+                bbox = [bbox]
+            inside = np.zeros(self.count, dtype=bool)
+            for minx, miny, maxx, maxy in bbox:
+                lt_x = np.less_equal if maxx >= 180.0 else np.less
+                lt_y = np.less_equal if maxy >= 90.0 else np.less
+                inside |= ((c["lon"] >= minx) & lt_x(c["lon"], maxx)
+                           & (c["lat"] >= miny) & lt_y(c["lat"], maxy))
+            m &= inside
+        src_list = [s for s in (sources or []) if s]
+        if src_list:
+            codes = [self.sources.index(s) + 1 for s in src_list if s in self.sources]
+            keep = np.isin(c["source"], codes)
+            if "demo" in {s.lower() for s in src_list} and "demo" in self.types:
+                keep |= c["type"] == self.types.index("demo") + 1
+            m &= keep
+        return m
+
+    def h3_counts(self, res: int, m: np.ndarray) -> Dict[str, int]:
+        return clustering.h3_count_cells(clustering.h3_parents(self.cols["h3"][m], res))
+
+    def points(self, m: np.ndarray, limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(ids, lat, lon) of matching rows in id order, at most `limit`."""
+        idx = np.flatnonzero(m)
+        if limit is not None:
+            idx = idx[:limit]
+        return self.cols["id"][idx], self.cols["lat"][idx], self.cols["lon"][idx]
+
+
+# ---------------- readers ----------------
+
+_current: Optional[PointStore] = None
+_current_stamp: Optional[Tuple[int, int]] = None
+
+
+def get() -> Optional[PointStore]:
+    """The current snapshot (remapped when the manifest changes), or None."""
+    global _current, _current_stamp
+    if not enabled():
+        return None
+    root = Path(POINT_STORE_DIR)
+    try:
+        st = (root / MANIFEST).stat()
+    except FileNotFoundError:
+        _current = _current_stamp = None
+        return None
+    # os.replace gives every manifest version a new inode
+    stamp = (st.st_ino, st.st_mtime_ns)
+    if stamp != _current_stamp:
+        _current = PointStore(root, json.loads((root / MANIFEST).read_text()))
+        _current_stamp = stamp
+    return _current
+
+
+# Module-level entry points for workers.run_cpu: each process maps the
+# store itself, so only the (small) results cross the process boundary.
+
+def h3_counts(res: int, bbox=None, start=None, end=None, sources=None) -> Dict[str, int]:
+    store = get()
+    return store.h3_counts(res, store.mask(bbox, start, end, sources))
+
+
+def points(bbox=None, start=None, end=None, sources=None, limit=None):
+    store = get()
+    ids, lat, lon = store.points(store.mask(bbox, start, end, sources), limit)
+    return np.array(ids), np.array(lat), np.array(lon)
+
+
+# ---------------- writers ----------------
+
+@contextmanager
+def _locked(root: Path) -> Iterator[None]:
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _new_manifest(root: Path) -> dict:
+    data = f"v{time.time_ns()}"
+    (root / data).mkdir(parents=True)
+    return {"data": data, "count": 0, "max_id": 0, "sources": [], "types": []}
+
+
+def _read_manifest(root: Path) -> dict:
+    path = root / MANIFEST
+    if path.exists():
+        return json.loads(path.read_text())
+    return _new_manifest(root)
+
+
+def _write_manifest(root: Path, manifest: dict) -> None:
+    tmp = root / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps({**manifest, "updated_at": time.time()}))
+    os.replace(tmp, root / MANIFEST)
+
+
+def _code(values: List[Optional[str]], names: List[str], dtype: np.dtype) -> np.ndarray:
+    """Dictionary codes (1-based, 0 = NULL); new values extend `names`."""
+    lookup = {n: i + 1 for i, n in enumerate(names)}
+    out = np.zeros(len(values), dtype=dtype)
+    for i, v in enumerate(values):
+        if v is None:
+            continue
+        code = lookup.get(v)
+        if code is None:
+            names.append(v)
+            code = lookup[v] = len(names)
+        out[i] = code
+    if len(names) > np.iinfo(dtype).max:
+        raise ValueError(f"too many distinct values for {dtype} codes")
+    return out
+
+
+_SELECT = "SELECT id, lat, lon, occurred_at, severity, source, type, h3_cell FROM events "
+
+
+def _columns(rows: Sequence, manifest: dict) -> Dict[str, np.ndarray]:
+    ids, lat, lon, t, severity, source, type_, h3_cell = zip(*rows)
+    lat_a = np.asarray(lat, dtype=np.float64)
+    lon_a = np.asarray(lon, dtype=np.float64)
+    # rows the h3 backfill hasn't reached yet are indexed here
+    cells = [c if c is not None else clustering.h3_cell_int(a, b) for c, a, b in zip(h3_cell, lat, lon)]
+    return {
+        "id": np.asarray(ids, dtype=np.int64),
+        "lat": lat_a,
+        "lon": lon_a,
+        "t": np.asarray([_epoch_us(x) for x in t], dtype=np.int64),
+        "severity": np.clip([s or 0 for s in severity], 0, 255).astype(np.uint8),
+        "source": _code(list(source), manifest["sources"], COLUMNS["source"]),
+        "type": _code(list(type_), manifest["types"], COLUMNS["type"]),
+        "h3": np.asarray(cells, dtype=np.uint64),
+    }
+
+
+def _append(db: Session, root: Path, manifest: dict, publish: bool = True) -> int:
+    data = root / manifest["data"]
+    # drop bytes past the manifest count left by an interrupted append
+    # (readers never map beyond it)
+    for name, dt in COLUMNS.items():
+        path = data / f"{name}.bin"
+        with open(path, "ab"):
+            pass
+        os.truncate(path, manifest["count"] * dt.itemsize)
+
+    added = 0
+    result = db.execute(
+        text(_SELECT + "WHERE id > :after ORDER BY id").execution_options(stream_results=True, yield_per=BATCH_ROWS),
+        {"after": manifest["max_id"]},
+    )
+    try:
+        for part in result.partitions():
+            cols = _columns(part, manifest)
+            for name, arr in cols.items():
+                with open(data / f"{name}.bin", "ab") as f:
+                    f.write(arr.astype(COLUMNS[name], copy=False).tobytes())
+            manifest["count"] += len(part)
+            manifest["max_id"] = int(cols["id"][-1])
+            added += len(part)
+            if publish:
+                _write_manifest(root, manifest)
+    finally:
+        result.close()
+    return added
+
+
+def _stored_ids(root: Path, manifest: dict) -> np.ndarray:
+    if not manifest["count"]:
+        return np.empty(0, dtype=COLUMNS["id"])
+    return np.memmap(root / manifest["data"] / "id.bin", dtype=COLUMNS["id"], mode="r",
+                     shape=(manifest["count"],))
+
+
+def _late_from(db: Session, root: Path, manifest: dict) -> Optional[int]:
+    """
+    Store position of the first event at or below the watermark that is
+    in the database but not in the store (committed after a higher id was
+    appended), searched among the last LATE_WINDOW_IDS ids; None if none.
+    """
+    hi = manifest["max_id"]
+    lo = max(hi - LATE_WINDOW_IDS, 0)
+    in_db = np.fromiter(db.execute(
+        text("SELECT id FROM events WHERE id > :lo AND id <= :hi ORDER BY id"), {"lo": lo, "hi": hi},
+    ).scalars(), dtype=np.int64)
+    stored = _stored_ids(root, manifest)
+    late = in_db[~np.isin(in_db, stored[np.searchsorted(stored, lo, side="right"):])]
+    return int(np.searchsorted(stored, late[0])) if len(late) else None
+
+
+def _rebuild(db: Session, root: Path, keep: int = 0) -> dict:
+    """
+    Write a new data directory with the first `keep` rows of the current
+    one and every later event from the database, then switch to it.
+    """
+    old = _read_manifest(root) if (root / MANIFEST).exists() else None
+    manifest = _new_manifest(root)
+    if old and keep:
+        manifest.update(count=keep, max_id=int(_stored_ids(root, old)[keep - 1]),
+                        sources=list(old["sources"]), types=list(old["types"]))
+        for name, dt in COLUMNS.items():
+            with open(root / old["data"] / f"{name}.bin", "rb") as src, \
+                    open(root / manifest["data"] / f"{name}.bin", "wb") as dst:
+                left = keep * dt.itemsize
+                while left:
+                    chunk = src.read(min(left, 1 << 24))
+                    dst.write(chunk)
+                    left -= len(chunk)
+    # readers keep the old snapshot until the new manifest is written
+    _append(db, root, manifest, publish=False)
+    _write_manifest(root, manifest)
+    if old:
+        # open mappings of the old files stay valid after unlink
+        shutil.rmtree(root / old["data"], ignore_errors=True)
+    return manifest
+
+
+def refresh(db: Session) -> int:
+    """Add events committed since the last refresh; returns the row count change."""
+    root = Path(POINT_STORE_DIR)
+    with _locked(root):
+        manifest = _read_manifest(root)
+        late = _late_from(db, root, manifest)
+        if late is None:
+            return _append(db, root, manifest)
+        return _rebuild(db, root, keep=late)["count"] - manifest["count"]
+
+
+def build(db: Session) -> int:
+    """Rebuild the snapshot from scratch; returns its row count."""
+    root = Path(POINT_STORE_DIR)
+    with _locked(root):
+        return _rebuild(db, root)["count"]
+
+
+def patch(db: Session, ids: Iterable[int]) -> int:
+    """
+    Re-read the given (already stored) events and switch to a new data
+    directory holding their current values. Columns with changes are
+    copied and patched there, the rest are hard-linked; the files readers
+    have mapped are never written.
+    """
+    root = Path(POINT_STORE_DIR)
+    with _locked(root):
+        old = _read_manifest(root)
+        count = old["count"]
+        wanted = [i for i in ids if i <= old["max_id"]]
+        if not wanted or not count:
+            return 0
+        rows = db.execute(text(_SELECT + "WHERE id = ANY(:ids) ORDER BY id"), {"ids": wanted}).all()
+        if not rows:
+            return 0
+        manifest = {**old, "sources": list(old["sources"]), "types": list(old["types"])}
+        cols = _columns(rows, manifest)
+        src = root / old["data"]
+        stored_ids = _stored_ids(root, old)
+        pos = np.searchsorted(stored_ids, cols["id"])
+        found = (pos < count) & (stored_ids[np.minimum(pos, count - 1)] == cols["id"])
+        pos = pos[found]
+        if not len(pos):
+            return 0
+
+        changed = {
+            name for name, dt in COLUMNS.items()
+            if not np.array_equal(np.memmap(src / f"{name}.bin", dtype=dt, mode="r", shape=(count,))[pos],
+                                  cols[name][found])
+        }
+        if not changed:
+            return len(pos)
+
+        manifest["data"] = _new_manifest(root)["data"]
+        dst = root / manifest["data"]
+        for name, dt in COLUMNS.items():
+            path = f"{name}.bin"
+            if name not in changed:
+                os.link(src / path, dst / path)
+                continue
+            shutil.copyfile(src / path, dst / path)
+            mm = np.memmap(dst / path, dtype=dt, mode="r+", shape=(count,))
+            mm[pos] = cols[name][found]
+            mm.flush()
+            del mm
+        _write_manifest(root, manifest)
+        # open mappings of the old files stay valid after unlink
+        shutil.rmtree(src, ignore_errors=True)
+        return len(pos)
+
+
+def sync(db: Session, updated_ids: Iterable[int] = ()) -> None:
+    """
+    After API writes: append new events and patch updated ones. No-op when
+    disabled or before the first build, which is left to
+    `python -m app.point_store build` rather than an HTTP request.
+    """
+    if not enabled() or not (Path(POINT_STORE_DIR) / MANIFEST).exists():
+        return
+    refresh(db)
+    ids = list(updated_ids)
+    if ids:
+        patch(db, ids)
+
+
+def sync_job(updated_ids: Sequence[int] = ()) -> None:
+    """sync() on a session of its own, for workers.run_cpu."""
+    from .db import SessionLocal
+
+    with SessionLocal() as db:
+        sync(db, updated_ids)
+
+
+if __name__ == "__main__":
+    from .db import SessionLocal
+
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    if not enabled():
+        print("POINT_STORE_DIR is not set")
+        sys.exit(2)
+    with SessionLocal() as db:
+        t0 = time.perf_counter()
+        if cmd == "build":
+            n = build(db)
+            print(f"built: {n} rows in {time.perf_counter() - t0:.1f}s")
+        elif cmd == "refresh":
+            n = refresh(db)
+            print(f"appended: {n} rows in {time.perf_counter() - t0:.1f}s")
+        elif cmd == "status":
+            store = get()
+            if store is None:
+                print("no snapshot yet (python -m app.point_store build)")
+            else:
+                size = sum((store.root / f"{n}.bin").stat().st_size for n in COLUMNS)
+                lag = db.execute(text("SELECT count(*) FROM events WHERE id > :m"), {"m": store.max_id}).scalar()
+                print(f" rows {store.count:,}  max id {store.max_id}  {size / 2**20:,.1f} MiB  "
+                      f"{len(store.sources)} sources, {len(store.types)} types; {lag:,} newer events in the database")
+        else:
+            print("usage: python -m app.point_store build | refresh | status")
+            sys.exit(2)
@@ -0,0 +1,325 @@
+"""
+DBSCAN from per-H3-region state, reusable across overlapping viewports.
+
+Points are grouped into H3 regions at a resolution whose cells are much
+wider than eps (region_res), so every eps-neighbour of a point lies in its
+region's 1-ring. For each region the state records, from its points'
+neighbourhoods within that ring:
+
+    ids           event ids of the region's points (ascending)
+    core          neighbour count (self included) >= min_samples
+    comp          connected component of each core point among the
+                  region's own core points (-1 for non-core points)
+    cross_*       (component, neighbour id) pairs linking the region's
+                  core points to points in other regions
+    border_*      neighbour ids of each non-core point (counts + ids)
+    ring_key      fingerprint of the ids and coordinates of every point
+                  in the region's 1-ring when the state was computed
+
+A region whose whole 1-ring lies inside the requested viewport sees the
+same points in every viewport with the same filters, so its state is
+cached (in-process LRU keyed like the result cache, so cache.invalidate()
+retires it too; DBSCAN_REGION_CACHE_ENTRIES bounds it). After a pan only
+the regions along the viewport edge are recomputed, and the KD-tree is
+built over the points of their 1-rings only. A cached state is only used
+while its ring_key matches the request's points: invalidate() only
+reaches the worker that handled the write, and writes outside the API are
+only bounded by the cache TTL, so a stale state is recomputed rather than
+merged. eps is capped at MAX_EPS_M, where the coarsest regions (res 0)
+stop being wide enough for the 1-ring assumption.
+
+merge() joins components across regions through the cross pairs and
+assigns labels the way sklearn's DBSCAN does for the points in id order.
+Clusters are numbered by their lowest-index core point, and a border
+point takes the lowest-numbered cluster among its core neighbours. The
+labels are therefore identical to clustering.dbscan_chord on the same
+points sorted by id.
+"""
+
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+import h3
+import numpy as np
+from h3.api import basic_int as h3_int
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sklearn.neighbors import NearestNeighbors
+
+from . import cache, clustering, workers
+
+# region edge >= this many eps, so every eps-neighbour of a point lies in
+# its region's 1-ring (H3 cells vary ~2x in size within a resolution)
+REGION_EDGE_EPS = 4.0
+REGION_CACHE_ENTRIES = int(os.getenv("DBSCAN_REGION_CACHE_ENTRIES", "4096"))
+# largest eps for which res-0 regions still have edges >= REGION_EDGE_EPS * eps
+MAX_EPS_M = int(h3.edge_length(0, unit="m") / REGION_EDGE_EPS)
+
+BBox = Tuple[float, float, float, float]
+
+_states = cache.LRUCache(max_entries=REGION_CACHE_ENTRIES)
+
+
+class RegionState(NamedTuple):
+    ids: np.ndarray          # int64, ascending
+    core: np.ndarray         # bool per point
+    comp: np.ndarray         # component per core point (-1 otherwise), unique within the region
+    cross_comp: np.ndarray   # component of a core point ...
+    cross_ids: np.ndarray    # ... and the id of its neighbour in another region
+    border_counts: np.ndarray  # neighbours per non-core point (0 for core points)
+    border_ids: np.ndarray     # their ids, concatenated
+    ring_key: int              # ring_keys() of the region when computed
+
+
+class StaleRegionState(ValueError):
+    """A region state refers to points that are not in the request."""
+
+
+def region_res(eps_m: float) -> int:
+    """Finest resolution whose average edge is at least REGION_EDGE_EPS * eps."""
+    if eps_m > MAX_EPS_M:
+        raise ValueError(f"eps_m above {MAX_EPS_M}: no H3 region is wide enough")
+    res = 0
+    for r in range(clustering.H3_MAX_RES + 1):
+        if h3.edge_length(r, unit="m") < REGION_EDGE_EPS * eps_m:
+            break
+        res = r
+    return res
+
+
+@lru_cache(maxsize=65536)
+def _ring(cell: int) -> Tuple[int, ...]:
+    return tuple(h3_int.k_ring(cell, 1))
+
+
+@lru_cache(maxsize=65536)
+def _ring_extent(cell: int) -> Optional[BBox]:
+    """Lon/lat bounds of the cell's 1-ring; None when it straddles the antimeridian."""
+    lat, lon = np.concatenate([np.array(h3_int.h3_to_geo_boundary(c)) for c in _ring(cell)]).T
+    if np.ptp(lon) >= 180:
+        return None
+    # geodesic cell edges bow slightly off the straight lon/lat segments
+    margin = 0.01 * h3.edge_length(h3_int.h3_get_resolution(cell), unit="m") / 111_195.0
+    return lon.min() - margin, lat.min() - margin, lon.max() + margin, lat.max() + margin
+
+
+def _cacheable(cells: np.ndarray, region: Optional[Sequence[BBox]]) -> List[int]:
+    """Region cells whose whole 1-ring lies inside one of the boxes (None = the world)."""
+    if not region:
+        return cells.tolist()
+    out = []
+    for cell in cells.tolist():
+        ext = _ring_extent(cell)
+        if ext is not None and any(
+            x0 <= ext[0] and y0 <= ext[1] and ext[2] <= x1 and ext[3] <= y1 for x0, y0, x1, y1 in region
+        ):
+            out.append(cell)
+    return out
+
+
+def ring_keys(ids: np.ndarray, lat: np.ndarray, lon: np.ndarray, cells: np.ndarray) -> Dict[int, int]:
+    """
+    {region cell: fingerprint of the points in its 1-ring} for every
+    region with points: a wrapping sum of a per-point hash of id, lat and
+    lon, so it changes when a point is added, removed or moved.
+    """
+    h = ids.astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+    h ^= np.ascontiguousarray(lat, dtype=np.float64).view(np.uint64) * np.uint64(0xC2B2AE3D27D4EB4F)
+    h ^= np.ascontiguousarray(lon, dtype=np.float64).view(np.uint64) * np.uint64(0x165667B19E3779F9)
+    h ^= h >> np.uint64(29)
+    present, inverse = np.unique(cells, return_inverse=True)
+    sums = np.zeros(len(present), dtype=np.uint64)
+    np.add.at(sums, inverse, h)
+    own = dict(zip(present.tolist(), sums.tolist()))
+    return {
+        c: sum(own.get(r, 0) for r in _ring(c)) & 0xFFFFFFFFFFFFFFFF
+        for c in own
+    }
+
+
+def plan(
+    ids: np.ndarray, lat: np.ndarray, lon: np.ndarray, eps_m: float, region: Optional[Sequence[BBox]],
+) -> Tuple[int, np.ndarray, List[int], Dict[int, int]]:
+    """
+    (region res, region cell per point, region cells whose state is
+    cacheable, ring_keys of every region).
+    """
+    res = region_res(eps_m)
+    cells = clustering.h3_cells(lat, lon, res)
+    return res, cells, _cacheable(np.unique(cells), region), ring_keys(ids, lat, lon, cells)
+
+
+def region_states(
+    ids: np.ndarray, lat: np.ndarray, lon: np.ndarray, cells: np.ndarray,
+    wanted: Iterable[int], eps_m: float, min_samples: int, keys: Dict[int, int],
+) -> Dict[int, RegionState]:
+    """
+    States of the `wanted` region cells. `ids` (ascending), `lat`, `lon`
+    and `cells` are all points of the request and `keys` their ring_keys.
+    One KD-tree over the points in the wanted regions' 1-rings (all their
+    neighbours can be) answers the queries of every wanted region.
+    """
+    wanted = list(wanted)
+    ring = np.fromiter({r for c in wanted for r in _ring(c)}, dtype=np.uint64)
+    pool = np.flatnonzero(np.isin(cells, ring))  # ascending, so ids ascending too
+    q = np.flatnonzero(np.isin(cells, np.asarray(wanted, dtype=np.uint64)))
+    q = q[np.argsort(cells[q], kind="stable")]  # grouped by region, ids ascending within
+    xyz = clustering.unit_xyz(np.column_stack((lat[pool], lon[pool])))
+    hoods = []
+    if len(q):
+        nn = NearestNeighbors(radius=clustering.chord_eps(eps_m), algorithm="kd_tree").fit(xyz)
+        hoods = [pool[h] for h in nn.radius_neighbors(xyz[np.searchsorted(pool, q)], return_distance=False)]
+
+    m = len(q)
+    sizes = np.fromiter(map(len, hoods), dtype=np.int64, count=m)
+    flat = np.concatenate(hoods).astype(np.int64) if m else np.empty(0, dtype=np.int64)
+    src = np.repeat(np.arange(m), sizes)
+    core = sizes >= min_samples
+
+    # same-region neighbours are query points too: their position in q
+    where = np.full(len(ids), -1, dtype=np.int64)
+    where[q] = np.arange(m)
+    same = cells[flat] == cells[q][src]
+    local = np.where(same, where[flat], -1)
+    inner = same & core[src] & core[np.maximum(local, 0)]
+    graph = coo_matrix((np.ones(int(inner.sum())), (src[inner], local[inner])), shape=(m, m))
+    _, cc = connected_components(graph, directed=False)
+    comp = np.where(core, cc, -1)
+
+    # region position of every query point (q is grouped by region)
+    present, counts = np.unique(cells[q], return_counts=True)
+    reg = np.repeat(np.arange(len(present)), counts)
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+
+    # (component, outside neighbour) pairs, deduplicated per region
+    out_edge = ~same & core[src]
+    c_reg, c_comp, c_ids = reg[src[out_edge]], comp[src[out_edge]], ids[flat[out_edge]]
+    order = np.lexsort((c_ids, c_comp, c_reg))
+    c_reg, c_comp, c_ids = c_reg[order], c_comp[order], c_ids[order]
+    first = np.ones(len(c_reg), dtype=bool)
+    first[1:] = (np.diff(c_reg) != 0) | (np.diff(c_comp) != 0) | (np.diff(c_ids) != 0)
+    c_reg, c_comp, c_ids = c_reg[first], c_comp[first], c_ids[first]
+    c_bounds = np.searchsorted(c_reg, np.arange(len(present) + 1))
+
+    border_counts = np.where(core, 0, sizes)
+    border_ids = ids[flat[~core[src]]]
+    b_bounds = np.concatenate(([0], np.cumsum(border_counts)))[bounds]
+
+    # copies, so cached states don't pin the request's arrays
+    return {
+        cell: RegionState(
+            ids=ids[q[a:b]], core=core[a:b].copy(), comp=comp[a:b].copy(),
+            cross_comp=c_comp[ca:cb].copy(), cross_ids=c_ids[ca:cb].copy(),
+            border_counts=border_counts[a:b].copy(), border_ids=border_ids[ba:bb].copy(),
+            ring_key=keys[cell],
+        )
+        for cell, a, b, ca, cb, ba, bb in zip(
+            present.tolist(), bounds[:-1].tolist(), bounds[1:].tolist(),
+            c_bounds[:-1].tolist(), c_bounds[1:].tolist(), b_bounds[:-1].tolist(), b_bounds[1:].tolist(),
+        )
+    }
+
+
+def _positions(ids: np.ndarray, wanted: np.ndarray) -> np.ndarray:
+    """Index of each of `wanted` in `ids` (ascending); StaleRegionState if one is missing."""
+    pos = np.minimum(np.searchsorted(ids, wanted), max(len(ids) - 1, 0))
+    if len(wanted) and (not len(ids) or not np.array_equal(ids[pos], wanted)):
+        raise StaleRegionState("region state refers to points not in the request")
+    return pos
+
+
+def merge(ids: np.ndarray, states: Iterable[RegionState]) -> np.ndarray:
+    """
+    DBSCAN labels for `ids` (ascending) from the states of all their
+    regions. Raises StaleRegionState when a state does not fit the ids.
+    """
+    states = list(states)
+    n = len(ids)
+    labels = np.full(n, -1, dtype=np.int64)
+    if not n or not states:
+        return labels
+
+    def cat(field):
+        return np.concatenate([getattr(s, field) for s in states])
+
+    def tags(field):
+        return np.repeat(np.arange(len(states), dtype=np.int64), [len(getattr(s, field)) for s in states])
+
+    idx = _positions(ids, cat("ids"))
+    if len(idx) != n or len(np.unique(idx)) != n:
+        raise StaleRegionState("region states do not cover the request's points exactly")
+    core_all, comp_all, tag = cat("core"), cat("comp"), tags("ids")
+    core = np.zeros(n, dtype=bool)
+    core[idx] = core_all
+
+    # one graph node per (region, component)
+    span = np.int64(n + 1)
+    keys, node_of_core = np.unique(tag[core_all] * span + comp_all[core_all], return_inverse=True)
+    node = np.full(n, -1, dtype=np.int64)
+    node[idx[core_all]] = node_of_core
+
+    a = np.searchsorted(keys, tags("cross_comp") * span + cat("cross_comp"))
+    b = _positions(ids, cat("cross_ids"))
+    keep = core[b]
+    graph = coo_matrix((np.ones(int(keep.sum())), (a[keep], node[b[keep]])), shape=(len(keys), len(keys)))
+    _, cluster_of_node = connected_components(graph, directed=False)
+
+    # clusters are numbered by their lowest-index core point, like sklearn
+    core_idx = np.flatnonzero(core)
+    cluster = cluster_of_node[node[core_idx]]
+    first = np.full(cluster.max(initial=-1) + 1, n, dtype=np.int64)
+    np.minimum.at(first, cluster, core_idx)
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first, kind="stable")] = np.arange(len(first))
+    labels[core_idx] = rank[cluster]
+
+    # border points: the lowest-numbered cluster among their core neighbours
+    pts = np.repeat(idx, cat("border_counts"))
+    nbrs = _positions(ids, cat("border_ids"))
+    hit = core[nbrs]
+    none = np.iinfo(np.int64).max
+    best = np.full(n, none, dtype=np.int64)
+    np.minimum.at(best, pts[hit], labels[nbrs[hit]])
+    labels[best != none] = best[best != none]
+    return labels
+
+
+async def dbscan(
+    ids: np.ndarray, lat: np.ndarray, lon: np.ndarray, *,
+    eps_m: float, min_samples: int, region: Optional[Sequence[BBox]], filters: dict,
+) -> np.ndarray:
+    """
+    Labels for the points (ids ascending) of a viewport `region` whose
+    points are all present (not truncated by a limit). `filters` are the
+    other query parameters (time range, sources), part of the cache key.
+    """
+    res, cells, cacheable, rings = await workers.run_cpu(plan, ids, lat, lon, eps_m, region)
+    states: Dict[int, RegionState] = {}
+    keys = {
+        c: cache.make_key("dbscan_region", {**filters, "eps_m": eps_m, "min_samples": min_samples,
+                                            "res": res, "cell": c})
+        for c in cacheable
+    }
+    for c, key in keys.items():
+        s = _states.get(key)
+        # a state computed from other points than this request's is recomputed
+        if s is not cache.MISSING and s.ring_key == rings[c]:
+            states[c] = s
+    missing = [c for c in rings if c not in states]
+    if missing:
+        fresh = await workers.run_cpu(region_states, ids, lat, lon, cells, missing, eps_m, min_samples, rings)
+        for c, s in fresh.items():
+            if c in keys:
+                _states.set(keys[c], s)
+        states.update(fresh)
+    try:
+        return await workers.run_cpu(merge, ids, list(states.values()))
+    except StaleRegionState:
+        # should not happen while the ring keys match; never serve it twice
+        _states.invalidate()
+        return await workers.run_cpu(
+            clustering.dbscan_chord, np.column_stack((lat, lon)), eps_m=eps_m, min_samples=min_samples,
+        )
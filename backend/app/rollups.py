@@ -0,0 +1,200 @@
+"""
+Pre-aggregated H3 counts for the zoomed-out map views.
+
+event_h3_rollup holds one row per (res, h3 cell, source, type, UTC day)
+for resolutions 0..ROLLUP_MAX_RES. It is maintained incrementally by the API
+write paths (crud.bulk_insert_events / crud.bulk_update_events) and by the
+h3 backfill; h3_cells stores each cell's center so viewports can be
+filtered without touching events.
+
+Usage (inside the API container):
+    python -m app.rollups rebuild        # recompute everything from events
+    python -m app.rollups check          # compare against raw counts
+    python -m app.rollups check 5 7      # ... for selected resolutions only
+"""
+
+from __future__ import annotations
+
+import sys
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Sequence
+
+import h3
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .db import SessionLocal
+
+ROLLUP_MAX_RES = 9
+
+# Parent of the stored res-15 cell at resolution g.res (same masks as
+# clustering.h3_parent_masks, expressed in SQL so every resolution can be
+# produced from one scan with generate_series).
+_PARENT_SQL = (
+    "((e.h3_cell & ~(15::bigint << 52)) | (g.res::bigint << 52) "
+    "| ((1::bigint << (3 * (15 - g.res))) - 1))"
+)
+
+
+# events.source is generated from properties->>'source' (migration 0002); a
+# staging table has no generated columns, so it spells out the expression
+_STAGE_SOURCE_SQL = "e.properties->>'source'"
+
+
+def _grain_select(table: str = "events", source: str = "e.source") -> str:
+    # the grain groups on the same column crud._source_clause filters on
+    return (
+        "SELECT g.res, " + _PARENT_SQL + " AS h3_cell, "
+        f"COALESCE({source}, '') AS source, COALESCE(e.type, '') AS type, "
+        # UTC days whatever the session TimeZone, as covers() assumes
+        "date_trunc('day', e.occurred_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS bucket, count(*) AS n "
+        f"FROM {table} e CROSS JOIN generate_series(0, :max_res) AS g(res) "
+    )
+
+_GRAIN_SELECT = _grain_select()
+
+
+def covers(res: int, start: Optional[datetime], end: Optional[datetime]) -> bool:
+    """
+    True when a query at this resolution/time range lines up with the
+    rollup grain: start/end at UTC midnight (naive times are UTC).
+    """
+    if res > ROLLUP_MAX_RES:
+        return False
+    for t in (start, end):
+        if t is None:
+            continue
+        if t.tzinfo is not None:
+            t = t.astimezone(timezone.utc)
+        if (t.hour, t.minute, t.second, t.microsecond) != (0, 0, 0, 0):
+            return False
+    return True
+
+
+def needs_utc_rebuild(db: Session) -> bool:
+    """True when rollup buckets were cut at local midnight by an older version."""
+    return db.execute(text(
+        "SELECT 1 FROM event_h3_rollup "
+        "WHERE bucket <> date_trunc('day', bucket AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' LIMIT 1"
+    )).first() is not None
+
+
+def apply_events(db: Session, ids: Sequence[int], sign: int) -> None:
+    """
+    Add (sign=+1) or remove (sign=-1) the given events' current values to the
+    rollup. Call with -1 before mutating rows and +1 afterwards; the caller
+    owns the transaction.
+    """
+    if not ids:
+        return
+    _apply(db, "events", "e.id = ANY(:ids)", {"ids": list(ids)}, sign)
+
+
+def apply_query(db: Session, id_query: str, sign: int) -> None:
+    """apply_events for the event ids returned by `id_query` (e.g. a temp table)."""
+    _apply(db, "events", f"e.id IN ({id_query})", {}, sign)
+
+
+def apply_table(db: Session, table: str) -> None:
+    """Add every row of a staging table shaped like events (COPY ingest)."""
+    _apply(db, table, "TRUE", {}, +1, source=_STAGE_SOURCE_SQL)
+
+
+def _apply(db: Session, table: str, where: str, params: dict, sign: int, source: str = "e.source") -> None:
+    params = {**params, "max_res": ROLLUP_MAX_RES}
+    db.execute(text(
+        "INSERT INTO event_h3_rollup (res, h3_cell, source, type, bucket, count) "
+        "SELECT res, h3_cell, source, type, bucket, n * :sign FROM ("
+        + _grain_select(table, source) +
+        f"WHERE {where} AND e.h3_cell IS NOT NULL GROUP BY 1, 2, 3, 4, 5"
+        ") d "
+        "ON CONFLICT (res, h3_cell, source, type, bucket) "
+        "DO UPDATE SET count = event_h3_rollup.count + EXCLUDED.count"
+    ), {**params, "sign": sign})
+
+    if sign > 0:
+        missing = db.execute(text(
+            "SELECT DISTINCT p.cell FROM ("
+            "SELECT " + _PARENT_SQL + " AS cell "
+            f"FROM {table} e CROSS JOIN generate_series(0, :max_res) AS g(res) "
+            f"WHERE {where} AND e.h3_cell IS NOT NULL"
+            ") p WHERE NOT EXISTS (SELECT 1 FROM h3_cells c WHERE c.h3_cell = p.cell)"
+        ), params).scalars().all()
+        _insert_centers(db, missing)
+
+
+def _insert_centers(db: Session, cells: Iterable[int]) -> None:
+    params = []
+    for cell in cells:
+        h = format(cell, "x")
+        lat, lon = h3.h3_to_geo(h)
+        params.append({"cell": cell, "res": h3.h3_get_resolution(h), "lat": lat, "lon": lon})
+    if params:
+        db.execute(text(
+            "INSERT INTO h3_cells (h3_cell, res, lat, lon) VALUES (:cell, :res, :lat, :lon) "
+            "ON CONFLICT (h3_cell) DO NOTHING"
+        ), params)
+
+
+def rebuild(db: Session, batch_size: int = 50_000) -> int:
+    """Recompute the rollup from scratch; returns the number of rollup rows."""
+    from .h3_backfill import backfill_h3_cells
+
+    backfill_h3_cells(db)
+
+    db.execute(text("TRUNCATE event_h3_rollup"))
+    db.execute(text(
+        "INSERT INTO event_h3_rollup (res, h3_cell, source, type, bucket, count) "
+        + _GRAIN_SELECT + "WHERE e.h3_cell IS NOT NULL GROUP BY 1, 2, 3, 4, 5"
+    ), {"max_res": ROLLUP_MAX_RES})
+
+    missing = db.execute(text(
+        "SELECT DISTINCT r.h3_cell FROM event_h3_rollup r "
+        "WHERE NOT EXISTS (SELECT 1 FROM h3_cells c WHERE c.h3_cell = r.h3_cell)"
+    )).scalars().all()
+    for i in range(0, len(missing), batch_size):
+        _insert_centers(db, missing[i:i + batch_size])
+
+    db.commit()
+    return db.execute(text("SELECT count(*) FROM event_h3_rollup")).scalar_one()
+
+
+def check(db: Session, resolutions: Optional[Iterable[int]] = None) -> dict[int, int]:
+    """
+    Compare rollup rows with counts recomputed from events.
+    Returns {res: mismatched_rows}; all zeros means the rollup is consistent.
+    """
+    res_list = sorted(set(resolutions)) if resolutions else list(range(ROLLUP_MAX_RES + 1))
+    rows = db.execute(text(
+        "WITH raw AS ("
+        + _GRAIN_SELECT +
+        "WHERE e.h3_cell IS NOT NULL AND g.res = ANY(:res_list) GROUP BY 1, 2, 3, 4, 5"
+        "), rolled AS ("
+        "SELECT res, h3_cell, source, type, bucket, count AS n FROM event_h3_rollup "
+        "WHERE count <> 0 AND res = ANY(:res_list)"
+        ") "
+        "SELECT res, count(*) AS bad FROM raw FULL JOIN rolled "
+        "USING (res, h3_cell, source, type, bucket) "
+        "WHERE raw.n IS DISTINCT FROM rolled.n GROUP BY res"
+    ), {"max_res": max(res_list), "res_list": res_list}).all()
+    return {r: 0 for r in res_list} | {r.res: int(r.bad) for r in rows}
+
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else ""
+    with SessionLocal() as db:
+        if cmd == "rebuild":
+            n = rebuild(db)
+            print(f"Rollup rebuilt: {n} rows")
+        elif cmd == "check":
+            res_args = [int(a) for a in sys.argv[2:]]
+            result = check(db, res_args)
+            for res, bad in result.items():
+                print(f" res {res}: {'OK' if bad == 0 else f'{bad} mismatched rows'}")
+            pending = db.execute(text("SELECT count(*) FROM events WHERE h3_cell IS NULL")).scalar_one()
+            if pending:
+                print(f" {pending} events have no h3_cell yet (run python -m app.h3_backfill)")
+            sys.exit(1 if any(result.values()) else 0)
+        else:
+            print("usage: python -m app.rollups rebuild | check [res ...]")
+            sys.exit(2)
@@ -0,0 +1,41 @@
+"""
+XYZ (web mercator) tile helpers for the tiled endpoints.
+
+Tiles never cross the antimeridian, so tile queries need no _split_bbox.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+
+# Tiles change with every write, so caches must revalidate each use (cheap:
+# the ETag turns an unchanged tile into a 304) rather than serve a copy
+# that hides the user's own edit.
+TILE_CACHE_CONTROL = "no-cache"
+
+
+def valid_tile(z: int, x: int, y: int) -> bool:
+    n = 1 << z
+    return 0 <= x < n and 0 <= y < n
+
+
+def tile_bbox(z: int, x: int, y: int) -> tuple[float, float, float, float]:
+    """(minx, miny, maxx, maxy) in degrees of tile z/x/y."""
+    n = 1 << z
+    minx = x / n * 360.0 - 180.0
+    maxx = (x + 1) / n * 360.0 - 180.0
+    maxy = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    miny = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return minx, miny, maxx, maxy
+
+
+def etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def not_modified(if_none_match: str | None, tag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+    return "*" in tags or tag in tags
@@ -0,0 +1,40 @@
+"""
+Process pool for CPU-bound request work (DBSCAN, Python-side H3 binning),
+so async routes don't hold the event loop or a threadpool thread while
+numpy/sklearn run.
+
+CPU_WORKERS sets the pool size (default: all cores; 0 runs the work inline
+in a thread instead, e.g. when uvicorn already runs one worker per core).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if _pool is None and CPU_WORKERS > 0:
+        _pool = ProcessPoolExecutor(max_workers=CPU_WORKERS)
+    return _pool
+
+
+async def run_cpu(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a picklable module-level function in the process pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), partial(fn, *args, **kwargs))
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
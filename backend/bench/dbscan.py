@@ -0,0 +1,70 @@
+"""
+Benchmark: clustering.dbscan_haversine (ball tree, haversine) vs.
+clustering.dbscan_chord (KD-tree on 3D unit vectors, euclidean).
+
+Points are synthetic incident hot spots plus uniform noise over the
+continental US. For each size both engines run on the same points; the
+table shows seconds, the speedup and the share of identical labels. The
+haversine baseline is skipped above --baseline-max points (it takes
+minutes at 1M). No database needed.
+
+Usage (from backend/):
+    python -m bench.dbscan                        # 10k, 100k, 1M
+    python -m bench.dbscan --sizes 50000 --eps-m 250 --n-jobs -1
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from app.clustering import dbscan_chord, dbscan_haversine
+
+
+def synthetic_points(n: int, seed: int = 7) -> np.ndarray:
+    """~70% of points around 200 hot spots (sigma ~1-5 km), the rest uniform noise."""
+    rng = np.random.default_rng(seed)
+    centers = np.column_stack((rng.uniform(25, 49, 200), rng.uniform(-124, -67, 200)))
+    n_hot = int(n * 0.7)
+    which = rng.integers(0, len(centers), n_hot)
+    sigma_deg = rng.uniform(0.01, 0.05, len(centers))[which, None]
+    hot = centers[which] + rng.normal(0.0, 1.0, (n_hot, 2)) * sigma_deg
+    noise = np.column_stack((rng.uniform(25, 49, n - n_hot), rng.uniform(-124, -67, n - n_hot)))
+    pts = np.vstack((hot, noise))
+    return pts[rng.permutation(n)]
+
+
+def _time(fn):
+    t = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", type=int, nargs="*", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--eps-m", type=float, default=500)
+    ap.add_argument("--min-samples", type=int, default=5)
+    ap.add_argument("--n-jobs", type=int, default=-1, help="n_jobs for dbscan_chord")
+    ap.add_argument("--baseline-max", type=int, default=100_000)
+    args = ap.parse_args()
+
+    print(f"{'points':>10}{'haversine s':>13}{'chord s':>10}{'speedup':>9}{'clusters':>10}{'same labels':>13}")
+    for n in args.sizes:
+        pts = synthetic_points(n)
+        fast, t_fast = _time(lambda: dbscan_chord(
+            pts, eps_m=args.eps_m, min_samples=args.min_samples, n_jobs=args.n_jobs,
+        ))
+        clusters = len(set(fast.tolist()) - {-1})
+        if n <= args.baseline_max:
+            base, t_base = _time(lambda: dbscan_haversine(pts, eps_m=args.eps_m, min_samples=args.min_samples))
+            same = float(np.mean(base == fast))
+            print(f"{n:>10,}{t_base:>13.2f}{t_fast:>10.2f}{t_base / t_fast:>9.1f}{clusters:>10,}{same:>13.2%}")
+        else:
+            print(f"{n:>10,}{'-':>13}{t_fast:>10.2f}{'-':>9}{clusters:>10,}{'-':>13}")
+
+
+if __name__ == "__main__":
+    main()
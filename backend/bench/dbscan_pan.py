@@ -0,0 +1,72 @@
+"""
+Benchmark: DBSCAN over a panning viewport, full run per viewport
+(clustering.dbscan_chord) vs. app.region_dbscan reusing the cached state
+of H3 regions shared with the previous viewport.
+
+The points are clustered around hot spots in a 1.5 x 1 degree area. The
+viewport moves east by --step degrees per pan. For every viewport the table
+shows both timings, how many regions had to be computed, and whether the
+labels are identical. Region states are cached in a plain dict here, while
+the API uses an LRU. No database needed.
+
+Usage (from backend/):
+    python -m bench.dbscan_pan
+    python -m bench.dbscan_pan --points 300000 --eps-m 200 --min-samples 10 --pans 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+from app import region_dbscan
+from app.clustering import dbscan_chord
+
+
+def dense_points(n: int, seed: int = 7) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = np.column_stack((rng.uniform(41.0, 42.0, 60), rng.uniform(-96.5, -95.0, 60)))
+    return centers[rng.integers(0, len(centers), n)] + rng.normal(0.0, 0.03, (n, 2))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--points", type=int, default=150_000)
+    ap.add_argument("--eps-m", type=float, default=300)
+    ap.add_argument("--min-samples", type=int, default=20)
+    ap.add_argument("--pans", type=int, default=5)
+    ap.add_argument("--step", type=float, default=0.05, help="degrees per pan")
+    args = ap.parse_args()
+
+    pts = dense_points(args.points)
+    ids = np.arange(len(pts), dtype=np.int64)
+    states: dict = {}
+
+    print(f"{'viewport':>10}{'points':>9}{'full s':>8}{'region s':>10}{'regions':>9}{'computed':>10}{'same':>6}")
+    for k in range(args.pans):
+        box = (-96.4 + k * args.step, 41.1, -95.3 + k * args.step, 41.9)
+        m = (pts[:, 1] >= box[0]) & (pts[:, 1] <= box[2]) & (pts[:, 0] >= box[1]) & (pts[:, 0] <= box[3])
+        vid, lat, lon = ids[m], pts[m, 0], pts[m, 1]
+
+        t = time.perf_counter()
+        full = dbscan_chord(np.column_stack((lat, lon)), eps_m=args.eps_m, min_samples=args.min_samples)
+        t_full = time.perf_counter() - t
+
+        t = time.perf_counter()
+        _, cells, cacheable, rings = region_dbscan.plan(vid, lat, lon, args.eps_m, [box])
+        present = list(rings)
+        have = {c: states[c] for c in cacheable if c in states and states[c].ring_key == rings[c]}
+        missing = [c for c in present if c not in have]
+        fresh = region_dbscan.region_states(vid, lat, lon, cells, missing, args.eps_m, args.min_samples, rings)
+        states.update((c, fresh[c]) for c in cacheable if c in fresh)
+        labels = region_dbscan.merge(vid, [*have.values(), *fresh.values()])
+        t_region = time.perf_counter() - t
+
+        same = "yes" if np.array_equal(labels, full) else "no"
+        print(f"{k:>10}{len(vid):>9,}{t_full:>8.2f}{t_region:>10.2f}{len(present):>9,}{len(missing):>10,}{same:>6}")
+
+
+if __name__ == "__main__":
+    main()
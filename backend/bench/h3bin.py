@@ -0,0 +1,65 @@
+"""
+Benchmark: the per-point H3 binning loop (h3.geo_to_h3 + dict) vs.
+clustering.h3_bin (uint64 cells from NumPy arrays, counted with np.unique),
+and clustering.h3_bin_multi for several resolutions from one indexing pass.
+
+Points come from bench.dbscan.synthetic_points; --stations snaps them to a
+fixed set of locations, like weather events reported by airport stations.
+For each size the table shows seconds per engine, the speedup and whether
+the single-resolution counts are identical. No database needed.
+
+Usage (from backend/):
+    python -m bench.h3bin                          # 10k, 100k, 1M at res 7
+    python -m bench.h3bin --res 9 --multi 5 7 9 --stations 2000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+import h3
+import numpy as np
+
+from app.clustering import h3_bin, h3_bin_multi
+from bench.dbscan import synthetic_points
+
+
+def h3_bin_loop(points, res=7):
+    """The previous clustering.h3_bin."""
+    bins = {}
+    for lat, lon in points:
+        idx = h3.geo_to_h3(lat, lon, res)
+        bins[idx] = bins.get(idx, 0) + 1
+    return bins
+
+
+def _time(fn):
+    t = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", type=int, nargs="*", default=[10_000, 100_000, 1_000_000])
+    ap.add_argument("--res", type=int, default=7)
+    ap.add_argument("--multi", type=int, nargs="*", default=[5, 7, 9])
+    ap.add_argument("--stations", type=int, default=0, help="snap points to this many locations (0 = off)")
+    args = ap.parse_args()
+
+    print(f"{'points':>10}{'loop s':>9}{'h3_bin s':>10}{'speedup':>9}{'multi s':>9}{'cells':>9}{'same':>6}")
+    for n in args.sizes:
+        pts = synthetic_points(n)
+        if args.stations:
+            pts = synthetic_points(args.stations)[np.random.default_rng(3).integers(0, args.stations, n)]
+        pairs = [tuple(p) for p in pts.tolist()]
+        base, t_base = _time(lambda: h3_bin_loop(pairs, res=args.res))
+        fast, t_fast = _time(lambda: h3_bin(pts, res=args.res))
+        _, t_multi = _time(lambda: h3_bin_multi(pts[:, 0], pts[:, 1], args.multi))
+        same = "yes" if base == fast else "no"
+        print(f"{n:>10,}{t_base:>9.2f}{t_fast:>10.2f}{t_base / t_fast:>9.1f}{t_multi:>9.2f}{len(fast):>9,}{same:>6}")
+
+
+if __name__ == "__main__":
+    main()
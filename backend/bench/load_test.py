@@ -0,0 +1,105 @@
+"""
+Load test: concurrent simulated map users against a running API.
+
+Each user loops for --seconds: pans a viewport around a random point near
+Omaha and requests /aggregations/h3, then (every few pans) /clusters/dbscan,
+the way the map does. Prints requests/sec and latency percentiles per
+endpoint. Standard library only; run it against the docker stack.
+
+Usage (from backend/):
+    python -m bench.load_test                                # 8, 32, 64 users x 20s
+    python -m bench.load_test --users 100 --seconds 60 --url http://localhost:8000
+    python -m bench.load_test --no-cache                     # unique viewports (cache misses)
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+CENTER = (-95.9345, 41.2565)
+SOURCES = "demo,noaa_severe_weather,us_weather_events,us_accidents"
+
+
+def _viewport(rnd: random.Random, unique: bool) -> dict:
+    # with unique=False viewports repeat on a coarse grid, like users sharing a view
+    jitter = (lambda: rnd.uniform(-2, 2)) if unique else (lambda: rnd.randrange(-4, 5) * 0.5)
+    cx, cy = CENTER[0] + jitter(), CENTER[1] + jitter()
+    half = rnd.choice((0.5, 1.0, 2.0))
+    return {"minx": cx - half, "miny": cy - half / 2, "maxx": cx + half, "maxy": cy + half / 2}
+
+
+def _user(base: str, deadline: float, seed: int, unique: bool, stats: dict, lock: threading.Lock) -> None:
+    rnd = random.Random(seed)
+    n = 0
+    while time.monotonic() < deadline:
+        vp = _viewport(rnd, unique)
+        calls = [("h3", "/aggregations/h3", {**vp, "res": rnd.choice((5, 6, 7)), "sources": SOURCES})]
+        if n % 4 == 0:
+            calls.append(("dbscan", "/clusters/dbscan", {**vp, "eps_m": 500, "min_samples": 5,
+                                                         "sources": SOURCES, "limit": 5000}))
+        for name, path, params in calls:
+            url = f"{base}{path}?{urllib.parse.urlencode(params)}"
+            t = time.perf_counter()
+            ok = True
+            try:
+                with urllib.request.urlopen(url, timeout=60) as r:
+                    r.read()
+            except (urllib.error.URLError, TimeoutError):
+                ok = False
+            dt = time.perf_counter() - t
+            with lock:
+                stats[name]["lat"].append(dt)
+                stats[name]["errors"] += 0 if ok else 1
+        n += 1
+
+
+def _pct(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] * 1000 if values else float("nan")
+
+
+def run(base: str, users: int, seconds: float, unique: bool) -> None:
+    stats: dict = defaultdict(lambda: {"lat": [], "errors": 0})
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+    threads = [
+        threading.Thread(target=_user, args=(base, deadline, i, unique, stats, lock), daemon=True)
+        for i in range(users)
+    ]
+    t0 = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - t0
+
+    total = sum(len(s["lat"]) for s in stats.values())
+    print(f"\n{users} users, {elapsed:.1f}s: {total / elapsed:,.1f} req/s")
+    print(f"{'endpoint':<10}{'requests':>10}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for name, s in sorted(stats.items()):
+        lat = s["lat"]
+        print(f"{name:<10}{len(lat):>10,}{len(lat) / elapsed:>9.1f}{_pct(lat, .5):>9.0f}"
+              f"{_pct(lat, .95):>9.0f}{_pct(lat, .99):>9.0f}{s['errors']:>8}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--url", default="http://localhost:8000")
+    ap.add_argument("--users", type=int, nargs="*", default=[8, 32, 64])
+    ap.add_argument("--seconds", type=float, default=20)
+    ap.add_argument("--no-cache", action="store_true", help="random viewports so the result cache rarely hits")
+    args = ap.parse_args()
+
+    for users in args.users:
+        run(args.url.rstrip("/"), users, args.seconds, unique=args.no_cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark: single-process data_loaders parsers vs. parallel_loaders.
+
+Parses a CSV with the current iter_*_rows parser and with
+iter_rows_parallel at increasing worker counts, printing rows/sec and the
+speedup over the single-process parser. Parsing only; no database needed.
+
+Usage (from backend/):
+    python -m bench.loaders                                  # synthetic 1M-row US Accidents-like file
+    python -m bench.loaders --rows 3000000
+    python -m bench.loaders --dataset us_accidents --csv /data/US_Accidents_March23.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app.data_loaders import (
+    iter_noaa_severe_weather_rows,
+    iter_us_weather_events_rows,
+    iter_us_accidents_rows,
+)
+from app.parallel_loaders import iter_rows_parallel
+
+SEQUENTIAL = {
+    "noaa_severe_weather": iter_noaa_severe_weather_rows,
+    "us_weather_events": iter_us_weather_events_rows,
+    "us_accidents": iter_us_accidents_rows,
+}
+
+
+def write_synthetic_accidents(path: str, rows: int, seed: int = 7) -> None:
+    rnd = random.Random(seed)
+    t0 = datetime(2016, 1, 1)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["ID", "Source", "Severity", "Start_Time", "End_Time", "Start_Lat", "Start_Lng",
+                    "Description", "City", "State"])
+        for i in range(rows):
+            start = t0 + timedelta(seconds=rnd.randrange(0, 7 * 365 * 86400))
+            w.writerow([
+                f"A-{i}", "Source1", rnd.randint(1, 4), start.strftime("%Y-%m-%d %H:%M:%S"), "",
+                f"{rnd.uniform(25, 49):.6f}", f"{rnd.uniform(-124, -67):.6f}",
+                "Right lane blocked due to accident", "Omaha", "NE",
+            ])
+
+
+def _time(fn) -> tuple[int, float]:
+    t = time.perf_counter()
+    n = fn()
+    return n, time.perf_counter() - t
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--dataset", choices=sorted(SEQUENTIAL), default="us_accidents")
+    ap.add_argument("--csv", help="existing CSV to parse (default: generate a synthetic file)")
+    ap.add_argument("--rows", type=int, default=1_000_000, help="rows in the synthetic file")
+    ap.add_argument("--chunk-mb", type=int, default=16)
+    ap.add_argument("--workers", type=int, nargs="*", help="worker counts to try (default: 1,2,4,... up to CPUs)")
+    args = ap.parse_args()
+
+    tmp = None
+    path = args.csv
+    if not path:
+        if args.dataset != "us_accidents":
+            ap.error("synthetic data is only generated for us_accidents; pass --csv")
+        tmp = tempfile.NamedTemporaryFile(suffix=".csv", delete=False)
+        tmp.close()
+        path = tmp.name
+        print(f"Generating {args.rows:,} synthetic rows -> {path}")
+        write_synthetic_accidents(path, args.rows)
+
+    cpus = os.cpu_count() or 1
+    counts = args.workers or [w for w in (1, 2, 4, 8, 16, 32) if w <= cpus]
+    try:
+        n, base = _time(lambda: sum(1 for _ in SEQUENTIAL[args.dataset](path)))
+        print(f"{'loader':<14}{'rows':>12}{'seconds':>10}{'rows/s':>14}{'speedup':>9}")
+        print(f"{'sequential':<14}{n:>12,}{base:>10.2f}{n / base:>14,.0f}{1.0:>9.2f}")
+        for w in counts:
+            n, secs = _time(lambda: sum(len(b) for b in iter_rows_parallel(
+                args.dataset, path, workers=w, chunk_bytes=args.chunk_mb << 20, ordered=False,
+            )))
+            print(f"{f'parallel x{w}':<14}{n:>12,}{secs:>10.2f}{n / secs:>14,.0f}{base / secs:>9.2f}")
+    finally:
+        if tmp:
+            os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
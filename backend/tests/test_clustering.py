@@ -0,0 +1,33 @@
+import h3
+import numpy as np
+
+from app import clustering
+
+
+def test_pending_rows_bin_like_backfilled_rows():
+    rng = np.random.default_rng(0)
+    lat, lon = rng.uniform(30, 50, 5_000), rng.uniform(-120, -80, 5_000)
+    # what the SQL path derives from events.h3_cell once the backfill ran
+    stored = np.array([clustering.h3_cell_int(a, b) for a, b in zip(lat, lon)], dtype=np.uint64)
+    for res in (3, 7, 9):
+        expected = clustering.h3_count_cells(clustering.h3_parents(stored, res))
+        assert clustering.h3_bin_stored(np.column_stack((lat, lon)), res=res) == expected
+
+
+def test_descendant_range_matches_h3_parent():
+    rng = np.random.default_rng(1)
+    cell = h3.geo_to_h3(41.5, -95.1, 7)
+    lo, hi = clustering.h3_descendant_range(cell)
+    minx, miny, maxx, maxy = clustering.h3_cell_box(cell, margin=1.0)
+    for lat, lon in zip(rng.uniform(miny, maxy, 5_000), rng.uniform(minx, maxx, 5_000)):
+        fine = h3.geo_to_h3(lat, lon, clustering.H3_MAX_RES)
+        assert (lo <= h3.string_to_h3(fine) <= hi) == (h3.h3_to_parent(fine, 7) == cell)
+
+
+def test_parent_masks_match_h3_to_parent():
+    rng = np.random.default_rng(2)
+    for lat, lon in zip(rng.uniform(-80, 80, 200), rng.uniform(-180, 180, 200)):
+        fine = h3.geo_to_h3(lat, lon, clustering.H3_MAX_RES)
+        for res in range(clustering.H3_MAX_RES + 1):
+            keep, setbits = clustering.h3_parent_masks(res)
+            assert (h3.string_to_h3(fine) & keep) | setbits == h3.string_to_h3(h3.h3_to_parent(fine, res))
@@ -0,0 +1,70 @@
+from datetime import timezone
+
+import pytest
+
+from app import columnar_loaders, data_loaders
+
+START_TIMES = [
+    "2016-02-08 05:46:00",
+    "2016-02-08 5:46:00",             # unpadded hour
+    "2016-02-08T06:07:59Z",
+    "2016-02-08 06:49:27.000000000",
+    "2016-02-08 07:23:34+02:00",      # offset applied, not cut off
+    " 2016-02-08 08:00:00 ",
+    "2016-02-08 08:15",
+    "2016-02-30 08:00:00",            # invalid date
+    "not a time",
+    "",
+]
+
+
+def _utc(row):
+    when = row[0]
+    if when.tzinfo is not None:
+        when = when.astimezone(timezone.utc).replace(tzinfo=None)
+    return (when, *row[1:])
+
+
+def _write(tmp_path, header, lines):
+    path = tmp_path / "events.csv"
+    path.write_text("\n".join([",".join(header), *(",".join(line) for line in lines)]) + "\n")
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_rows", [3, 1000])
+def test_us_accidents_columnar_matches_rows(tmp_path, chunk_rows):
+    lines = [[f"A-{i}", t, "41.5", "-95.1", "2", "Omaha", "NE"] for i, t in enumerate(START_TIMES)]
+    path = _write(tmp_path, ["ID", "Start_Time", "Start_Lat", "Start_Lng", "Severity", "City", "State"], lines)
+
+    rows = [_utc(r) for r in data_loaders.iter_us_accidents_rows(path)]
+    cols = [r for b in columnar_loaders.load_us_accidents_columns(path, chunk_rows)
+            for r in columnar_loaders.columns_to_rows(b)]
+    assert len(rows) == 6
+    assert cols == rows
+
+
+@pytest.mark.parametrize("chunk_rows", [3, 1000])
+def test_us_weather_columnar_matches_rows(tmp_path, chunk_rows):
+    lines = [[f"W-{i}", "Rain", "Light", t, "2016-02-08 09:00:00", "0.1", "41.5", "-95.1"]
+             for i, t in enumerate(START_TIMES)]
+    path = _write(tmp_path, ["EventId", "Type", "Severity", "StartTime(UTC)", "EndTime(UTC)",
+                             "Precipitation(in)", "LocationLat", "LocationLng"], lines)
+
+    rows = [_utc(r) for r in data_loaders.iter_us_weather_events_rows(path)]
+    cols = [r for b in columnar_loaders.load_us_weather_events_columns(path, chunk_rows)
+            for r in columnar_loaders.columns_to_rows(b)]
+    assert len(rows) == 7  # this loader strips whitespace
+    assert cols == rows
+
+
+@pytest.mark.parametrize("chunk_rows", [2, 1000])
+def test_us_accidents_severity_matches_rows(tmp_path, chunk_rows):
+    sevs = ["3", " 4 ", "3.0", "3e0", "", "x", "9", "-2", "+2", "99999999999999999999"]
+    lines = [[f"A-{i}", "2016-02-08 05:46:00", "41.5", "-95.1", s, "Omaha", "NE"] for i, s in enumerate(sevs)]
+    path = _write(tmp_path, ["ID", "Start_Time", "Start_Lat", "Start_Lng", "Severity", "City", "State"], lines)
+
+    rows = list(data_loaders.iter_us_accidents_rows(path))
+    cols = [r for b in columnar_loaders.load_us_accidents_columns(path, chunk_rows)
+            for r in columnar_loaders.columns_to_rows(b)]
+    assert [r[4] for r in rows] == [3, 4, 1, 1, 1, 1, 5, 1, 2, 5]
+    assert [r[4] for r in cols] == [r[4] for r in rows]
@@ -0,0 +1,18 @@
+import csv
+import io
+from datetime import datetime, timezone
+
+from app import copy_ingest
+
+
+def _copy_csv_values(text):
+    """Field values the way COPY ... (FORMAT csv, NULL COPY_NULL) reads them."""
+    return [[None if f == copy_ingest.COPY_NULL else f for f in row] for row in csv.reader(io.StringIO(text))]
+
+
+def test_empty_type_stays_an_empty_string():
+    t = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    stream = copy_ingest._CsvStream([(t, 41.0, -95.0, "", None, {}), (t, 41.0, -95.0, None, 3, {})])
+    (empty, null) = _copy_csv_values(stream.read())
+    assert (empty[3], empty[4]) == ("", None)
+    assert (null[3], null[4]) == (None, "3")
@@ -0,0 +1,19 @@
+import numpy as np
+
+from app import clustering, crud
+
+
+def test_pending_rows_selected_by_cell_center_like_the_rollup():
+    rng = np.random.default_rng(3)
+    bbox = (-95.3, 41.2, -94.9, 41.6)
+    lat, lon = rng.uniform(40.5, 42.3, 200_000), rng.uniform(-96.2, -94.0, 200_000)
+    for res in (5, 7):
+        cells = clustering.h3_stored_cells(lat, lon, res)
+        c_lat, c_lon = clustering.h3_centers([format(c, "x") for c in cells])
+        centered = (c_lon >= bbox[0]) & (c_lon < bbox[2]) & (c_lat >= bbox[1]) & (c_lat < bbox[3])
+        expected = clustering.h3_count_cells(cells[centered])
+
+        (minx, miny, maxx, maxy), = crud._pending_region(bbox, res)
+        read = (lon >= minx) & (lon < maxx) & (lat >= miny) & (lat < maxy)
+        got = crud._centered_in(clustering.h3_bin_stored(np.column_stack((lat[read], lon[read])), res), bbox)
+        assert got == expected
@@ -0,0 +1,16 @@
+import math
+
+import numpy as np
+
+from app import density
+
+
+def test_uniform_density_is_flat_across_latitudes():
+    grid = density.grid_for((-180.0, -80.0, 180.0, 80.0), 2, 0)
+    rows, cols = grid.shape
+    iy, ix = np.divmod(np.arange(rows * cols), cols)
+    # 10 events per km^2 everywhere: each cell holds 10 x its ground area
+    y = grid.y0 + (iy + 0.5) * grid.dy
+    area_km2 = math.radians(grid.dx) * grid.dy * 6371.0 ** 2 / np.cosh(y) ** 2
+    values = density.raster(grid, ix, iy, area_km2 * 10.0)
+    np.testing.assert_allclose(values, 10.0, rtol=1e-5)
@@ -0,0 +1,35 @@
+import math
+
+import h3
+import pytest
+
+from app import hotspots
+
+
+def test_gi_star_by_hand():
+    # a, b adjacent, c far away: 7 + 7 - 4 shared + 7 = 17 study cells
+    a = h3.geo_to_h3(41.5, -95.1, 7)
+    b = sorted(h3.k_ring(a, 1) - {a})[0]
+    c = h3.geo_to_h3(10.0, 10.0, 7)
+    stats = hotspots.gi_star({a: 9, b: 2, c: 1})
+
+    n, mean = 17, 12 / 17
+    s = math.sqrt((81 + 4 + 1) / n - mean ** 2)
+    denom = s * math.sqrt((n * 7 - 49) / (n - 1))
+    for cell, local in ((a, 11), (b, 11), (c, 1)):
+        z = (local - mean * 7) / denom
+        count, got_z, p, level = stats[cell]
+        assert got_z == pytest.approx(z)
+        assert p == pytest.approx(math.erfc(abs(z) / math.sqrt(2)))
+        assert level == int(math.copysign(sum(abs(z) >= t for t in hotspots.Z_BINS), z))
+    assert [stats[x][0] for x in (a, b, c)] == [9, 2, 1]
+
+
+def test_one_cell_is_not_significant():
+    cell = h3.geo_to_h3(41.5, -95.1, 7)
+    assert hotspots.gi_star({cell: 5}) == {cell: (5, 0.0, 1.0, 0)}
+
+
+def test_k_out_of_range():
+    with pytest.raises(ValueError):
+        hotspots.gi_star({}, k=hotspots.MAX_K + 1)
@@ -0,0 +1,67 @@
+import json
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app import packed
+
+
+def _unpack(body):
+    """Reads the layout described in packed.py: (header, {name: values})."""
+    magic, version, reserved, header_len = struct.unpack_from("<4sHHI", body)
+    assert (magic, version, reserved) == (packed.MAGIC, packed.VERSION, 0)
+    header = json.loads(body[12:12 + header_len])
+    base = 12 + header_len
+    assert base % 8 == 0
+    cols = {}
+    for spec in header["columns"]:
+        assert spec["offset"] % 8 == 0
+        values = np.frombuffer(body, dtype=np.dtype(spec["dtype"]).newbyteorder("<"),
+                               count=spec["length"], offset=base + spec["offset"])
+        if "dictionary" in spec:
+            values = [spec["dictionary"][c] for c in values.tolist()]
+        elif "null" in spec:
+            values = [None if v == spec["null"] else v for v in values.tolist()]
+        cols[spec["name"]] = values
+    return header, cols
+
+
+def test_events_round_trip():
+    t = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+    rows = [(1, t, 41.5, -95.1, "hail", 3, "noaa"),
+            (2, t, 41.6, -95.2, "wind", None, None),
+            (3, t, 41.7, -95.3, "hail", 5, "noaa")]
+    body = packed.pack(packed.events(rows), meta={"page": 1})
+    assert len(body) % 8 == 0
+
+    header, cols = _unpack(body)
+    assert header["rows"] == 3 and header["meta"] == {"page": 1}
+    assert cols["id"].tolist() == [1, 2, 3]
+    assert cols["occurred_at"].tolist() == [t.timestamp() * 1000.0] * 3
+    assert cols["lat"].tolist() == [41.5, 41.6, 41.7]
+    assert cols["type"] == ["hail", "wind", "hail"]
+    assert cols["source"] == ["noaa", None, "noaa"]
+    assert cols["severity"] == [3, None, 5]
+    spec = {c["name"]: c for c in header["columns"]}
+    assert spec["type"]["dtype"] == "uint16" and spec["type"]["dictionary"] == ["hail", "wind"]
+    assert spec["severity"]["null"] == packed.INT32_NULL
+
+
+def test_odd_sized_columns_stay_aligned():
+    cols = {"a": np.arange(3, dtype=np.int16), "b": np.array([1.5], dtype=np.float64),
+            "c": np.array([7, 8, 9], dtype=np.uint64)}
+    header, out = _unpack(packed.pack(cols))
+    assert [c["offset"] for c in header["columns"]] == [0, 8, 16]
+    assert out["a"].tolist() == [0, 1, 2] and out["b"].tolist() == [1.5] and out["c"].tolist() == [7, 8, 9]
+
+
+def test_h3_counts_round_trip():
+    bins = {"872830828ffffff": 3, "87283082effffff": 12}
+    _, cols = _unpack(packed.pack(packed.h3_counts(bins)))
+    assert {format(h, "x"): n for h, n in zip(cols["h3"].tolist(), cols["count"].tolist())} == bins
+
+
+def test_empty_events():
+    header, cols = _unpack(packed.pack(packed.events([])))
+    assert header["rows"] == 0 and cols["type"] == [] and len(cols["id"]) == 0
@@ -0,0 +1,78 @@
+import sqlite3
+from datetime import datetime
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app import point_store, tiles
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.setattr(point_store, "POINT_STORE_DIR", str(tmp_path / "store"))
+    engine = create_engine(f"sqlite:///{tmp_path / 'events.db'}",
+                           connect_args={"detect_types": sqlite3.PARSE_DECLTYPES})
+    with Session(engine) as s:
+        s.execute(text(
+            "CREATE TABLE events (id INTEGER PRIMARY KEY, lat REAL, lon REAL, occurred_at TIMESTAMP, "
+            "severity INTEGER, source TEXT, type TEXT, h3_cell INTEGER)"
+        ))
+        yield s
+
+
+def _insert(db, *ids):
+    for i in ids:
+        db.execute(text("INSERT INTO events VALUES (:id, :lat, -95.0, :t, 1, 'noaa', 'hail', NULL)"),
+                   {"id": i, "lat": 40.0 + i / 1000, "t": datetime(2024, 1, 1, i % 24)})
+    db.commit()
+
+
+def _stored(db):
+    store = point_store.get()
+    return store.cols["id"].tolist(), store.cols["lat"].tolist()
+
+
+def test_refresh_appends_new_events(db):
+    _insert(db, 1, 2, 3)
+    assert point_store.build(db) == 3
+    _insert(db, 4, 5)
+    assert point_store.refresh(db) == 2
+    ids, lat = _stored(db)
+    assert ids == [1, 2, 3, 4, 5]
+    assert lat == [40.0 + i / 1000 for i in ids]
+
+
+def test_refresh_picks_up_rows_committed_out_of_id_order(db):
+    # ids 3 and 4 belong to a transaction that commits after 5 and 6 were stored
+    _insert(db, 1, 2, 5, 6)
+    point_store.build(db)
+    _insert(db, 3, 4, 7)
+    assert point_store.refresh(db) == 3
+    ids, lat = _stored(db)
+    assert ids == [1, 2, 3, 4, 5, 6, 7]
+    assert lat == [40.0 + i / 1000 for i in ids]
+    assert point_store.refresh(db) == 0
+
+
+def test_tiles_count_edge_points_once(db):
+    points = [(0.0, 0.0), (10.0, 0.0), (0.0, -90.0), (20.0, 180.0), (-30.0, -180.0)]
+    for i, (lat, lon) in enumerate(points, start=1):
+        db.execute(text("INSERT INTO events VALUES (:id, :lat, :lon, :t, 1, 'noaa', 'hail', NULL)"),
+                   {"id": i, "lat": lat, "lon": lon, "t": datetime(2024, 1, 1)})
+    db.commit()
+    point_store.build(db)
+    store = point_store.get()
+    hits = sum(store.mask(tiles.tile_bbox(1, x, y)).astype(int) for x in range(2) for y in range(2))
+    assert hits.tolist() == [1] * len(points)
+
+
+def test_sync_leaves_the_first_build_to_the_cli(db):
+    _insert(db, 1, 2)
+    point_store.sync(db)
+    assert point_store.get() is None
+    point_store.build(db)
+    _insert(db, 3)
+    point_store.sync(db)
+    assert _stored(db)[0] == [1, 2, 3]
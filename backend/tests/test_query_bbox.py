@@ -0,0 +1,47 @@
+import asyncio
+from urllib.parse import urlencode
+
+from app import cache, main
+
+
+def _get(path, params):
+    """Minimal ASGI GET (no httpx here): (status, headers)."""
+    scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(),
+             "query_string": urlencode(params).encode(), "headers": [], "http_version": "1.1",
+             "scheme": "http", "server": ("test", 80), "client": ("test", 1), "root_path": ""}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(main.app(scope, receive, send))
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    return start["status"], {k.decode().lower(): v.decode() for k, v in start["headers"]}
+
+
+def test_aggregations_report_the_snapped_bbox(monkeypatch):
+    seen = {}
+
+    async def h3_counts(db, *, bbox, **kw):
+        seen["bbox"] = bbox
+        return {"872830828ffffff": 3}
+
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(main, "_h3_counts", h3_counts)
+    main.app.dependency_overrides[main.get_async_db] = no_db
+    cache.invalidate()
+    try:
+        status, headers = _get("/aggregations/h3", {
+            "minx": -95.123, "miny": 41.001, "maxx": -94.5, "maxy": 41.4449, "res": 7,
+        })
+    finally:
+        main.app.dependency_overrides.clear()
+
+    assert status == 200
+    assert headers[main.QUERY_BBOX_HEADER.lower()] == "-95.13,41,-94.5,41.45"
+    assert seen["bbox"] == [(-95.13, 41.0, -94.5, 41.45)]
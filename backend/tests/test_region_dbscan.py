@@ -0,0 +1,80 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app import region_dbscan
+from app.clustering import dbscan_chord
+
+EPS_M, MIN_SAMPLES = 300, 10
+BOX = (-96.4, 41.1, -95.3, 41.9)
+
+
+def _points(n=20_000, seed=3):
+    rng = np.random.default_rng(seed)
+    centers = np.column_stack((rng.uniform(41.2, 41.8, 20), rng.uniform(-96.3, -95.4, 20)))
+    pts = centers[rng.integers(0, len(centers), n)] + rng.normal(0.0, 0.02, (n, 2))
+    return np.arange(n, dtype=np.int64) * 3 + 1, pts[:, 0].copy(), pts[:, 1].copy()
+
+
+def _dbscan(ids, lat, lon):
+    return asyncio.run(region_dbscan.dbscan(
+        ids, lat, lon, eps_m=EPS_M, min_samples=MIN_SAMPLES, region=[BOX], filters={"test": 1},
+    ))
+
+
+def _full(lat, lon):
+    return dbscan_chord(np.column_stack((lat, lon)), eps_m=EPS_M, min_samples=MIN_SAMPLES)
+
+
+@pytest.fixture(autouse=True)
+def _empty_state_cache():
+    region_dbscan._states.invalidate()
+    yield
+    region_dbscan._states.invalidate()
+
+
+def test_matches_full_dbscan():
+    ids, lat, lon = _points()
+    np.testing.assert_array_equal(_dbscan(ids, lat, lon), _full(lat, lon))
+
+
+def test_stale_cached_states_are_recomputed(monkeypatch):
+    def no_fallback(*a, **kw):
+        raise AssertionError("stale states reached merge")
+
+    monkeypatch.setattr(region_dbscan.clustering, "dbscan_chord", no_fallback)
+    ids, lat, lon = _points()
+    _dbscan(ids, lat, lon)  # fills the state cache
+
+    # a point deleted and another moved since the states were cached
+    keep = np.ones(len(ids), dtype=bool)
+    keep[len(ids) // 2] = False
+    ids, lat, lon = ids[keep], lat[keep], lon[keep].copy()
+    lon[100] += 0.01
+    lat[200] = lat[300]
+    np.testing.assert_array_equal(_dbscan(ids, lat, lon), _full(lat, lon))
+
+
+def test_merge_rejects_states_of_other_points():
+    ids, lat, lon = _points(5_000)
+    _, cells, _, rings = region_dbscan.plan(ids, lat, lon, EPS_M, [BOX])
+    states = region_dbscan.region_states(ids, lat, lon, cells, list(rings), EPS_M, MIN_SAMPLES, rings)
+    with pytest.raises(region_dbscan.StaleRegionState):
+        region_dbscan.merge(np.delete(ids, 17), states.values())
+
+
+def test_states_of_some_regions_merge_with_cached_ones():
+    ids, lat, lon = _points(5_000)
+    _, cells, _, rings = region_dbscan.plan(ids, lat, lon, EPS_M, [BOX])
+    cached = region_dbscan.region_states(ids, lat, lon, cells, list(rings), EPS_M, MIN_SAMPLES, rings)
+    # a pan recomputes some regions; their KD-tree holds only their 1-rings
+    fresh = region_dbscan.region_states(ids, lat, lon, cells, list(rings)[::3], EPS_M, MIN_SAMPLES, rings)
+    labels = region_dbscan.merge(ids, [*{**cached, **fresh}.values()])
+    np.testing.assert_array_equal(labels, _full(lat, lon))
+
+
+def test_eps_beyond_the_coarsest_regions_is_rejected():
+    assert region_dbscan.region_res(region_dbscan.MAX_EPS_M) == 0
+    with pytest.raises(ValueError):
+        region_dbscan.region_res(region_dbscan.MAX_EPS_M + 1)
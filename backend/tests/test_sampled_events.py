@@ -0,0 +1,33 @@
+import asyncio
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from starlette.requests import Request
+
+from app import crud, main
+
+SampleRow = namedtuple("SampleRow", [*crud.EVENT_POINT_COLUMNS, "total"])
+
+
+def _request(accept: str = "") -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/events", "query_string": b"",
+                    "headers": [(b"accept", accept.encode())]})
+
+
+def test_sampled_events_packed(monkeypatch):
+    t = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    rows = [SampleRow(1, t, 41.5, -95.1, "hail", 3, "noaa", 5),
+            SampleRow(2, t, 41.6, -95.2, "wind", None, "noaa", 5)]
+
+    async def sample_events_async(db, **kw):
+        assert kw["columns"] == crud.EVENT_POINT_COLUMNS
+        return rows, 5, 7
+
+    monkeypatch.setattr(crud, "sample_events_async", sample_events_async)
+    resp = asyncio.run(main._sampled_events(_request(), None, None, None, None, None, 2, 4, "columns"))
+
+    assert resp.media_type == main.packed.PACKED
+    assert resp.headers["X-Total-Count"] == "5"
+    assert resp.headers["X-Truncated"] == "true"
+    assert resp.headers["X-Sample-Res"] == "7"
+    assert resp.body == main.packed.pack(main.packed.events([r[:-1] for r in rows]))
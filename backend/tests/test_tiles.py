@@ -0,0 +1,40 @@
+import math
+
+import pytest
+
+from app import tiles
+
+MERCATOR_MAX_LAT = math.degrees(math.atan(math.sinh(math.pi)))
+
+
+def test_world_tile():
+    minx, miny, maxx, maxy = tiles.tile_bbox(0, 0, 0)
+    assert (minx, maxx) == (-180.0, 180.0)
+    assert miny == pytest.approx(-MERCATOR_MAX_LAT) and maxy == pytest.approx(MERCATOR_MAX_LAT)
+
+
+def test_children_share_edges():
+    nw, ne = tiles.tile_bbox(1, 0, 0), tiles.tile_bbox(1, 1, 0)
+    sw = tiles.tile_bbox(1, 0, 1)
+    assert nw[2] == ne[0] == 0.0
+    assert nw[1] == sw[3] == pytest.approx(0.0, abs=1e-12)
+    assert sw[1] == pytest.approx(-MERCATOR_MAX_LAT)
+    # y grows southwards
+    z, x, y = 12, 960, 1540
+    assert tiles.tile_bbox(z, x, y)[1] == tiles.tile_bbox(z, x, y + 1)[3]
+
+
+@pytest.mark.parametrize("z,x,y,ok", [
+    (0, 0, 0, True), (1, 1, 1, True), (1, 2, 0, False), (1, 0, 2, False),
+    (3, -1, 0, False), (22, (1 << 22) - 1, 0, True),
+])
+def test_valid_tile(z, x, y, ok):
+    assert tiles.valid_tile(z, x, y) is ok
+
+
+def test_not_modified():
+    tag = tiles.etag(b"tile")
+    assert tiles.not_modified(tag, tag)
+    assert tiles.not_modified(f'"other", W/{tag}', tag)
+    assert tiles.not_modified("*", tag)
+    assert not tiles.not_modified(None, tag) and not tiles.not_modified('"other"', tag)
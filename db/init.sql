@@ -14,6 +14,35 @@ ALTER TABLE events
   ADD COLUMN IF NOT EXISTS geom GEOGRAPHY(Point,4326)
   GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(lon, lat), 4326)::geography) STORED;
 
+-- Finest (res 15) H3 cell of the point, filled by the API / loaders.
+-- Coarser cells are derived with bit masks, so GROUP BY works at any resolution.
+ALTER TABLE events ADD COLUMN IF NOT EXISTS h3_cell BIGINT;
+
 CREATE INDEX IF NOT EXISTS idx_events_geom ON events USING gist ((geom::geometry));
 CREATE INDEX IF NOT EXISTS idx_events_time ON events USING brin (occurred_at);
 CREATE INDEX IF NOT EXISTS idx_events_type ON events (type);
+
+-- Pre-aggregated counts per (res 0-9 H3 cell, source, type, day), maintained
+-- incrementally by the API write paths; see backend/app/rollups.py.
+CREATE TABLE IF NOT EXISTS event_h3_rollup (
+  res SMALLINT NOT NULL,
+  h3_cell BIGINT NOT NULL,
+  source TEXT NOT NULL DEFAULT '',
+  type TEXT NOT NULL DEFAULT '',
+  bucket TIMESTAMPTZ NOT NULL,
+  count BIGINT NOT NULL,
+  PRIMARY KEY (res, h3_cell, source, type, bucket)
+);
+
+-- Cell centers, so rollup queries can be restricted to a viewport.
+CREATE TABLE IF NOT EXISTS h3_cells (
+  h3_cell BIGINT PRIMARY KEY,
+  res SMALLINT NOT NULL,
+  lat DOUBLE PRECISION NOT NULL,
+  lon DOUBLE PRECISION NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_h3_cells_res_pos ON h3_cells (res, lon, lat);
+
+-- Later schema changes (generated source column, query indexes, ...) are
+-- numbered steps in backend/app/migrations.py, applied on API start.
@@ -1,20 +1,13 @@
 ﻿import { API_BASE } from "./config"
-import {hexToBox} from "./utils/h3"
+import { PACKED, decodeColumns } from "./utils/columns"
 export const API = API_BASE;
 
 export async function fetchEventsInHex(h3: string) {
-  //Get the parameters for the API call
-  const {minx, miny, maxx, maxy} = hexToBox(h3);
-  const qs = new URLSearchParams({
-    minx: String(minx),
-    miny: String(miny),
-    maxx: String(maxx),
-    maxy: String(maxy),
-    limit: "10000"
-  });
+  //Events the H3 counts put in this cell (by H3 parent, not by the hexagon's bbox)
+  const qs = new URLSearchParams({ limit: "10000" });
 
   //Get the url from the parameters
-  const url = `${API}/events?${qs.toString()}`;
+  const url = `${API}/events/h3/${h3}?${qs.toString()}`;
   
   //Fetch
   try {
@@ -35,14 +28,16 @@ export async function updateEventsBulk(events: any[]){
       body: JSON.stringify(events)
     })
     if(!r.ok) throw new Error(`HTTP ${r.status}`);
-    return await r.json();
+    const result = await r.json();
+    if (result.missing?.length) console.warn("updateEventsBulk: ids not found:", result.missing);
+    return result;
   } catch (e) {
     console.error("updateEventsBulk failed:", e);
     throw e;
   }
 }
 
-export async function fetchH3(params: Record<string, string | number | string[]>) {
+function h3Query(params: Record<string, string | number | string[]>) {
   const qs = new URLSearchParams();
   let sourcesComma = "";
 
@@ -56,16 +51,43 @@ export async function fetchH3(params: Record<string, string | number | string[]>
     }
   }
   if (sourcesComma && !qs.has("sources")) qs.set("sources", sourcesComma);
+  return qs;
+}
 
-  const url = `${API}/aggregations/h3?${qs.toString()}`;
+async function getH3(url: string) {
+  // packed columns: uint64 cells + uint32 counts instead of a JSON array
+  const r = await fetch(url, { headers: { Accept: PACKED } });
+  if (!r.ok) throw new Error(`HTTP ${r.status} ${r.statusText}`);
+  const { rows, columns } = decodeColumns(await r.arrayBuffer());
+  const cells = columns.h3.values as BigUint64Array;
+  const counts = columns.count.values as Uint32Array;
+  const out = new Array<{ h3: string; count: number }>(rows);
+  for (let i = 0; i < rows; i++) out[i] = { h3: cells[i].toString(16), count: counts[i] };
+  return out;
+}
+
+export async function fetchH3(params: Record<string, string | number | string[]>) {
+  const url = `${API}/aggregations/h3?${h3Query(params).toString()}`;
   try {
-    const r = await fetch(url, { headers: { Accept: "application/json" } });
-    if (!r.ok) throw new Error(`HTTP ${r.status} ${r.statusText}`);
-    const json = await r.json();
-    if (!Array.isArray(json)) throw new Error("Expected array JSON");
-    return json as Array<{ h3: string; count: number }>;
+    return await getH3(url);
   } catch (e) {
     console.error("fetchH3 failed:", url, e);
     return [];
   }
 }
+
+// One XYZ tile of H3 counts; null on failure so the caller can retry later.
+// Responses carry an ETag and Cache-Control: no-cache, so the browser
+// revalidates every repeat (304 when unchanged) and sees edits at once.
+export async function fetchH3Tile(
+  z: number, x: number, y: number,
+  params: Record<string, string | number | string[]>,
+) {
+  const url = `${API}/tiles/h3/${z}/${x}/${y}?${h3Query(params).toString()}`;
+  try {
+    return await getH3(url);
+  } catch (e) {
+    console.error("fetchH3Tile failed:", url, e);
+    return null;
+  }
+}
@@ -2,13 +2,23 @@
 import maplibregl from "maplibre-gl";
 import { MapboxOverlay } from "@deck.gl/mapbox";
 import { H3HexagonLayer } from "@deck.gl/geo-layers";
-import { fetchEventsInHex, fetchH3, updateEventsBulk } from "../api";
+import { API, fetchEventsInHex, fetchH3Tile, updateEventsBulk } from "../api";
+import { tilesForBounds, tileZoomFor } from "../utils/tiles";
 import { MAPTILER_KEY } from "../config";
 import "maplibre-gl/dist/maplibre-gl.css";
 import HexEventTable from "./TableView";
 
 type H3Agg = { h3: string; count: number };
+type TileCache = { key: string; tiles: Map<string, H3Agg[]> };
+const MAX_CACHED_TILES = 256;
 const CENTER: [number, number] = [-95.9345, 41.2565];
+// raw event points (vector tiles from the API) appear from this zoom on
+const EVENTS_MIN_ZOOM = 11;
+
+function eventTileUrl(ids: string[]) {
+  const qs = new URLSearchParams({ sources: ids.join(",") });
+  return `${API}/tiles/events/{z}/{x}/{y}.mvt?${qs.toString()}`;
+}
 
 // Must match properties->>'source' in DB
 const DATASETS = [
@@ -44,10 +54,16 @@ export default function MapView() {
   const resRef = useRef<number>(res);
   useEffect(() => { resRef.current = res; }, [res]);
 
+  // H3 counts per XYZ tile for the current res + datasets; panning only
+  // fetches tiles that aren't in here yet
+  const tileCacheRef = useRef<TileCache>({ key: "", tiles: new Map() });
+
   //update events function
   const updateEvents = async (updatedRows: any[]) => {
     try {
       await updateEventsBulk(updatedRows);
+      tileCacheRef.current = { key: "", tiles: new Map() };
+      void requestAndRender();
 
       if (activeHex) {
         const refresh = await fetchEventsInHex(activeHex);
@@ -71,18 +87,45 @@ export default function MapView() {
       return;
     }
 
+    const res = resRef.current;
+    const key = `${res}|${ids.join(",")}`;
+    const cache = tileCacheRef.current.key === key
+      ? tileCacheRef.current
+      : (tileCacheRef.current = { key, tiles: new Map() });
+
     const b = map.getBounds();
+    const visible = tilesForBounds(
+      b.getWest(), b.getSouth(), b.getEast(), b.getNorth(), tileZoomFor(map.getZoom()),
+    ).map(([z, x, y]) => ({ z, x, y, id: `${z}/${x}/${y}` }));
+
     const params = {
-      minx: b.getWest(),
-      miny: b.getSouth(),
-      maxx: b.getEast(),
-      maxy: b.getNorth(),
-      res: resRef.current,
+      res,
       include: ids,            // repeated keys
       sources: ids.join(","),  // comma string (fallback)
+      rollup: "true",          // whole cells by center from the daily rollup where it applies
     };
+    await Promise.all(
+      visible
+        .filter(t => !cache.tiles.has(t.id))
+        .map(async t => {
+          const rows = await fetchH3Tile(t.z, t.x, t.y, params);
+          if (rows) cache.tiles.set(t.id, rows);
+        })
+    );
+    // res/datasets changed while we were fetching; the newer call renders
+    if (tileCacheRef.current !== cache) return;
 
-    const data: H3Agg[] = await fetchH3(params);
+    if (cache.tiles.size > MAX_CACHED_TILES) {
+      const keep = new Set(visible.map(t => t.id));
+      for (const id of cache.tiles.keys()) if (!keep.has(id)) cache.tiles.delete(id);
+    }
+
+    // a cell can span tiles (res > 9 counts points per tile) -> sum per cell
+    const sums = new Map<string, number>();
+    for (const t of visible) {
+      for (const d of cache.tiles.get(t.id) ?? []) sums.set(d.h3, (sums.get(d.h3) ?? 0) + d.count);
+    }
+    const data: H3Agg[] = Array.from(sums, ([h3, count]) => ({ h3, count }));
 
     overlay.setProps({
       layers: [
@@ -132,6 +175,28 @@ export default function MapView() {
     map.addControl(overlay as any);
     overlayRef.current = overlay;
 
+    map.on("load", () => {
+      map.addSource("events", {
+        type: "vector",
+        tiles: [eventTileUrl(selectedIdsRef.current)],
+        minzoom: EVENTS_MIN_ZOOM,
+        maxzoom: 16,
+      });
+      map.addLayer({
+        id: "event-points",
+        type: "circle",
+        source: "events",
+        "source-layer": "events",
+        minzoom: EVENTS_MIN_ZOOM,
+        paint: {
+          // thinned tiles carry n = points represented by each feature
+          "circle-radius": ["interpolate", ["linear"], ["get", "n"], 1, 3, 50, 8],
+          "circle-color": "#e4572e",
+          "circle-opacity": 0.8,
+        },
+      });
+    });
+
     const handler = () => { void requestAndRender(); };
     map.on("load", handler);
     map.on("moveend", handler);
@@ -146,6 +211,14 @@ export default function MapView() {
   // Re-query when the UI state changes
   useEffect(() => { void requestAndRender(); }, [res, selectedIds.join("|")]);
 
+  useEffect(() => {
+    const map = mapRef.current;
+    const source = map?.getSource("events") as maplibregl.VectorTileSource | undefined;
+    if (!map || !source) return;
+    source.setTiles([eventTileUrl(selectedIds)]);
+    map.setLayoutProperty("event-points", "visibility", selectedIds.length ? "visible" : "none");
+  }, [selectedIds.join("|")]);
+
   const toggle = (id: string) => setSelected((p) => ({ ...p, [id]: !p[id] }));
 
   return (
@@ -0,0 +1,61 @@
+// Decoder for the API's packed column format (application/vnd.ngr001.columns).
+// Layout is documented in backend/app/packed.py: "NGRC" + version + JSON
+// header, then one little-endian buffer per column (8-byte aligned).
+
+export const PACKED = "application/vnd.ngr001.columns";
+
+type TypedColumn =
+  | Int16Array | Int32Array | Uint16Array | Uint32Array
+  | BigUint64Array | Float32Array | Float64Array;
+
+export type Column = {
+  values: TypedColumn;
+  dictionary?: (string | null)[];
+  nullValue?: number;
+};
+
+export type Columns = {
+  rows: number;
+  meta: Record<string, unknown>;
+  columns: Record<string, Column>;
+};
+
+const ARRAYS = {
+  int16: Int16Array,
+  int32: Int32Array,
+  uint16: Uint16Array,
+  uint32: Uint32Array,
+  uint64: BigUint64Array,
+  float32: Float32Array,
+  float64: Float64Array,
+} as const;
+
+export function decodeColumns(buf: ArrayBuffer): Columns {
+  const view = new DataView(buf);
+  const magic = String.fromCharCode(...new Uint8Array(buf, 0, 4));
+  if (magic !== "NGRC") throw new Error("Not a packed column payload");
+  const version = view.getUint16(4, true);
+  if (version !== 1) throw new Error(`Unsupported packed version ${version}`);
+
+  const headerLen = view.getUint32(8, true);
+  const header = JSON.parse(new TextDecoder().decode(new Uint8Array(buf, 12, headerLen)));
+  const base = 12 + headerLen;
+
+  const columns: Record<string, Column> = {};
+  for (const c of header.columns) {
+    const Ctor = ARRAYS[c.dtype as keyof typeof ARRAYS];
+    if (!Ctor) throw new Error(`Unknown column dtype ${c.dtype}`);
+    // typed arrays are native-endian; every browser we target is little-endian
+    columns[c.name] = {
+      values: new Ctor(buf, base + c.offset, c.length),
+      dictionary: c.dictionary,
+      nullValue: c.null,
+    };
+  }
+  return { rows: header.rows, meta: header.meta ?? {}, columns };
+}
+
+// Decoded string value of a dictionary-encoded column at row i.
+export function dictValue(col: Column, i: number): string | null {
+  return col.dictionary ? col.dictionary[Number(col.values[i])] ?? null : null;
+}
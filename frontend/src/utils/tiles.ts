@@ -0,0 +1,33 @@
+// XYZ (web mercator) tile math matching backend/app/tiles.py.
+
+const MAX_LAT = 85.0511287798066;
+
+export type Tile = [z: number, x: number, y: number];
+
+export function lonToTileX(lon: number, z: number) {
+  const n = 2 ** z;
+  return Math.min(n - 1, Math.max(0, Math.floor(((lon + 180) / 360) * n)));
+}
+
+export function latToTileY(lat: number, z: number) {
+  const n = 2 ** z;
+  const rad = (Math.max(-MAX_LAT, Math.min(MAX_LAT, lat)) * Math.PI) / 180;
+  const y = ((1 - Math.log(Math.tan(rad) + 1 / Math.cos(rad)) / Math.PI) / 2) * n;
+  return Math.min(n - 1, Math.max(0, Math.floor(y)));
+}
+
+// Tiles at zoom z covering the bounds (no world copies, so west <= east).
+export function tilesForBounds(west: number, south: number, east: number, north: number, z: number): Tile[] {
+  const x0 = lonToTileX(west, z), x1 = lonToTileX(east, z);
+  const y0 = latToTileY(north, z), y1 = latToTileY(south, z);
+  const out: Tile[] = [];
+  for (let x = x0; x <= x1; x++) {
+    for (let y = y0; y <= y1; y++) out.push([z, x, y]);
+  }
+  return out;
+}
+
+// Tiles a few levels coarser than the map zoom: a handful per viewport.
+export function tileZoomFor(mapZoom: number) {
+  return Math.max(0, Math.min(14, Math.floor(mapZoom) - 2));
+}
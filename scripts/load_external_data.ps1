@@ -3,19 +3,44 @@
 
 # Optional: Pass a limit as first argument to load only N records per database (for testing)
 # Example: .\load_external_data.ps1 10000
+# Use -Copy for the fast COPY-based ingest: .\load_external_data.ps1 -Copy
+# Use -Columnar for the vectorized NumPy parsers: .\load_external_data.ps1 -Copy -Columnar
+# Use -Workers N to parse each CSV in N processes (0 = all CPUs): .\load_external_data.ps1 -Copy -Workers 0
+# Use -Upsert for re-runnable loads that skip records already loaded and resume after interruptions: .\load_external_data.ps1 -Upsert
+# Add -Restart to ignore saved checkpoints: .\load_external_data.ps1 -Upsert -Restart
 
 param(
-    [int]$Limit = 0
+    [int]$Limit = 0,
+    [switch]$Copy = $false,
+    [int]$Workers = 1,
+    [switch]$Columnar = $false,
+    [switch]$Upsert = $false,
+    [switch]$Restart = $false
 )
 
-$limitArg = ""
+$loaderArgs = @()
 if ($Limit -gt 0) {
-    $limitArg = "$Limit"
+    $loaderArgs += "$Limit"
     Write-Host "Loading with limit of $Limit records per database"
 }
+if ($Copy) {
+    $loaderArgs += "--mode"
+    $loaderArgs += "copy"
+}
+if ($Workers -ne 1) {
+    $loaderArgs += "--workers"
+    $loaderArgs += "$Workers"
+}
+
+if ($Columnar) {
+    $loaderArgs += "--columnar"
+}
 
-if ($limitArg) {
-    docker exec -i ngr001_api python -m app.load_external_data $limitArg
-} else {
-    docker exec -i ngr001_api python -m app.load_external_data
+if ($Upsert) {
+    $loaderArgs += "--upsert"
+}
+if ($Restart) {
+    $loaderArgs += "--restart"
 }
+
+docker exec -i ngr001_api python -m app.load_external_data @loaderArgs